@@ -0,0 +1,69 @@
+"""Debounced broadcasts.
+
+When several directors are entering scores at the same time every result
+that's saved used to be followed by a get_results and a group_send inside
+the request. The Coalescer collects the updates for the same key (usually
+the tournament and the round) over a short window and then builds and sends
+the message just once, on a background thread, off the request path.
+
+The window is the BROADCAST_WINDOW setting in seconds. When it is 0 the
+message is sent immediately in the calling thread, which is what the tests do.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class Coalescer:
+    def __init__(self, window=None):
+        """Args: window: seconds to wait for more updates, defaults to the
+            BROADCAST_WINDOW setting"""
+        self.window = window
+        self.lock = threading.Lock()
+        self.pending = {}
+
+    def get_window(self):
+        if self.window is not None:
+            return self.window
+        return getattr(settings, 'BROADCAST_WINDOW', 0.15)
+
+    def add(self, key, item, flush):
+        """Queue an update.
+        Args: key: updates with the same key are coalesced
+              item: what changed, for example a result id
+              flush: called with the list of items collected for the key
+                  when the window closes. Only the flush given with the
+                  first item in a window is used.
+        """
+        window = self.get_window()
+        if not window:
+            flush([item])
+            return
+
+        with self.lock:
+            if key in self.pending:
+                self.pending[key][0].append(item)
+                return
+            self.pending[key] = ([item], flush)
+
+        timer = threading.Timer(window, self.fire, [key])
+        timer.daemon = True
+        timer.start()
+
+    def fire(self, key):
+        with self.lock:
+            items, flush = self.pending.pop(key)
+        try:
+            flush(items)
+        except Exception:
+            logger.exception('Broadcast for %s failed', key)
+        finally:
+            # this thread had its own database connection
+            connections.close_all()
+
+
+broadcaster = Coalescer()
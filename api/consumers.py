@@ -1,40 +1,111 @@
 import json
 
 from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 
+from api.instrumentation import instrument, timed
+
+
+def get_resync(tournament_id, round_no, user):
+    """api.views.get_resync as text, measured in the thread that talks to the
+    database"""
+    from api.views import get_resync
+
+    with instrument('Watcher.resync'):
+        message = get_resync(tournament_id, round_no, user)
+        if message:
+            with timed('serialization'):
+                return json.dumps(message)
+
+
+def tournament_group(tournament_id, round_no=None):
+    """The name of the channel layer group for a tournament.
+    Args: tournament_id: the id of the tournament
+          round_no: when given the group for just that round
+    """
+    if round_no:
+        return f'tournament_{int(tournament_id)}_round_{int(round_no)}'
+    return f'tournament_{int(tournament_id)}'
+
 
 class Watcher(AsyncWebsocketConsumer):
+    """Sends live updates to spectators.
+
+    Spectators only receive the updates for the tournaments that they have
+    subscribed to. That can be done through the url (ws/tournament/<id>/ or
+    ws/tournament/<id>/round/<round_no>/) or by sending a message like
+    {"subscribe": <id>} or {"subscribe": <id>, "round_no": <n>} over the
+    socket. {"unsubscribe": <id>} reverses it.
+
+    Every broadcast carries a sequence number (seq) that goes up by one with
+    each message for the tournament. Those watching a single round get all
+    of them too, a message about another round comes to them as just
+    {"tournament_id": <id>, "seq": <n>}. A spectator who notices a gap should
+    send {"resync": <id>} (optionally with "round_no") to get the
+    participants and the results of the round in full.
+    """
+
     async def connect(self):
-        # Join room group
+        with instrument('Watcher.connect'):
+            await self._connect()
+
+    async def _connect(self):
+        self.subscriptions = set()
         await self.accept()
-        await self.channel_layer.group_add(
-            'chat', self.channel_name
-        )
 
-        # i am guessing there is a bug in the ChannelsLiveServerTestCase 
+        kwargs = self.scope.get('url_route', {}).get('kwargs', {})
+        if kwargs.get('tournament_id'):
+            await self.subscribe(kwargs['tournament_id'], kwargs.get('round_no'))
+
+        # i am guessing there is a bug in the ChannelsLiveServerTestCase
         # unless some message is sent on the socket at the start, some tests
         # fail even though if you tried the exact same steps manually in the
         # browser it would still work.
-        await self.channel_layer.group_send(
-            'chat', {"type": "chat_message", "message": "Hello!"}
-        )
+        await self.send(text_data=json.dumps("Hello!"))
 
     async def disconnect(self, close_code):
-        # Leave room group
-        await self.channel_layer.group_discard(
-            'chat', self.channel_name
-        )
-        super().disconnect(close_code)
+        # Leave all the groups
+        for group in self.subscriptions:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        self.subscriptions = set()
+
+    async def subscribe(self, tournament_id, round_no=None):
+        group = tournament_group(tournament_id, round_no)
+        self.subscriptions.add(group)
+        await self.channel_layer.group_add(group, self.channel_name)
+
+    async def unsubscribe(self, tournament_id):
+        prefix = tournament_group(tournament_id)
+        for group in [g for g in self.subscriptions if g == prefix or g.startswith(prefix + '_')]:
+            self.subscriptions.discard(group)
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def resync(self, tournament_id, round_no=None):
+        text = await database_sync_to_async(get_resync)(
+            int(tournament_id), int(round_no) if round_no else None,
+            self.scope.get('user'))
+        if text:
+            await self.send(text_data=text)
 
     # Receive message from WebSocket
-    async def receive(self, text_data): 
-        # Send message to room group
-        await self.channel_layer.group_send(
-            'chat', {"type": "chat_message", "message": text_data}
-        )
+    async def receive(self, text_data):
+        try:
+            data = json.loads(text_data)
+            if not isinstance(data, dict):
+                return
+            if data.get('subscribe'):
+                await self.subscribe(data['subscribe'], data.get('round_no'))
+            elif data.get('unsubscribe'):
+                await self.unsubscribe(data['unsubscribe'])
+            elif data.get('resync'):
+                await self.resync(data['resync'], data.get('round_no'))
+        except (ValueError, TypeError):
+            # not json or not a valid tournament id, spectators don't get to
+            # talk to each other
+            pass
 
     # Receive message from room group
     async def chat_message(self, event):
         # Send message to WebSocket
-        await self.send(text_data=json.dumps(event['message']))
\ No newline at end of file
+        await self.send(text_data=json.dumps(event['message']))
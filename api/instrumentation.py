@@ -0,0 +1,142 @@
+"""Query count and timing instrumentation.
+
+Wrap a unit of work (an API call, a websocket message) in instrument() and
+every SQL statement executed on the database connection of the current
+thread is counted and timed. Parts of the work can be timed separately with
+timed(), for example the serialization, the broadcast or the pairing.
+
+When the unit of work completes a single structured (JSON) log line is
+written to the api.instrumentation logger and the numbers are added to the
+per endpoint totals that are served by the stats view.
+"""
+import json
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# the Record of the unit of work that's in progress, if any
+current = contextvars.ContextVar('instrumentation_record', default=None)
+
+_lock = threading.Lock()
+_stats = {}
+
+
+class Record:
+    """The numbers for one unit of work"""
+    def __init__(self, name):
+        self.name = name
+        self.queries = 0
+        self.db_time = 0.0
+        self.sections = {}
+        self.start = time.perf_counter()
+        self.elapsed = 0.0
+
+    def as_dict(self):
+        return {
+            'endpoint': self.name,
+            'time': round(self.elapsed, 6),
+            'queries': self.queries,
+            'db_time': round(self.db_time, 6),
+            **{k: round(v, 6) for k, v in self.sections.items()},
+        }
+
+
+def query_counter(execute, sql, params, many, context):
+    """connection.execute_wrapper that adds up the queries and their time"""
+    record = current.get()
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if record is not None:
+            record.queries += 1
+            record.db_time += time.perf_counter() - start
+
+
+@contextmanager
+def instrument(name):
+    """Measure a unit of work.
+    Args: name: the name of the endpoint, it can be changed through the
+        yielded Record before the block ends.
+    """
+    if current.get() is not None:
+        # nested, the outer one is doing the counting
+        yield current.get()
+        return
+
+    record = Record(name)
+    token = current.set(record)
+    try:
+        with connection.execute_wrapper(query_counter):
+            yield record
+    finally:
+        current.reset(token)
+        record.elapsed = time.perf_counter() - record.start
+        add(record)
+
+
+@contextmanager
+def timed(section):
+    """Time a section of the current unit of work (if there is one)"""
+    record = current.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if record is not None:
+            record.sections[section] = (record.sections.get(section, 0)
+                                        + time.perf_counter() - start)
+
+
+def add(record):
+    """Log the record and add it to the totals"""
+    data = record.as_dict()
+    logger.info(json.dumps(data))
+
+    with _lock:
+        totals = _stats.setdefault(record.name, {'count': 0, 'max_time': 0.0})
+        totals['count'] += 1
+        totals['max_time'] = max(totals['max_time'], data['time'])
+        for key, value in data.items():
+            if key != 'endpoint':
+                totals[key] = totals.get(key, 0) + value
+
+
+def get_stats():
+    """Totals and averages for each endpoint since the process started"""
+    with _lock:
+        stats = {}
+        for name, totals in _stats.items():
+            stats[name] = dict(totals)
+            for key, value in totals.items():
+                if key not in ('count', 'max_time'):
+                    stats[name][f'avg_{key}'] = value / totals['count']
+        return stats
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
+
+
+class InstrumentedMixin:
+    """Instruments every action of a DRF view set.
+
+    The endpoint is named after the view set and the action. The response
+    is rendered inside the measurement so that the serialization time is
+    included.
+    """
+    def dispatch(self, request, *args, **kwargs):
+        with instrument(self.__class__.__name__) as record:
+            response = super().dispatch(request, *args, **kwargs)
+            record.name = f'{self.__class__.__name__}.{getattr(self, "action", None) or request.method.lower()}'
+            if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+                with timed('serialization'):
+                    response.render()
+        return response
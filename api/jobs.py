@@ -0,0 +1,225 @@
+"""Background jobs, used for pairing.
+
+Pairing a large Swiss round can take a while when the pairing engine has to
+try transpositions and fallbacks. Instead of doing that inside the request a
+job is submitted, the request returns straight away and the work happens on
+a worker thread. The job reports its progress as it goes (see Job.report)
+and anyone watching the tournament is told about it.
+
+Python threads cannot be stopped from the outside, so cancellation and the
+timeout are cooperative: the next time the work reports progress it is
+interrupted with Cancelled (or TimedOut).
+
+The number of worker threads is the PAIRING_WORKERS setting. When it is 0
+the job runs in the calling thread, which is what the tests do.
+
+Each web server process has its own queue. The state of every job is also
+kept in the (shared, see tournament.checks) cache, so any process can tell
+how a job is doing and ask for it to be cancelled.
+"""
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+TIMEOUT = 'timeout'
+
+FINISHED = (DONE, FAILED, CANCELLED, TIMEOUT)
+
+# progress is passed on at most this often (seconds), changes of state always are
+NOTIFY_INTERVAL = 0.5
+
+# finished jobs are forgotten after this many seconds
+KEEP = 600
+
+JOB_KEY = 'job_{0}'
+CANCEL_KEY = 'job_{0}_cancel'
+
+
+class Cancelled(Exception):
+    pass
+
+
+class TimedOut(Cancelled):
+    pass
+
+
+class Job:
+    """A unit of work running in the background.
+    Args: key: at most one job with the same key is active at a time
+          target: callable that does the work, it's given the job
+          timeout: seconds after which the job is interrupted, None for never
+          notify: called with the job whenever it makes progress
+          info: anything that should be shown with the job
+    """
+    def __init__(self, key, target, timeout=None, notify=None, info=None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.target = target
+        self.timeout = timeout
+        self.notify = notify
+        self.info = info or {}
+        self.state = QUEUED
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancelled = threading.Event()
+        self.last_notified = 0
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'state': self.state,
+            'progress': self.progress,
+            'error': self.error,
+            'result': self.result,
+            'elapsed': round((self.finished or time.time()) - (self.started or self.created), 3),
+            **self.info,
+        }
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def report(self, **progress):
+        """Record progress, called by the work from time to time.
+        Raises: Cancelled or TimedOut when the job should stop
+        """
+        due = time.time() - self.last_notified > NOTIFY_INTERVAL
+        if due and cache.get(CANCEL_KEY.format(self.id)):
+            # cancelled through another process
+            self.cancel()
+        if self.cancelled.is_set():
+            raise Cancelled('Cancelled')
+        if self.timeout and time.time() - self.started > self.timeout:
+            raise TimedOut(f'Took longer than {self.timeout} seconds')
+
+        self.progress.update(progress)
+        if due:
+            self.send()
+
+    def send(self):
+        self.last_notified = time.time()
+        cache.set(JOB_KEY.format(self.id), self.as_dict(), KEEP)
+        if self.notify:
+            try:
+                self.notify(self)
+            except Exception:
+                logger.exception('Progress of job %s could not be sent', self.id)
+
+    def run(self):
+        if self.cancelled.is_set():
+            self.finish(CANCELLED, error='Cancelled')
+            return
+
+        self.state = RUNNING
+        self.started = time.time()
+        self.send()
+        try:
+            self.result = self.target(self)
+            self.finish(DONE)
+        except TimedOut as e:
+            self.finish(TIMEOUT, error=str(e))
+        except Cancelled as e:
+            self.finish(CANCELLED, error=str(e))
+        except Exception as e:
+            logger.exception('Job %s failed', self.id)
+            self.finish(FAILED, error=str(e))
+
+    def finish(self, state, error=None):
+        self.state = state
+        self.error = error
+        self.finished = time.time()
+        self.send()
+
+
+class JobQueue:
+    def __init__(self, workers=None):
+        """Args: workers: number of worker threads, defaults to the
+            PAIRING_WORKERS setting"""
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.executor = None
+
+    def get_workers(self):
+        if self.workers is not None:
+            return self.workers
+        return getattr(settings, 'PAIRING_WORKERS', 2)
+
+    def submit(self, key, target, timeout=None, notify=None, info=None):
+        """Queue a job, see Job for the arguments.
+        Returns: (job, created), if a job with the same key is already
+            active that job is returned and nothing is queued
+        """
+        with self.lock:
+            self.forget()
+            for job in self.jobs.values():
+                if job.key == key and job.state not in FINISHED:
+                    return job, False
+
+            job = Job(key, target, timeout, notify, info)
+            self.jobs[job.id] = job
+            cache.set(JOB_KEY.format(job.id), job.as_dict(), KEEP)
+            workers = self.get_workers()
+            if workers and self.executor is None:
+                self.executor = ThreadPoolExecutor(workers, thread_name_prefix='pairing')
+
+        if workers:
+            self.executor.submit(self.work, job)
+        else:
+            job.run()
+        return job, True
+
+    def work(self, job):
+        try:
+            job.run()
+        finally:
+            # this thread had its own database connection
+            connections.close_all()
+
+    def get(self, job_id):
+        """The job if it belongs to this process"""
+        return self.jobs.get(job_id)
+
+    def status(self, job_id):
+        """Returns: Job.as_dict for a job of any process or None"""
+        job = self.jobs.get(job_id)
+        if job:
+            return job.as_dict()
+        return cache.get(JOB_KEY.format(job_id))
+
+    def cancel(self, job_id):
+        """Asks a job of any process to stop.
+        Returns: see status
+        """
+        job = self.jobs.get(job_id)
+        if job:
+            job.cancel()
+        elif cache.get(JOB_KEY.format(job_id)):
+            # it will notice the next time it reports progress
+            cache.set(CANCEL_KEY.format(job_id), True, KEEP)
+        return self.status(job_id)
+
+    def forget(self):
+        """Drop the jobs that finished a while ago"""
+        now = time.time()
+        for job_id in [j.id for j in self.jobs.values() if j.finished and now - j.finished > KEEP]:
+            del self.jobs[job_id]
+
+
+pairing_jobs = JobQueue()
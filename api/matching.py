@@ -0,0 +1,128 @@
+"""Swiss pairing by maximum weight matching.
+
+SwissPairing tries transpositions of each score group which is fine for the
+small events this app was written for, but the number of transpositions
+grows with the factorial of the size of the score group. This module
+pairs the whole field at once by finding a maximum weight matching
+(Edmonds' blossom algorithm, as implemented by networkx) in polynomial time.
+"""
+import networkx as nx
+
+from api.pairing import Pairing
+
+
+class MatchingPairing(Pairing):
+    '''Swiss pairing using a maximum weight matching.
+
+    Every two players who are allowed to meet (see TournamentRound.repeats)
+    are joined by an edge in a graph. The weight of that edge says how good
+    it would be to pair them. Of all the pairings that leave the fewest
+    players unpaired we pick the one with the highest total weight.
+
+    The weights are built out of four penalties, each one of which is more
+    important than all of the ones that follow it put together:
+        1. the number of times the two players have already met
+        2. the distance between their score groups (squared so that two
+           players floating down one group each is better than one player
+           floating down two groups)
+        3. both players being due to go first (or second)
+        4. how far the pair is from a text book swiss pairing, that is the
+           top half of a score group against the bottom half and floaters
+           coming from the bottom of the higher group to meet the top of the
+           lower group.
+    '''
+
+    # see edges
+    WINDOW = 6
+
+    def make_it(self):
+        if len(self.players) == 0:
+            raise ValueError('No players')
+
+        self.assign_bye()
+
+        players = self.order_players(self.players)
+
+        # Try a sparse graph first, each player is only joined to the players
+        # close to his ideal opponent. That's much faster and good enough
+        # unless repeats have ruled out most of those candidates. A repeat
+        # in the sparse matching might have been avoided with the full graph
+        matching = self.match(players, self.WINDOW)
+        if (len(matching) < len(players) // 2 or
+                any(self.times_met(players[a], players[b]) for a, b in matching)):
+            matching = self.match(players, None)
+
+        for a, b in sorted(tuple(sorted(m)) for m in matching):
+            playerW, playerB = self.return_with_color_preferences(
+                players[a], players[b])
+            self.pairs.append([playerW, playerB])
+            playerW['pair'] = True
+            playerB['pair'] = True
+
+        return self.pairs
+
+    def match(self, players, window):
+        """Finds the maximum weight matching
+        Args: players: the players sorted by their standing
+              window: see edges
+        Returns: a set of (index, index) tuples"""
+        graph = nx.Graph()
+        graph.add_nodes_from(range(len(players)))
+        graph.add_weighted_edges_from(self.edges(players, window))
+        return nx.max_weight_matching(graph, maxcardinality=True)
+
+    def edges(self, players, window=None):
+        """Generates (index, index, weight) for every pair that may meet.
+        Args: players: the players sorted by their standing
+              window: when not None, pairs that are further than this from
+                  a text book pairing (penalty 4 above) or that skip a score
+                  group are left out
+        """
+        n = len(players)
+        groups = sorted({p['score'] for p in players}, reverse=True)
+        group = [groups.index(p['score']) for p in players]
+
+        # position of each player within his score group and group sizes
+        position = []
+        sizes = [0] * len(groups)
+        for g in group:
+            position.append(sizes[g])
+            sizes[g] += 1
+
+        preferences = [self.get_color_preferences(p) for p in players]
+        max_pref = max([abs(p) for p in preferences] + [0])
+
+        # the multipliers for each of the penalties. They are chosen so that
+        # the sum of all the lesser penalties over the whole round can never
+        # outweigh a single step of a greater one.
+        pairs = n // 2 + 1
+        unit_position = 1
+        unit_color = unit_position * (n * pairs + 1)
+        unit_group = unit_color * (2 * max_pref * pairs + 1)
+        unit_repeat = unit_group * ((len(groups) - 1) ** 2 * pairs + 1)
+        top = unit_repeat * (self.repeats + 1)
+
+        for i in range(n):
+            for j in range(i + 1, n):
+                met = self.times_met(players[i], players[j])
+                if met > self.repeats:
+                    continue
+
+                gi, gj = group[i], group[j]
+                if gi == gj:
+                    # S1 against S2 within the score group
+                    half = sizes[gi] // 2
+                    misplaced = abs(position[j] - position[i] - half)
+                else:
+                    # i belongs to the higher group, he floats down
+                    misplaced = (sizes[gi] - 1 - position[i]) + position[j]
+
+                if window is not None and (misplaced > window or gj - gi > 1):
+                    continue
+
+                penalty = (met * unit_repeat
+                           + (gj - gi) ** 2 * unit_group
+                           + abs(preferences[i] + preferences[j]) * unit_color
+                           + misplaced * unit_position)
+
+                yield i, j, top - penalty
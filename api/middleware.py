@@ -1,8 +1,42 @@
+import copy
+
 from django.http import Http404
+from django.utils.functional import SimpleLazyObject
+
+from tournament import cache
+from tournament.models import Tournament, Director
+
+
+def load_context(tid):
+    """Reads a tournament and the user ids of its directors"""
+    try:
+        tournament = Tournament.objects.get(pk=tid)
+    except Tournament.DoesNotExist:
+        raise Http404('Tournament not found')
+    directors = set(Director.objects.filter(tournament_id=tid).values_list('user_id', flat=True))
+    return tournament, directors
+
+
+def get_context(tid):
+    """The tournament and its directors, each request gets its own copy of
+    the tournament so that the cached one is never modified"""
+    tournament, directors = cache.get_context(tid, lambda: load_context(tid))
+    return copy.copy(tournament), directors
+
+
+def is_director(request):
+    """Is the user making the request a director of request.tournament"""
+    return (request.user.is_authenticated and
+            request.user.id in request.tournament_directors)
 
-from tournament.models import Tournament
 
 class TournamentMiddleware:
+    """Makes request.tournament and request.tournament_directors available
+    for urls under /api/tournament/<id>/
+
+    Nothing is read until a view needs it and then it comes from a short
+    lived cache (see tournament.cache.get_context).
+    """
     def __init__(self, get_response):
         self.get_response = get_response
         # One-time configuration and initialization.
@@ -10,20 +44,18 @@ class TournamentMiddleware:
     def __call__(self, request):
         # Code to be executed for each request before
         # the view (and later middleware) are called.
-        path = request.get_full_path()
-        parts = path.split('/api/tournament/')
+        parts = request.path.split('/api/tournament/')
         if len(parts) == 2:
-            parts = parts[1].split('/')
-            if parts[0]:
-                try:
-                    request.tournament = Tournament.objects.get(pk=parts[0])
-                except Tournament.DoesNotExist:
-                    raise Http404('Tournament not found')
-                except:
-                    print('Trouble for', parts, path)
+            tid = parts[1].split('/')[0]
+            if tid.isdigit():
+                tid = int(tid)
+                context = SimpleLazyObject(lambda: get_context(tid))
+                request.tournament = SimpleLazyObject(lambda: context[0])
+                request.tournament_directors = SimpleLazyObject(lambda: context[1])
+
         response = self.get_response(request)
 
         # Code to be executed for each request/response after
         # the view is called.
 
-        return response
\ No newline at end of file
+        return response
@@ -4,13 +4,13 @@
 # The earlier attempt mentioned above borrows this code form
 # https://github.com/gnomeby/swiss-system-chess-tournament
 
-import sys
-import os
+from collections import Counter
 
-from tournament.models import Participant, Result, TournamentRound
 from django.db.models import Q
 
+from tournament import cache
 from tournament.models import Tournament, BoardResult
+from api.snapshot import load_snapshot, save_pairs
 
 class Pairing:
     ''' Pairing from tournament results stored in a Database.
@@ -41,75 +41,67 @@ class Pairing:
 
         When the previous round is non zero all active players need to have
         a score before this round can be paired.
+
+        All the database access happens in api.snapshot, use from_snapshot
+        if you want to pair without a database.
         '''
-        self.pairs = []
+        self.rnd = rnd
         self.tournament = rnd.tournament
+        self.setup(load_snapshot(rnd))
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """Creates a pairing that works purely in memory.
+        Args: snapshot: an api.snapshot.Snapshot
+        The resulting pairing cannot be saved, but make_it() will work."""
+        pairing = cls.__new__(cls)
+        pairing.rnd = None
+        pairing.tournament = None
+        pairing.setup(snapshot)
+        return pairing
+
+    def setup(self, snapshot):
+        """Builds the player records from the snapshot"""
+        self.snapshot = snapshot
+        self.pairs = []
         self.players = []
-        self.rnd = rnd
-        self.next_round = rnd.round_no
+        self.next_round = snapshot.round_no
+        self.repeats = snapshot.repeats
         self.bye = None
 
-        players = Participant.objects.select_related(
-            ).filter(tournament=self.tournament
-            ).exclude(name='Absent')
-
-        if rnd.based_on > 0:
-            # this round has a predecessor that needs to be completed.
-            prev = TournamentRound.objects.filter(tournament=rnd.tournament
-                                                  ).get(round_no=rnd.based_on)
-            results = Result.objects.filter(round=prev)
-            if results.count() < players.count() // 2:
-                raise ValueError(f"round {rnd.based_on} needs to be completed")
-
-            if results.filter(score1=None).exists():
-                if not self.tournament.round_robin:
-                    raise ValueError(f"round {rnd.based_on} needs to be completed")
-
-        # fetch all previous round results so that we know of all the 
-        # old pairings
-        qs = Result.objects.filter(
-                Q(round__round_no__lt=rnd.round_no) &
-                Q(round__tournament=rnd.tournament)
-            ).select_related('p1', 'p2', 'round')
-
         d = {}
-        for pl in players:
-            if pl.offed:
-                pl.mark_absent(self.rnd)
-            else:
-                record = {'name': pl.name,
-                        'spread': pl.spread,
-                        'rating': pl.rating,
-                        'player': pl,
-                        'pair': False,
-                        'game_wins': pl.game_wins,
-                        'score': pl.round_wins,
-                        'opponents': []
-                }
-                if self.tournament.team_size is None:
-                    record['score'] = pl.game_wins
-                d[pl.id] = record
-                if pl.name == 'Bye':
-                    self.bye = record
-
-        for r in qs:
-            if r.p1.name != 'Absent' and r.p2.name != 'Absent':
-                if not r.p2.offed and not r.p1.offed:
-                    d[r.p2.pk]['opponents'].append(r.p1.name)
-                    d[r.p1.pk]['opponents'].append(r.p2.name)
+        for pl in snapshot.players:
+            record = {'id': pl.id,
+                    'name': pl.name,
+                    'spread': pl.spread,
+                    'rating': pl.rating,
+                    'white': pl.white,
+                    'played': pl.played,
+                    'pair': False,
+                    'game_wins': pl.game_wins,
+                    'score': pl.score,
+            }
+            d[pl.id] = record
+            if pl.name == 'Bye':
+                self.bye = record
+
+        # the number of times each pair of players has met, keyed by their
+        # ids in both orders so that times_met is a single lookup.
+        self.met = Counter()
+        for p1, p2 in snapshot.history:
+            # absentees and switched off players are not in the dictionary
+            if p1 in d and p2 in d:
+                self.met[(p1, p2)] += 1
+                self.met[(p2, p1)] += 1
 
         self.players = list(d.values())
 
         if len(self.players) % 2 == 1:
             if not self.bye:
-                # this tournament does not already have a configured bye lets
-                # create one.
-                bye, _ = Participant.objects.get_or_create(
-                    name='Bye', tournament=self.tournament,
-                    defaults = {'name': 'Bye', 'rating': 0,  'tournament': self.tournament}
-                )
-                self.bye = {'name': 'Bye', 'pair': False,
-                    'rating': 0, 'opponents': [], 'player': bye,
+                # this tournament does not already have a configured bye. One
+                # will be created when the pairing is saved.
+                self.bye = {'id': None, 'name': 'Bye', 'pair': False,
+                    'rating': 0, 'white': 0, 'played': 0,
                     'score': 0, 'game_wins':-1, 'spread': -1}
                 self.players.append(self.bye)
             else:
@@ -118,6 +110,15 @@ class Pairing:
                 self.bye = None
 
             
+    # called with the progress of the pairing (see report and api.jobs)
+    progress = None
+
+    def report(self, **progress):
+        """Tell whoever is waiting for the pairing how it's going. That may
+        also interrupt the pairing by raising an exception"""
+        if self.progress:
+            self.progress(**progress)
+
     def assign_bye(self):
         """Assign the bye to the lowest rank player"""
         players = self.order_players(self.players)
@@ -126,13 +127,17 @@ class Pairing:
 
         for player in reversed(players):
             if player['name'] != 'Bye' and player['name'] != 'Absent':
-                if 'Bye' not in player['opponents']:
+                if not self.times_met(player, self.bye):
                     self.pairs.append([player, self.bye])
                     self.players.remove(player)
                     self.players.remove(self.bye)
                     return
 
 
+    def times_met(self, player, opponent):
+        """Number of times the two players have already been paired"""
+        return self.met[(player['id'], opponent['id'])]
+
     def order_players(self, players):
         """Sort the players
         First by round_wins (represented by score in the dictionary)
@@ -143,40 +148,13 @@ class Pairing:
         players.sort(reverse=True,
                                 key=lambda player: (player['score'], player['game_wins'],
                                                     player['spread'],
-                                                    player['player'].white or 0,
+                                                    player['white'],
                                                     player['rating']))
         return players
 
     def save(self):
-        table = 0
-        results = []
-        for pair in self.pairs:
-            r = Result(round=self.rnd,
-                      p1=pair[0]['player'], p2=pair[1]['player']
-            )
-            if (r.p1.name != 'Bye' and r.p2.name != 'Bye') and (
-                r.p1.name != 'Absent' and r.p2.name != 'Absent'
-            ):
-                # nope this and the similiar condition below cannot be merged.
-                # they are both needed because saving a result is actually a
-                # two step process. Pleae refer to the comments in the result
-                # class
-
-                r.starting=pair[0]['player']
-                table += 1
-                r.table = table
-
-            r.save()
-            create_boards(self.tournament, r)
-            
-            results.append(r)
-            if r.p1.name == 'Bye' or r.p2.name == 'Bye':
-                self.tournament.score_bye(r)
-
-
-        self.rnd.paired = True
-        self.rnd.save()
-        return results
+        """Saves the pairing, returns the list of results created"""
+        return save_pairs(self.rnd, self.pairs, self.snapshot.absentees)
 
     
     def get_color_preferences(self, player):
@@ -187,8 +165,8 @@ class Pairing:
         in the next game (if possible) a color preference that's positive 
         means he has to go second
         """
-        whites = player['player'].white
-        blacks = player['player'].played - whites
+        whites = player['white']
+        blacks = player['played'] - whites
 
         return blacks - whites
     
@@ -203,7 +181,7 @@ class Pairing:
         """
         player1, player2 = self.order_players([playerA, playerB])
         
-        if player1['player'].white > player2['player'].white:
+        if player1['white'] > player2['white']:
             return player2, player1
         return player1, player2
 
@@ -214,13 +192,18 @@ def create_boards(tournament, r):
     
     Args: tournament: the tournament being played
           r: the pairing """
+    BoardResult.objects.bulk_create(build_boards(tournament, r))
+
+
+def build_boards(tournament, r):
+    """The unsaved board results for a pairing, see create_boards"""
     if tournament.entry_mode == Tournament.BY_PLAYER:
-        for i in range(tournament.team_size):
-            BoardResult.objects.create(
-                board=i + 1, team1=r.p1, team2=r.p2, round=r.round
-            )
+        return [BoardResult(board=i + 1, team1_id=r.p1_id, team2_id=r.p2_id, round_id=r.round_id)
+                for i in range(tournament.team_size)]
+    return []
 
 def delete_boards(r):
     """Delete the board results associated with this pairing"""
 
-    BoardResult.objects.filter( Q(team1=r.p1) & Q(team2=r.p2) & Q(round=r.round)).delete()
\ No newline at end of file
+    BoardResult.objects.filter( Q(team1=r.p1) & Q(team2=r.p2) & Q(round=r.round)).delete()
+    cache.bump_version(r.round.tournament_id)
\ No newline at end of file
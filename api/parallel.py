@@ -0,0 +1,286 @@
+"""Swiss pairing by searching several candidate pairings in parallel.
+
+SwissPairing.make_it tries a fixed cascade of fallbacks and settles for
+whatever the first one that completes gives it, or an incomplete pairing
+when none do. This module makes a number of candidate pairings instead:
+the plain swiss cascade, a maximum weight matching (api.matching) and the
+swiss cascade with the players in each score group shuffled in a number of
+different random orders. The candidates are made in a pool of processes
+and the best one that finishes within the time budget is kept.
+
+The pairing engine only needs the snapshot (see api.snapshot) which can be
+sent to another process as it is, so the workers never touch the database.
+They are started by a fork server rather than forked from the web server,
+which may be in the middle of a transaction and has other threads that
+might be holding locks. Starting them and setting up django in each takes
+seconds, so the pool is made once in each web server process and shared by
+all the pairings made there (see worker_pool). Where that is not possible
+(or PAIRING_PROCESSES is 0) the candidates are made one after the other in
+this process.
+"""
+import os
+import time
+import atexit
+import random
+import logging
+import threading
+import multiprocessing
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+
+from api.jobs import Cancelled
+from api.pairing import Pairing
+from api.swiss import SwissPairing
+from api.matching import MatchingPairing
+
+logger = logging.getLogger(__name__)
+
+
+class ShuffledSwissPairing(SwissPairing):
+    '''SwissPairing with the players in each score group in a random order'''
+
+    seed = 0
+
+    def find_brackets(self):
+        super().find_brackets()
+        rng = random.Random(self.seed)
+        for group_score in sorted(self.brackets, reverse=True):
+            rng.shuffle(self.brackets[group_score])
+
+
+STRATEGIES = {
+    'swiss': SwissPairing,
+    'matching': MatchingPairing,
+    'shuffle': ShuffledSwissPairing,
+}
+
+
+def evaluate(pairing, pairs, required):
+    """How good a pairing is, the lower the better.
+    Args: pairing: the Pairing that made the pairs
+          pairs: the pairs, the first player in each pair goes first
+          required: the number of pairs in a complete pairing
+    Returns: a tuple of the number of missing pairs, the number of repeats,
+        the score group mismatch (the distance between the score groups of
+        the two players, squared) and the first/second imbalance (how many
+        games more than needed both players have gone first or second)
+    """
+    groups = sorted({p.score for p in pairing.snapshot.players if p.name != 'Bye'},
+                    reverse=True)
+    groups = {score: index for index, score in enumerate(groups)}
+
+    repeats = mismatch = balance = 0
+    for first, second in pairs:
+        repeats += pairing.times_met(first, second)
+        if 'Bye' not in (first['name'], second['name']):
+            mismatch += (groups[first['score']] - groups[second['score']]) ** 2
+            balance += abs(pairing.get_color_preferences(first)
+                           + pairing.get_color_preferences(second))
+
+    return max(required - len(pairs), 0), repeats, mismatch, balance
+
+
+class OutOfTime(Exception):
+    pass
+
+
+def make_candidate(snapshot, strategy, seed=0, deadline=None, report=None):
+    """Makes one candidate pairing, this is what the worker processes do.
+    Args: snapshot: the api.snapshot.Snapshot to pair
+          strategy: a key of STRATEGIES
+          seed: for the random order of the shuffled strategy
+          deadline: time.time() after which the pairing is given up with
+              OutOfTime, checked whenever the pairing reports progress
+              (the swiss transpositions do, a matching does not)
+          report: called with no arguments along with those checks
+    Returns: the score (see evaluate) and the pairs as a list of (id, id),
+        the id of a Bye that is not yet in the database is None.
+    """
+    pairing = STRATEGIES[strategy].from_snapshot(snapshot)
+    pairing.seed = seed
+
+    def progress(**kwargs):
+        if deadline and time.time() > deadline:
+            raise OutOfTime(f'{strategy} {seed}')
+        if report:
+            report()
+
+    pairing.progress = progress
+    required = len(pairing.players) // 2
+    pairs = pairing.make_it()
+    return evaluate(pairing, pairs, required), [(a['id'], b['id']) for a, b in pairs]
+
+
+class WorkerPool:
+    """A pool of processes and the number of searches using it"""
+
+    def __init__(self, processes):
+        self.processes = processes
+        self.pid = os.getpid()
+        self.users = 0
+        # candidates that were not done by their deadline
+        self.leftover = []
+        self.pool = multiprocessing.get_context('forkserver').Pool(
+            processes, initializer=django.setup)
+        # tasks are only picked up once a worker has set up django
+        self.pool.apply(os.getpid)
+
+    def stale(self):
+        """Is a candidate that ran past its deadline still keeping a worker busy?
+
+        Most give up with OutOfTime as soon as they next report progress,
+        a matching does not report any.
+        """
+        self.leftover = [job for job in self.leftover if not job.ready()]
+        return bool(self.leftover)
+
+
+_lock = threading.Lock()
+_current = None
+
+
+@contextmanager
+def worker_pool(processes):
+    """The pool of this process, started the first time it's needed.
+
+    It's replaced when more processes are wanted, when it's stale or when
+    it belongs to the process that this one was forked from. The pool that
+    is replaced is terminated once the last search using it is done.
+    """
+    global _current
+    with _lock:
+        if (_current is None or _current.pid != os.getpid()
+                or _current.processes < processes or _current.stale()):
+            if _current and _current.pid == os.getpid() and not _current.users:
+                _current.pool.terminate()
+            _current = WorkerPool(processes)
+        workers = _current
+        workers.users += 1
+    try:
+        yield workers
+    finally:
+        with _lock:
+            workers.users -= 1
+            if workers is not _current and not workers.users:
+                workers.pool.terminate()
+
+
+@atexit.register
+def shutdown():
+    """Stops the pool of this process, if there is one"""
+    global _current
+    with _lock:
+        if _current and _current.pid == os.getpid():
+            _current.pool.terminate()
+        _current = None
+
+
+class ParallelPairing(Pairing):
+    '''Swiss pairing that keeps the best of several candidates.
+
+    The candidates are compared on the number of players left unpaired,
+    then repeats, then score group mismatch and finally the first/second
+    balance. When two are equally good the one made by the plainer strategy
+    wins, so the result is the same as SwissPairing unless something better
+    was found.
+    '''
+
+    def get_setting(self, name, default):
+        return getattr(settings, name, default)
+
+    def candidates(self):
+        """The (strategy, seed) of each candidate pairing to try"""
+        if self.next_round == 1:
+            # the first round is paired on ratings, there is nothing to search
+            return [('swiss', 0)]
+
+        count = self.get_setting('PAIRING_CANDIDATES', 8)
+        shuffles = [('shuffle', seed) for seed in range(1, count - 1)]
+        return [('swiss', 0), ('matching', 0)] + shuffles
+
+    def make_it(self):
+        if len(self.players) == 0:
+            raise ValueError('No players')
+
+        candidates = self.candidates()
+        self.report(stage='search', candidates=len(candidates))
+        results = self.search(candidates)
+        self.finished = len(results)
+        if not results:
+            # nothing finished within the time budget, a matching takes
+            # polynomial time where the swiss transpositions might not end
+            candidates.append(('matching', 0))
+            results = [(*make_candidate(self.snapshot, 'matching', report=self.report),
+                        len(candidates) - 1)]
+
+        score, pairs, index = min(results, key=lambda r: (r[0], r[2]))
+        self.strategy = candidates[index]
+        self.score = score
+
+        records = {p['id']: p for p in self.players}
+        self.pairs = [[records[a], records[b]] for a, b in pairs]
+        return self.pairs
+
+    def search(self, candidates):
+        """Makes the candidates, in parallel if possible.
+
+        In a pool the candidates that are not done by the deadline are
+        abandoned, the pool is replaced if they keep it busy (see
+        worker_pool). One after the other in this process a candidate can
+        only be stopped when it reports progress (see make_candidate), so a
+        slow matching is waited for.
+        Returns: a list of (score, pairs, index) for the candidates that were
+            made within the PAIRING_SEARCH_TIME, which doesn't include the
+            time taken to start the pool
+        """
+        search_time = self.get_setting('PAIRING_SEARCH_TIME', 10)
+        processes = self.get_setting('PAIRING_PROCESSES', 4)
+
+        if (min(processes, len(candidates)) < 2
+                or 'forkserver' not in multiprocessing.get_all_start_methods()):
+            deadline = time.time() + search_time
+            results = []
+            for index, (strategy, seed) in enumerate(candidates):
+                if time.time() > deadline:
+                    break
+                try:
+                    results.append((*make_candidate(self.snapshot, strategy, seed,
+                                                    deadline, self.report), index))
+                except OutOfTime:
+                    break
+                except Cancelled:
+                    raise
+                except Exception:
+                    logger.exception('Candidate %s %s failed', strategy, seed)
+                self.report(done=len(results))
+            return results
+
+        with worker_pool(processes) as workers:
+            deadline = time.time() + search_time
+            pending = [workers.pool.apply_async(make_candidate,
+                                                (self.snapshot, strategy, seed, deadline))
+                       for strategy, seed in candidates]
+            try:
+                while True:
+                    waiting = [job for job in pending if not job.ready()]
+                    self.report(done=len(pending) - len(waiting))
+                    remaining = deadline - time.time()
+                    if not waiting or remaining <= 0:
+                        break
+                    waiting[0].wait(min(remaining, 0.5))
+            finally:
+                # the candidates that are still being made are not needed
+                workers.leftover += [job for job in pending if not job.ready()]
+
+            results = []
+            for index, job in enumerate(pending):
+                if job.ready():
+                    try:
+                        results.append((*job.get(), index))
+                    except OutOfTime:
+                        pass
+                    except Exception:
+                        logger.exception('Candidate %s %s failed', *candidates[index])
+            return results
@@ -1,5 +1,6 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 from tournament.models import Tournament
+from api.middleware import is_director
 
 class IsAuthenticatedOrReadOnly(BasePermission):
     """
@@ -12,8 +13,7 @@ class IsAuthenticatedOrReadOnly(BasePermission):
         
         if request.user and request.user.is_authenticated:
             if hasattr(request, 'tournament'):
-                td = request.tournament.director_set.filter(user=request.user)
-                if td.exists():
+                if is_director(request):
                     return True
             return request.get_full_path() == '/api/tournament/' and request.method == 'POST'
         return False                        
@@ -6,8 +6,8 @@ class RoundRobinPairing(Pairing):
         super().__init__(rnd)
 
     def make_it(self):
-        if self.rnd.round_no > 1:
-            n = self.rnd.round_no
+        if self.next_round > 1:
+            n = self.next_round
             self.players = self.players[-n:] + self.players[:-n]
 
         for i in range(len(self.players) // 2):
@@ -44,6 +44,31 @@ class BoardResultSerializer(serializers.Serializer):
     p2 = serializers.IntegerField(required=False)
 
 
+class BoardEntrySerializer(serializers.Serializer):
+    """One board in a batch, see TournamentViewSet.batch_boards"""
+    result = serializers.IntegerField()
+    board = serializers.IntegerField(min_value=1)
+    score1 = serializers.IntegerField(allow_null=True)
+    score2 = serializers.IntegerField(allow_null=True)
+    p1 = serializers.IntegerField(required=False)
+    p2 = serializers.IntegerField(required=False)
+
+    def validate(self, data):
+        if (data['score1'] is None) != (data['score2'] is None):
+            raise serializers.ValidationError('Both scores are needed to enter a board')
+        return data
+
+
+class ResultEntrySerializer(serializers.Serializer):
+    """One result in a batch, see TournamentViewSet.batch_results"""
+    result = serializers.IntegerField()
+    score1 = serializers.IntegerField(allow_null=True)
+    score2 = serializers.IntegerField(allow_null=True)
+    games_won = serializers.FloatField(allow_null=True, min_value=0)
+    p1 = serializers.IntegerField(required=False)
+    p2 = serializers.IntegerField(required=False)
+
+
 class ProfileSerializer(serializers.ModelSerializer):
     class Meta:
         fields = ['full_name','preferred_name']
\ No newline at end of file
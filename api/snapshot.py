@@ -0,0 +1,144 @@
+"""Snapshots of a tournament round for the pairing engine.
+
+The pairing classes in api.pairing, api.swiss, api.rr and api.koth only ever
+look at the compact, immutable structures defined here. That means they can
+be run (and profiled) without a database. The two functions at the bottom of
+this module are the adapter between the database and the pairing engine:
+load_snapshot reads everything the engine needs with a handful of bulk
+queries and save_pairs writes the pairings back in bulk.
+"""
+from collections import namedtuple
+
+from django.db.models import Count, Q
+
+from tournament.models import BoardResult, Participant, Result
+
+# A participant as seen by the pairing engine. score is round_wins for team
+# events and game_wins for individual events.
+Player = namedtuple('Player', ['id', 'name', 'rating', 'score', 'game_wins',
+                               'spread', 'white', 'played'])
+
+# players: a tuple of Player for everyone who is to be paired (the Bye
+#     included if the tournament has one but switched off players excluded)
+# history: a tuple of (p1_id, p2_id) for every game played before this round
+# absentees: ids of switched off players, they get a forfeit loss.
+Snapshot = namedtuple('Snapshot', ['round_no', 'repeats', 'players',
+                                   'history', 'absentees'])
+
+
+def load_snapshot(rnd):
+    """Reads the snapshot needed to pair the given round.
+
+    Args: rnd: a TournamentRound instance
+    Returns: a Snapshot
+    Throws: ValueError if the round this pairing is based on is incomplete.
+    """
+    tournament = rnd.tournament
+    rows = Participant.objects.filter(tournament=tournament
+        ).exclude(name='Absent').order_by('id').values_list(
+            'id', 'name', 'rating', 'round_wins', 'game_wins', 'spread',
+            'white', 'played', 'offed')
+
+    players = []
+    absentees = []
+    for pid, name, rating, round_wins, game_wins, spread, white, played, offed in rows:
+        if offed:
+            absentees.append(pid)
+        else:
+            players.append(Player(pid, name, rating,
+                round_wins if tournament.team_size else game_wins,
+                game_wins, spread, white or 0, played or 0))
+
+    if rnd.based_on and rnd.based_on > 0:
+        # this round has a predecessor that needs to be completed.
+        prev = Result.objects.filter(round__tournament=tournament,
+                                     round__round_no=rnd.based_on
+            ).aggregate(total=Count('id'),
+                        pending=Count('id', filter=Q(score1=None)))
+
+        if prev['total'] < len(rows) // 2:
+            raise ValueError(f"round {rnd.based_on} needs to be completed")
+
+        if prev['pending'] and not tournament.round_robin:
+            raise ValueError(f"round {rnd.based_on} needs to be completed")
+
+    history = Result.objects.filter(round__tournament=tournament,
+                                    round__round_no__lt=rnd.round_no
+        ).values_list('p1_id', 'p2_id')
+
+    return Snapshot(rnd.round_no, rnd.repeats, tuple(players),
+                    tuple(history), tuple(absentees))
+
+
+def save_pairs(rnd, pairs, absentees=()):
+    """Writes the pairings produced by the engine to the database.
+
+    Everything is built in memory, byes and forfeits already scored, and
+    inserted with one bulk_create for the results and one for the boards.
+    The standings are then brought up to date with a single set based
+    update. No signals are fired for the rows created here.
+
+    Args: rnd: the TournamentRound that was paired
+          pairs: a list of pairs of player records, the first player in each
+            pair goes first. A record with id None stands for a Bye that does
+            not yet exist in the database.
+          absentees: ids of switched off players who forfeit this round
+    Returns: the list of Result instances that were created.
+    """
+    from api.pairing import build_boards
+
+    tournament = rnd.tournament
+    bye = None
+    if any(p['id'] is None or p['name'] == 'Bye' for pair in pairs for p in pair):
+        bye, _ = Participant.objects.get_or_create(
+            name='Bye', tournament=tournament,
+            defaults = {'name': 'Bye', 'rating': 0,  'tournament': tournament}
+        )
+
+    results = []
+    if absentees:
+        absent, _ = Participant.objects.get_or_create(
+            name='Absent', tournament=tournament,
+            defaults = {'name': 'Absent', 'rating': 0,  'tournament': tournament}
+        )
+        for pid in absentees:
+            r = Result(round=rnd, p1_id=pid, p2_id=absent.id,
+                       score1=0, score2=100, games_won=0)
+            if pid > absent.id:
+                # see result_presave, the lower id always takes up p1
+                r.p1_id, r.p2_id = absent.id, pid
+                r.score1, r.score2 = 100, 0
+                r.games_won = tournament.team_size or 1
+            results.append(r)
+
+    boards = []
+    table = 0
+    for first, second in pairs:
+        p1_id = first['id'] if first['id'] is not None else bye.id
+        p2_id = second['id'] if second['id'] is not None else bye.id
+        r = Result(round=rnd, p1_id=min(p1_id, p2_id), p2_id=max(p1_id, p2_id))
+        if 'Bye' in (first['name'], second['name']):
+            # scored straight away, see Tournament.score_bye
+            score1, score2, games_won, bye_boards = tournament.bye_scores(r.p1_id == bye.id)
+            r.score1, r.score2 = score1, score2
+            if games_won is not None:
+                r.games_won = games_won
+            for board, (b1, b2) in zip(build_boards(tournament, r), bye_boards):
+                board.score1, board.score2 = b1, b2
+                boards.append(board)
+        else:
+            r.starting_id = p1_id
+            table += 1
+            r.table = table
+            boards.extend(build_boards(tournament, r))
+        results.append(r)
+
+    Result.objects.bulk_create(results)
+    BoardResult.objects.bulk_create(boards)
+
+    if absentees or bye:
+        tournament.update_all_standings()
+
+    rnd.paired = True
+    rnd.save()
+    return results
@@ -30,16 +30,19 @@ class SwissPairing(Pairing):
         self.assign_bye()
 
         self.find_brackets()
+        self.attempts = 0
 
         if self.next_round == 1:
             self.pair_first_round()
         else:
+            self.report(stage='normal')
             self.pair_other_round()
             required = len(self.players) // 2
             if self.bye:
                 required += 1
             if len(self.pairs) < required:
                 # the pairing was not completed. Collapse the first two brackets
+                self.report(stage='collapse')
                 self.reset()
                 sorted_brackets_keys = sorted(self.brackets, reverse=True)
                 self.brackets[sorted_brackets_keys[0]].extend(self.brackets[sorted_brackets_keys[1]])
@@ -48,6 +51,7 @@ class SwissPairing(Pairing):
                 self.pair_other_round()
 
                 if len(self.pairs) < required:
+                    self.report(stage='last first')
                     self.reset()
                     # still no luck. Try pairing the last person first
                     last = len(self.players) -1
@@ -61,7 +65,7 @@ class SwissPairing(Pairing):
                     prev = last - 1
                     while prev >= 0:
                         opponent = self.players[prev]
-                        if lp['name'] not in opponent['opponents']:
+                        if not self.times_met(lp, opponent):
                             lp['pair'] = True
                             opponent['pair'] = True
                             self.pair_other_round()
@@ -112,6 +116,7 @@ class SwissPairing(Pairing):
         downfloaters = []
 
         for group_score in sorted_brackets_keys:
+            self.report(bracket=group_score, attempts=self.attempts)
             group = self.brackets[group_score]
             if len(downfloaters) > 0:
                 # TODO: B.5, B.6
@@ -177,9 +182,12 @@ class SwissPairing(Pairing):
 
         # Check simple pairing
         for S2 in transposition(0, S2count):
+            self.attempts += 1
+            if self.attempts % 1000 == 0:
+                self.report(attempts=self.attempts)
             problems = 0
             for index in range(S1count):
-                if S2[index] not in self.find_possible_opponents(S1[index], group):
+                if self.times_met(S1[index], S2[index]) > self.repeats:
                     problems += 1
                     break
 
@@ -206,19 +214,10 @@ class SwissPairing(Pairing):
         for player in group:
             if current_player != player:
                 if player['pair'] is False:
-                    if player['name'] not in current_player['opponents']:
+                    # players who have already met can meet again as long as
+                    # we are within the number of repeats allowed.
+                    if self.times_met(current_player, player) <= self.repeats:
                         rest.append(player)
-                    else:
-                        # already played lets find out if we are within the number
-                        # of repeats that are allowed for this pair
-                        if self.rnd.repeats:
-                            count = 0
-                            for opponent in current_player['opponents']:
-                                if player['name'] == opponent:
-                                    count += 1
-                            
-                            if count <= self.rnd.repeats:
-                                rest.append(player)
 
         return rest
 
@@ -1,5 +1,5 @@
 from django.contrib.auth.models import User
-from api import swiss, koth
+from api import swiss, koth, matching, parallel
 from tournament.models import Tournament, Director, TournamentRound
 from tournament.tools import add_participants, random_results, add_team_members
 
@@ -53,6 +53,20 @@ class Helper:
             if add_results:
                 self.add_results(rnd.tournament)
 
+        elif rnd.pairing_system == TournamentRound.MATCHING:
+            sp = matching.MatchingPairing(rnd)
+            sp.make_it()
+            sp.save()
+            if add_results:
+                self.add_results(rnd.tournament)
+
+        elif rnd.pairing_system == TournamentRound.PARALLEL:
+            sp = parallel.ParallelPairing(rnd)
+            sp.make_it()
+            sp.save()
+            if add_results:
+                self.add_results(rnd.tournament)
+
         else:
             sp = swiss.SwissPairing(rnd)
             sp.make_it()
@@ -35,7 +35,7 @@ class BasicTests(APITransactionTestCase, Helper):
         p2.save()
 
         self.assertGreater(p2.id, p1.id)
-        r = Result(p1=p2, p2=p1, round=self.t1.rounds.all()[0])
+        r = Result(p1=p2, p2=p1, round=self.t1.rounds.get(round_no=1))
         # this one would get saved because the model swaps the fields
         r.save()
         r.refresh_from_db()
@@ -50,11 +50,11 @@ class BasicTests(APITransactionTestCase, Helper):
         p2.save()
 
         
-        r = Result(p1=p2, p2=p1, round=self.t1.rounds.all()[0])
+        r = Result(p1=p2, p2=p1, round=self.t1.rounds.get(round_no=1))
         # this one would get saved because the model swaps the fields
         r.save()
 
-        r = Result(p1=p1, p2=p2, round=self.t1.rounds.all()[0])
+        r = Result(p1=p1, p2=p2, round=self.t1.rounds.get(round_no=1))
         self.assertRaises(IntegrityError, r.save)
 
 
@@ -62,7 +62,7 @@ class BasicTests(APITransactionTestCase, Helper):
         p1, p2, p3, p4 = self.add_players(self.t1, 4)
         # this should be flipped at the time of saving
         Result.objects.create(p1=p2, p2=p1, score1=400, score2=500, 
-                              round=self.t1.rounds.all()[0],games_won=1
+                              round=self.t1.rounds.get(round_no=1),games_won=1
                               )
         self.t1.update_all_standings()
         p1.refresh_from_db()
@@ -80,7 +80,7 @@ class BasicTests(APITransactionTestCase, Helper):
         """Test that border result team1, team2 are ordered"""
         p1, p2, p3, p4 = self.add_players(self.t1, 4)
 
-        rnd = self.t1.rounds.all()[0]
+        rnd = self.t1.rounds.get(round_no=1)
         sp = swiss.SwissPairing(rnd)
         sp.make_it()
         sp.save()
@@ -0,0 +1,131 @@
+import json
+import threading
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.test import SimpleTestCase, override_settings
+from django.urls import re_path
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+
+from api import consumers
+from api.coalesce import Coalescer
+from api.views import broadcast
+
+application = URLRouter([
+    re_path(r"^ws/$", consumers.Watcher.as_asgi()),
+    re_path(r"^ws/tournament/(?P<tournament_id>\d+)/$", consumers.Watcher.as_asgi()),
+    re_path(r"^ws/tournament/(?P<tournament_id>\d+)/round/(?P<round_no>\d+)/$",
+            consumers.Watcher.as_asgi()),
+])
+
+
+@override_settings(CHANNEL_LAYERS={
+    'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class WatcherTests(SimpleTestCase):
+    """Spectators should only hear about the tournaments they watch"""
+
+    def setUp(self):
+        # there's no database here, broadcast needs one for the sequence
+        # and to wait for the transaction to commit
+        for patcher in [patch('tournament.models.next_version', return_value=(1, 3)),
+                        patch('api.views.transaction.on_commit', side_effect=lambda f: f())]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def connect(self, path):
+        communicator = WebsocketCommunicator(application, path)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual("Hello!", json.loads(await communicator.receive_from()))
+        return communicator
+
+    def test_group_names(self):
+        self.assertEqual('tournament_3', consumers.tournament_group(3))
+        self.assertEqual('tournament_3_round_2', consumers.tournament_group('3', 2))
+
+    async def test_subscribe_by_url(self):
+        first = await self.connect('/ws/tournament/1/')
+        second = await self.connect('/ws/tournament/2/')
+        round2 = await self.connect('/ws/tournament/1/round/2/')
+
+        await sync_to_async(broadcast)({'tournament_id': 1, 'results': [], 'round_no': 1})
+        self.assertEqual(1, json.loads(await first.receive_from())['tournament_id'])
+        self.assertTrue(await second.receive_nothing())
+        # just the sequence number, so that the next message is not a gap
+        self.assertEqual({'tournament_id': 1, 'seq': 1}, json.loads(await round2.receive_from()))
+
+        await sync_to_async(broadcast)({'tournament_id': 1, 'round': {'round_no': 2}})
+        self.assertEqual({'round_no': 2}, json.loads(await first.receive_from())['round'])
+        self.assertEqual({'round_no': 2}, json.loads(await round2.receive_from())['round'])
+        self.assertTrue(await second.receive_nothing())
+
+        # progress reports have no seq, only those who watch the round get them
+        await sync_to_async(broadcast)({'tournament_id': 1, 'round_no': 1}, sequenced=False)
+        self.assertNotIn('seq', json.loads(await first.receive_from()))
+        self.assertTrue(await round2.receive_nothing())
+
+        # news about the whole tournament goes to everyone
+        await sync_to_async(broadcast)({'tournament_id': 1, 'participants': []})
+        self.assertEqual([], json.loads(await first.receive_from())['participants'])
+        self.assertEqual([], json.loads(await round2.receive_from())['participants'])
+
+        for c in [first, second, round2]:
+            await c.disconnect()
+
+    async def test_subscribe_by_message(self):
+        watcher = await self.connect('/ws/')
+
+        await sync_to_async(broadcast)({'tournament_id': 5, 'participants': []})
+        self.assertTrue(await watcher.receive_nothing())
+
+        await watcher.send_to(text_data=json.dumps({'subscribe': 5}))
+        await watcher.send_to(text_data='not json')
+        # give the consumer a chance to process the subscription
+        self.assertTrue(await watcher.receive_nothing())
+        await sync_to_async(broadcast)({'tournament_id': 5, 'participants': []})
+        self.assertEqual(5, json.loads(await watcher.receive_from())['tournament_id'])
+
+        await watcher.send_to(text_data=json.dumps({'unsubscribe': 5}))
+        self.assertTrue(await watcher.receive_nothing())
+        await sync_to_async(broadcast)({'tournament_id': 5, 'participants': []})
+        self.assertTrue(await watcher.receive_nothing())
+
+        await watcher.disconnect()
+
+    async def test_resync(self):
+        watcher = await self.connect('/ws/tournament/1/')
+        with patch('api.views.get_resync', return_value={'tournament_id': 1, 'seq': 9}) as m:
+            await watcher.send_to(text_data=json.dumps({'resync': 1, 'round_no': 2}))
+            self.assertEqual(9, json.loads(await watcher.receive_from())['seq'])
+            self.assertEqual((1, 2), m.call_args[0][0:2])
+
+        await watcher.disconnect()
+
+
+class CoalescerTests(SimpleTestCase):
+    """Updates within the window should go out together"""
+
+    def test_window(self):
+        flushed = []
+        done = threading.Event()
+
+        def flush(items):
+            flushed.append(items)
+            done.set()
+
+        c = Coalescer(0.05)
+        for i in range(3):
+            c.add(('t', 1), i, flush)
+        self.assertEqual([], flushed)
+        self.assertTrue(done.wait(2))
+        self.assertEqual([[0, 1, 2]], flushed)
+        self.assertEqual({}, c.pending)
+
+    def test_no_window(self):
+        flushed = []
+        c = Coalescer(0)
+        c.add(('t', 1), 1, flushed.append)
+        c.add(('t', 1), 2, flushed.append)
+        self.assertEqual([[1], [2]], flushed)
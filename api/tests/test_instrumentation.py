@@ -0,0 +1,59 @@
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from rest_framework.test import APITestCase
+
+from tournament.models import Participant, Tournament
+from api import instrumentation
+from api.tests.helper import Helper
+
+
+class InstrumentationTests(APITestCase, Helper):
+
+    def setUp(self) -> None:
+        self.create_tournaments()
+        instrumentation.reset_stats()
+
+    def test_instrument(self):
+        with instrumentation.instrument('test') as record:
+            list(Tournament.objects.all())
+            list(Participant.objects.all())
+            with instrumentation.timed('broadcast'):
+                pass
+            # nested blocks are counted by the outer one
+            with instrumentation.instrument('inner'):
+                list(Tournament.objects.all())
+
+        self.assertEqual(3, record.queries)
+        self.assertGreater(record.db_time, 0)
+        self.assertIn('broadcast', record.sections)
+
+        stats = instrumentation.get_stats()
+        self.assertEqual(['test'], list(stats))
+        self.assertEqual(1, stats['test']['count'])
+        self.assertEqual(3, stats['test']['avg_queries'])
+
+    @patch('api.views.broadcast')
+    def test_endpoints(self, m):
+        self.add_players(self.t1, 4)
+        self.client.get(f'/api/tournament/{self.t1.id}/participant/')
+        self.client.get(f'/api/tournament/{self.t1.id}/participant/')
+
+        self.client.login(username='sri', password='12345')
+        self.client.post(f'/api/tournament/{self.t1.id}/pair/',
+                         {'id': self.t1.rounds.get(round_no=1).id})
+
+        stats = instrumentation.get_stats()
+        self.assertEqual(2, stats['ParticipantViewSet.list']['count'])
+        self.assertIn('serialization', stats['ParticipantViewSet.list'])
+        self.assertIn('pairing', stats['TournamentViewSet.pair'])
+        self.assertGreater(stats['TournamentViewSet.pair']['queries'], 0)
+
+        # only for the staff
+        resp = self.client.get('/api/stats/')
+        self.assertEqual(403, resp.status_code)
+
+        User.objects.filter(username='sri').update(is_staff=True)
+        resp = self.client.get('/api/stats/')
+        self.assertEqual(200, resp.status_code)
+        self.assertIn('TournamentViewSet.pair', resp.data)
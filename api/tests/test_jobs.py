@@ -0,0 +1,148 @@
+import threading
+from unittest.mock import patch
+
+from django.conf import settings
+from django.test import SimpleTestCase
+from rest_framework.test import APITestCase
+
+from tournament.models import Result
+from api import jobs
+from api.tests.helper import Helper
+
+
+class JobQueueTests(SimpleTestCase):
+
+    def test_run(self):
+        queue = jobs.JobQueue(workers=0)
+        sent = []
+
+        def work(job):
+            job.report(stage='one')
+            return 42
+
+        job, created = queue.submit('a', work, notify=lambda j: sent.append(j.state))
+        self.assertTrue(created)
+        self.assertEqual(jobs.DONE, job.state)
+        self.assertEqual(42, job.result)
+        self.assertEqual({'stage': 'one'}, job.progress)
+        self.assertEqual([jobs.RUNNING, jobs.DONE], sent)
+        self.assertIs(job, queue.get(job.id))
+
+        job, _ = queue.submit('a', lambda job: 1 / 0)
+        self.assertEqual(jobs.FAILED, job.state)
+        self.assertIn('division', job.error)
+
+    def test_timeout(self):
+        queue = jobs.JobQueue(workers=0)
+
+        def work(job):
+            while True:
+                job.report(stage='forever')
+
+        job, _ = queue.submit('a', work, timeout=0.05)
+        self.assertEqual(jobs.TIMEOUT, job.state)
+
+    def test_cancel(self):
+        queue = jobs.JobQueue(workers=1)
+        started = threading.Event()
+
+        def work(job):
+            started.set()
+            while True:
+                job.report(stage='waiting')
+
+        job, _ = queue.submit('a', work)
+        started.wait(5)
+
+        # the same key while it's running gives back the same job
+        again, created = queue.submit('a', work)
+        self.assertFalse(created)
+        self.assertIs(job, again)
+
+        queue.cancel(job.id)
+        queue.executor.shutdown(wait=True)
+        self.assertEqual(jobs.CANCELLED, job.state)
+
+    def test_other_process(self):
+        """A job can be seen and cancelled from a process that did not run it"""
+        queue = jobs.JobQueue(workers=1)
+        other = jobs.JobQueue(workers=1)
+        started = threading.Event()
+
+        def work(job):
+            started.set()
+            while True:
+                job.report(stage='waiting')
+
+        job, _ = queue.submit('a', work, info={'tournament_id': 1})
+        started.wait(5)
+
+        self.assertIsNone(other.get(job.id))
+        self.assertEqual(1, other.status(job.id)['tournament_id'])
+        self.assertIsNone(other.status('0' * 32))
+
+        other.cancel(job.id)
+        queue.executor.shutdown(wait=True)
+        self.assertEqual(jobs.CANCELLED, job.state)
+        self.assertEqual(jobs.CANCELLED, other.status(job.id)['state'])
+
+
+@patch('api.views.broadcast')
+class PairingJobTests(APITestCase, Helper):
+
+    def setUp(self) -> None:
+        self.create_tournaments()
+        self.add_players(self.t1, 10)
+        self.rnd = self.t1.rounds.get(round_no=1)
+        self.url = f'/api/tournament/{self.t1.id}/pair/jobs/'
+
+    def test_pair(self, m):
+        resp = self.client.post(self.url, {'id': self.rnd.id})
+        self.assertEqual(403, resp.status_code)
+
+        self.client.login(username='sri', password='12345')
+        resp = self.client.post(self.url, {'id': self.rnd.id})
+        self.assertEqual(202, resp.status_code, resp.data)
+        self.assertEqual(jobs.DONE, resp.data['state'], resp.data)
+        self.assertEqual({'results': 5}, resp.data['result'])
+        self.assertEqual(5, Result.objects.filter(round=self.rnd).count())
+
+        # the progress went to the tournament without a sequence number
+        progress = [c for c in m.call_args_list if 'job' in c[0][0]]
+        self.assertEqual(jobs.RUNNING, progress[0][0][0]['job']['state'])
+        self.assertEqual(jobs.DONE, progress[-1][0][0]['job']['state'])
+        self.assertFalse(progress[0][1]['sequenced'])
+        # and so did the pairing
+        self.assertTrue(any('results' in c[0][0] for c in m.call_args_list))
+
+        resp = self.client.get(f'{self.url}{resp.data["id"]}/')
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(jobs.DONE, resp.data['state'])
+
+        resp = self.client.post(self.url, {'id': self.rnd.id})
+        self.assertEqual(400, resp.status_code)
+
+        # someone else's tournament
+        resp = self.client.post(f'/api/tournament/{self.t2.id}/pair/jobs/', {'id': self.rnd.id})
+        self.assertEqual(403, resp.status_code)
+
+    def test_timeout(self, m):
+        self.client.login(username='sri', password='12345')
+        resp = self.client.post(self.url, {'id': self.rnd.id, 'timeout': 1e-9})
+        self.assertEqual(jobs.TIMEOUT, resp.data['state'], resp.data)
+        self.assertFalse(Result.objects.filter(round=self.rnd).exists())
+
+        resp = self.client.get(f'{self.url}{"0" * 32}/')
+        self.assertEqual(404, resp.status_code)
+
+    def test_bad_timeout(self, m):
+        self.client.login(username='sri', password='12345')
+        for timeout in ['abc', -1, 'nan']:
+            resp = self.client.post(self.url, {'id': self.rnd.id, 'timeout': timeout})
+            self.assertEqual(400, resp.status_code, timeout)
+            self.assertIn('timeout', resp.data)
+
+        # no more than the PAIRING_TIMEOUT
+        resp = self.client.post(self.url, {'id': self.rnd.id, 'timeout': 10 ** 9})
+        self.assertEqual(202, resp.status_code)
+        self.assertEqual(settings.PAIRING_TIMEOUT, jobs.pairing_jobs.get(resp.data['id']).timeout)
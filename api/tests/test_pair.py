@@ -1,20 +1,28 @@
+import json
+import time
 from io import StringIO
 
 from faker import Faker
 
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 from django.contrib.auth.models import User
 from django.db.models import Q
 from django.core.management import call_command
 
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from tournament.models import BoardResult, Participant, TournamentRound, Tournament, Result
 from tournament.tools import add_participants, truncate_rounds
 
-from api import swiss, koth, rr
+from api import swiss, koth, rr, matching, parallel, jobs
+from api.snapshot import Player, Snapshot, load_snapshot
 from api.tests.helper import Helper
+from tournament.management.commands import benchmark_pairing
 
 
 class BasicTests(APITestCase, Helper):
@@ -877,7 +885,7 @@ class KothTests(APITestCase, Helper):
                                                ).order_by('-round_wins', '-game_wins', '-spread', '-rating')
         )
 
-        self.speed_pair(self.t1.rounds.all()[0])
+        self.speed_pair(self.t1.rounds.get(round_no=1))
 
         self.assertEquals(Result.objects.count(), 3)
 
@@ -931,4 +939,329 @@ class TSHTest(APITestCase, Helper):
         sp.make_it()
         sp.save()
 
-        self.assertEquals(rnd.results.count(), 21)
\ No newline at end of file
+        self.assertEquals(rnd.results.count(), 21)
+
+class SnapshotTests(SimpleTestCase):
+    """The pairing engine should work without a database"""
+
+    def snapshot(self, count, round_no=1, history=()):
+        players = tuple(Player(i, f'Player {i}', 2000 - i, 0, 0, 0, 0, 0)
+                        for i in range(1, count + 1))
+        return Snapshot(round_no, 0, players, history, ())
+
+    def test_first_round(self):
+        sp = swiss.SwissPairing.from_snapshot(self.snapshot(500))
+        pairs = sp.make_it()
+        self.assertEqual(250, len(pairs))
+        self.assertEqual((1, 251), (pairs[0][0]['id'], pairs[0][1]['id']))
+
+    def test_odd_gets_a_bye(self):
+        sp = swiss.SwissPairing.from_snapshot(self.snapshot(5))
+        pairs = sp.make_it()
+        self.assertEqual(3, len(pairs))
+        # not yet in the database so the bye does not have an id
+        self.assertEqual('Bye', pairs[0][1]['name'])
+        self.assertIsNone(pairs[0][1]['id'])
+        self.assertEqual(5, pairs[0][0]['id'])
+
+    def test_history(self):
+        """Players who have met before should not be paired again"""
+        sp = koth.Koth.from_snapshot(self.snapshot(4, 2, ((1, 2),)))
+        self.assertEqual(1, sp.times_met(sp.players[0], sp.players[1]))
+        self.assertEqual(1, sp.times_met(sp.players[1], sp.players[0]))
+        self.assertEqual(0, sp.times_met(sp.players[0], sp.players[2]))
+        sp = swiss.SwissPairing.from_snapshot(self.snapshot(4, 2, ((1, 2), (3, 4))))
+        for p1, p2 in sp.make_it():
+            self.assertEqual(0, sp.times_met(p1, p2))
+
+    def test_same_name(self):
+        """Players with the same name are still different players"""
+        players = (Player(1, 'Twin', 1, 1, 1, 0, 0, 1), Player(2, 'Twin', 1, 1, 1, 0, 0, 1),
+                   Player(3, 'Other', 1, 0, 0, 0, 0, 1), Player(4, 'Other', 1, 0, 0, 0, 0, 1))
+        sp = swiss.SwissPairing.from_snapshot(Snapshot(2, 0, players, ((1, 3), (2, 4)), ()))
+        pairs = sorted(sorted([p1['id'], p2['id']]) for p1, p2 in sp.make_it())
+        self.assertEqual([[1, 2], [3, 4]], pairs)
+
+
+class SnapshotQueryTests(APITestCase, Helper):
+    def setUp(self) -> None:
+        self.create_tournaments()
+
+    def test_load(self):
+        """Loading the snapshot should not depend on the number of players"""
+        self.add_players(self.t1, 12)
+        self.speed_pair(self.t1.rounds.get(round_no=1))
+        rnd = self.t1.rounds.get(round_no=2)
+        with self.assertNumQueries(3):
+            snapshot = load_snapshot(rnd)
+        self.assertEqual(12, len(snapshot.players))
+        self.assertEqual(6, len(snapshot.history))
+
+    def test_save(self):
+        """Saving the pairings should not depend on the number of players"""
+        queries = []
+        for count in [7, 21]:
+            t = Tournament.objects.create(name=f'Bulk {count}', start_date='2023-02-25',
+                rated=False, team_size=5, entry_mode='P', num_rounds=3)
+            self.add_players(t, count)
+            sp = swiss.SwissPairing(t.rounds.get(round_no=1))
+            sp.make_it()
+            with CaptureQueriesContext(connection) as ctx:
+                sp.save()
+            queries.append(len(ctx.captured_queries))
+
+            self.assertEqual((count + 1) // 2, Result.objects.filter(round__tournament=t).count())
+            self.assertEqual((count + 1) // 2 * 5, BoardResult.objects.filter(round__tournament=t).count())
+
+            # the bye is scored as score_bye would have done it
+            bye = Result.objects.get(Q(p1__name='Bye') | Q(p2__name='Bye'), round__tournament=t)
+            self.assertEqual((300, 0, 3), (bye.score1, bye.score2, bye.games_won))
+            self.assertEqual([100, 100, 100, 0, 0], list(BoardResult.objects.filter(
+                team1=bye.p1, team2=bye.p2).order_by('board').values_list('score1', flat=True)))
+            self.assertEqual(1, bye.p1.played)
+            self.assertEqual(1, bye.p1.round_wins)
+            self.assertEqual(3, bye.p1.game_wins)
+
+        self.assertEqual(queries[0], queries[1])
+
+
+class MatchingTests(APITestCase, Helper):
+    """Swiss pairing with a maximum weight matching"""
+
+    def setUp(self) -> None:
+        self.create_tournaments()
+        self.t1.rounds.update(pairing_system=TournamentRound.MATCHING)
+
+    def test_no_repeats(self):
+        """Pair every round of the event without repeats"""
+        self.add_players(self.t1, 11)
+        for rnd in self.t1.rounds.order_by('round_no'):
+            self.speed_pair(rnd)
+            self.assertEqual(6, rnd.results.count())
+
+        seen = set()
+        for r in Result.objects.filter(round__tournament=self.t1):
+            self.assertNotIn((r.p1_id, r.p2_id), seen)
+            seen.add((r.p1_id, r.p2_id))
+
+    def test_repeats(self):
+        """Four players can only play three rounds without a repeat"""
+        self.add_players(self.t1, 4)
+        for i in range(1, 4):
+            self.speed_pair(self.t1.rounds.get(round_no=i))
+
+        rnd4 = self.t1.rounds.get(round_no=4)
+        sp = matching.MatchingPairing(rnd4)
+        self.assertEqual([], sp.make_it())
+
+        rnd4.repeats = 1
+        rnd4.save()
+        sp = matching.MatchingPairing(rnd4)
+        self.assertEqual(2, len(sp.make_it()))
+
+    @patch('api.views.broadcast')
+    def test_pair_view(self, m):
+        """The view should pick the pairing system from the round"""
+        self.add_players(self.t1, 6)
+        rnd1 = self.t1.rounds.get(round_no=1)
+        self.client.login(username='sri', password='12345')
+        with patch('api.views.MatchingPairing', wraps=matching.MatchingPairing) as mp:
+            resp = self.client.post(
+                f'/api/tournament/{self.t1.id}/pair/', {'id': rnd1.id})
+            self.assertEqual('ok', resp.data['status'])
+            mp.assert_called_once()
+        self.assertEqual(3, rnd1.results.count())
+
+    def test_score_groups(self):
+        """Leaders should be paired against each other"""
+        players = (Player(1, 'a', 1, 2, 2, 0, 1, 2), Player(2, 'b', 1, 2, 2, 0, 1, 2),
+                   Player(3, 'c', 1, 1, 1, 0, 1, 2), Player(4, 'd', 1, 1, 1, 0, 1, 2),
+                   Player(5, 'e', 1, 0, 0, 0, 1, 2), Player(6, 'f', 1, 0, 0, 0, 1, 2))
+        sp = matching.MatchingPairing.from_snapshot(
+            Snapshot(3, 0, players, ((1, 3), (2, 4), (3, 5), (4, 6)), ()))
+        pairs = [sorted([p1['name'], p2['name']]) for p1, p2 in sp.make_it()]
+        self.assertEqual([['a', 'b'], ['c', 'd'], ['e', 'f']], pairs)
+
+    def test_sparse_repeat(self):
+        """A repeat in the sparse matching should send us to the full graph"""
+        players = tuple(Player(i, f'Player {i}', 2000 - i, 0, 0, 0, 0, 0)
+                        for i in range(1, 21))
+        # the first player has met everyone close to his ideal opponent
+        history = tuple((1, i) for i in range(5, 18))
+        sp = matching.MatchingPairing.from_snapshot(Snapshot(2, 1, players, history, ()))
+        pairs = sp.make_it()
+        self.assertEqual(10, len(pairs))
+        for p1, p2 in pairs:
+            self.assertEqual(0, sp.times_met(p1, p2))
+
+
+class ParallelTests(APITestCase, Helper):
+    """Swiss pairing that keeps the best of several candidates"""
+
+    def setUp(self) -> None:
+        self.create_tournaments()
+        self.t1.rounds.update(pairing_system=TournamentRound.PARALLEL)
+
+    def snapshot(self):
+        # the plain swiss pairing floats three players down a score group
+        # and pairs four who are both due to go first, some shuffles do not
+        players = (Player(1, 'a', 1, 2, 2, 0, 2, 2), Player(2, 'b', 1, 1, 1, 0, 0, 2),
+                   Player(3, 'c', 1, 2, 2, 0, 1, 2), Player(4, 'd', 1, 2, 2, 0, 2, 2),
+                   Player(5, 'e', 1, 1, 1, 0, 2, 2), Player(6, 'f', 1, 2, 2, 0, 2, 2),
+                   Player(7, 'g', 1, 0, 0, 0, 0, 2), Player(8, 'h', 1, 1, 1, 0, 2, 2))
+        return Snapshot(3, 0, players,
+                        ((7, 8), (2, 6), (3, 8), (4, 5), (5, 8), (1, 5)), ())
+
+    def test_no_repeats(self):
+        """Pair every round of the event without repeats"""
+        self.add_players(self.t1, 11)
+        for rnd in self.t1.rounds.order_by('round_no'):
+            self.speed_pair(rnd)
+            self.assertEqual(6, rnd.results.count())
+
+        seen = set()
+        for r in Result.objects.filter(round__tournament=self.t1):
+            self.assertNotIn((r.p1_id, r.p2_id), seen)
+            seen.add((r.p1_id, r.p2_id))
+
+    def test_evaluate(self):
+        sp = swiss.SwissPairing.from_snapshot(self.snapshot())
+        a, b, c, d, e, f, g, h = sp.players
+        self.assertEqual((0, 0, 1, 6), parallel.evaluate(sp, [[a, f], [c, d], [g, e], [b, h]], 4))
+        self.assertEqual((3, 1, 1, 4), parallel.evaluate(sp, [[a, e]], 4))
+
+    def test_best(self):
+        """The best candidate should be better than the plain swiss pairing"""
+        snapshot = self.snapshot()
+        swiss_score, _ = parallel.make_candidate(snapshot, 'swiss')
+        self.assertEqual((0, 0, 3, 14), swiss_score)
+
+        sp = parallel.ParallelPairing.from_snapshot(snapshot)
+        pairs = sp.make_it()
+        self.assertLess(sp.score, swiss_score)
+        self.assertEqual(4, len(pairs))
+        ids = [p['id'] for pair in pairs for p in pair]
+        self.assertEqual(8, len(set(ids)))
+        for p1, p2 in pairs:
+            self.assertEqual(0, sp.times_met(p1, p2))
+
+    @override_settings(PAIRING_PROCESSES=2)
+    def test_processes(self):
+        """The pool should make the same candidates as this process"""
+        sp = parallel.ParallelPairing.from_snapshot(self.snapshot())
+        candidates = sp.candidates()
+        pooled = sp.search(candidates)
+        self.assertEqual(len(candidates), len(pooled))
+
+        with override_settings(PAIRING_PROCESSES=0):
+            self.assertEqual(pooled, sp.search(candidates))
+
+    @override_settings(PAIRING_PROCESSES=2)
+    def test_pool_reused(self):
+        """The pool is started once and replaced while it's still busy"""
+        sp = parallel.ParallelPairing.from_snapshot(self.snapshot())
+        candidates = sp.candidates()
+        sp.search(candidates)
+        workers = parallel._current
+        self.addCleanup(parallel.shutdown)
+
+        sp.search(candidates)
+        self.assertIs(workers, parallel._current)
+        self.assertFalse(workers.stale())
+
+        with override_settings(PAIRING_SEARCH_TIME=0):
+            sp.search(candidates * 20)
+        self.assertTrue(workers.leftover)
+
+        # a candidate that is still running when the next search starts
+        workers.leftover = [Mock(**{'ready.return_value': False})]
+        sp.search(candidates)
+        self.assertIsNot(workers, parallel._current)
+
+    @override_settings(PAIRING_SEARCH_TIME=0)
+    def test_time_budget(self):
+        """Out of time a matching is made, it does not take long"""
+        sp = parallel.ParallelPairing.from_snapshot(self.snapshot())
+        self.assertEqual(4, len(sp.make_it()))
+        self.assertEqual(('matching', 0), sp.strategy)
+
+        # the swiss transpositions give up when they are out of time
+        with self.assertRaises(parallel.OutOfTime):
+            parallel.make_candidate(self.snapshot(), 'swiss', deadline=time.time() - 1)
+
+    def test_cancel(self):
+        """Cancelling the job stops the candidate being made"""
+        def progress(**kwargs):
+            if not kwargs:
+                # checked from inside the candidate
+                raise jobs.Cancelled()
+
+        sp = parallel.ParallelPairing.from_snapshot(self.snapshot())
+        sp.progress = progress
+        with self.assertRaises(jobs.Cancelled):
+            sp.make_it()
+
+    @patch('api.views.broadcast')
+    def test_pair_view(self, m):
+        """The view should pick the pairing system from the round"""
+        self.add_players(self.t1, 6)
+        rnd1 = self.t1.rounds.get(round_no=1)
+        self.client.login(username='sri', password='12345')
+        with patch('api.views.ParallelPairing', wraps=parallel.ParallelPairing) as pp:
+            resp = self.client.post(
+                f'/api/tournament/{self.t1.id}/pair/', {'id': rnd1.id})
+            self.assertEqual('ok', resp.data['status'])
+            pp.assert_called_once()
+        self.assertEqual(3, rnd1.results.count())
+
+
+class BenchmarkTests(APITestCase):
+    def test_percentile(self):
+        """Nearest rank, without rounding halves to even"""
+        values = list(range(1, 11))
+        self.assertEqual(5, benchmark_pairing.percentile(values, 50))
+        self.assertEqual(9, benchmark_pairing.percentile(values, 90))
+        self.assertEqual(10, benchmark_pairing.percentile(values, 95))
+        self.assertEqual(10, benchmark_pairing.percentile(values, 100))
+        self.assertEqual(1, benchmark_pairing.percentile(values, 0))
+        self.assertEqual(7, benchmark_pairing.percentile([7], 50))
+
+    @override_settings(PAIRING_PROCESSES=2)
+    def test_benchmark_parallel(self):
+        """The parallel search is benchmarked with and without the pool"""
+        self.addCleanup(parallel.shutdown)
+        out = StringIO()
+        call_command('benchmark_pairing', players=8, rounds=2,
+                     systems='parallel,parallel-serial', stdout=out)
+        report = json.loads(out.getvalue())
+
+        for name in ['parallel', 'parallel-serial']:
+            rounds = report['systems'][name]['rounds']
+            self.assertEqual([1, 8], [r['candidates'] for r in rounds])
+            self.assertEqual(0, rounds[1]['score'][0])
+        self.assertIsNotNone(parallel._current)
+
+    def test_benchmark(self):
+        """The benchmark reports every round and leaves nothing behind"""
+        out = StringIO()
+        with patch.object(benchmark_pairing, 'make_pairing',
+                          wraps=benchmark_pairing.make_pairing) as m:
+            call_command('benchmark_pairing', players=7, rounds=2,
+                         systems='swiss,rr,koth,matching', stdout=out)
+        report = json.loads(out.getvalue())
+        # time and memory come from the same run, each round is paired once
+        self.assertEqual(8, m.call_count)
+
+        self.assertEqual(['swiss', 'rr', 'koth', 'matching'], list(report['systems']))
+        for system in report['systems'].values():
+            self.assertEqual(2, len(system['rounds']))
+            self.assertLessEqual(system['latency']['p50'], system['latency']['max'])
+            self.assertGreater(system['queries']['total'], 0)
+            self.assertGreater(system['peak_memory'], 0)
+
+        out = StringIO()
+        call_command('benchmark_pairing', players=7, rounds=2, systems='swiss',
+                     memory=False, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertNotIn('peak_memory', report['systems']['swiss'])
+        self.assertEqual(0, Tournament.objects.count())
@@ -1,13 +1,23 @@
-from django.test import TestCase
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.db import connection
 from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 
-from tournament.models import BoardResult, Participant, Director, Tournament, Result
-from tournament.tools import add_participants
+from tournament.models import (BoardResult, Participant, Director, Tournament, TeamMember,
+                               Result, standings_drift, update_results)
+from tournament.tools import add_participants, add_team_members, truncate_rounds
 
 from api import swiss
 from api.pairing import create_boards, delete_boards
 from api.tests.helper import Helper
+from api.views import (broadcast, broadcast_results, get_resync, get_results,
+                       get_participants, get_standings)
+from tournament import cache
 
 
 class BasicTests(TestCase, Helper):
@@ -31,7 +41,7 @@ class BasicTests(TestCase, Helper):
 
     def test_update_standings_by_team(self):
         self.add_players(self.t1, 3)
-        self.speed_pair(self.t1.rounds.all()[0])
+        self.speed_pair(self.t1.rounds.get(round_no=1))
         p1 = Participant.objects.all()[0]
         self.assertEqual(p1.played, 1)
         p1.game_wins = 0
@@ -50,7 +60,7 @@ class BasicTests(TestCase, Helper):
     def test_update_standings_by_player(self):
         """Team tournaments results are entered for each player"""
         self.add_players(self.t2, 3)
-        rnd = self.t2.rounds.all()[0]
+        rnd = self.t2.rounds.get(round_no=1)
         self.speed_pair(rnd)
 
         # get the result that's not a bye
@@ -73,7 +83,7 @@ class BasicTests(TestCase, Helper):
     def test_update_standings_singles(self):
         """Edit a score for a singles tournament"""
         self.add_players(self.t3, 3)
-        rnd = self.t3.rounds.all()[0]
+        rnd = self.t3.rounds.get(round_no=1)
         self.speed_pair(rnd)
 
         # get the result that's not a bye
@@ -102,7 +112,7 @@ class BasicTests(TestCase, Helper):
     def test_edit_board_result(self):
         """Add results for all the boards and then edit one"""
         self.add_players(self.t2, 2)
-        rnd = self.t2.rounds.all()[0]
+        rnd = self.t2.rounds.get(round_no=1)
 
         sp = swiss.SwissPairing(rnd)
         sp.make_it()
@@ -145,7 +155,7 @@ class BasicTests(TestCase, Helper):
     def test_edit_bye(self):
         """The TD might need to edit the bye to impose a penalty"""
         self.add_players(self.t3, 3)
-        rnd = self.t3.rounds.all()[0]
+        rnd = self.t3.rounds.get(round_no=1)
         self.speed_pair(rnd)
 
         # get the result that's a bye
@@ -166,10 +176,57 @@ class BasicTests(TestCase, Helper):
             p1.refresh_from_db()
             self.assertEqual(p1.spread, 200)
 
+    def test_board_totals(self):
+        """Entering a board is a fixed number of queries and the team
+        members' spreads follow the boards"""
+        p1, p2 = self.add_players(self.t2, 2)
+        add_team_members(self.t2)
+        rnd = self.t2.rounds.get(round_no=1)
+        self.speed_pair(rnd, add_results=False)
+
+        r = rnd.results.get()
+        boards = list(BoardResult.objects.select_related('round').filter(round=rnd).order_by('board'))
+        self.assertEqual(5, len(boards))
+
+        # the board, the totals and the standings
+        b = boards[0]
+        b.score1, b.score2 = 400, 300
+        with self.assertNumQueries(3):
+            b.save()
+
+        r.refresh_from_db()
+        self.assertEqual((400, 300, 1), (r.score1, r.score2, r.games_won))
+
+        b.score1 = 350
+        b.save()
+        boards[1].score1, boards[1].score2 = 300, 300
+        boards[1].save()
+
+        r.refresh_from_db()
+        self.assertEqual((650, 600, 1.5), (r.score1, r.score2, r.games_won))
+
+        team1 = Participant.objects.get(pk=r.p1_id)
+        self.assertEqual(1, team1.played)
+        self.assertEqual(1.5, team1.game_wins)
+        self.assertEqual(50, team1.spread)
+
+        # edited, not added twice
+        self.assertEqual(50, TeamMember.objects.get(team=r.p1_id, board=1).spread)
+        self.assertEqual(-50, TeamMember.objects.get(team=r.p2_id, board=1).spread)
+        self.assertEqual(0, TeamMember.objects.get(team=r.p1_id, board=2).spread)
+
+        # clearing the boards takes the result out of the standings
+        for b in boards[:2]:
+            b.score1 = b.score2 = None
+            b.save()
+        team1.refresh_from_db()
+        self.assertEqual((0, 0, 0), (team1.played, team1.game_wins, team1.spread))
+        self.assertEqual(0, TeamMember.objects.get(team=r.p1_id, board=1).spread)
+
     def test_edit_by_team(self):
         """Editing a score, set it to be a tie"""
         self.add_players(self.t2, 3)
-        rnd = self.t2.rounds.all()[0]
+        rnd = self.t2.rounds.get(round_no=1)
         self.speed_pair(rnd)
 
         r = rnd.results.exclude(p1__name='Bye').exclude(p2__name='Bye')[0]
@@ -197,7 +254,7 @@ class BasicTests(TestCase, Helper):
         p1, = self.add_players(self.t1, 1)
 
         self.assertEquals(p1.game_wins, 0)
-        r = Result.objects.create(p1=p1, p2=bye, round=self.t1.rounds.all()[0])
+        r = Result.objects.create(p1=p1, p2=bye, round=self.t1.rounds.get(round_no=1))
         self.t1.score_bye(r)
         p1.refresh_from_db()
         self.assertEquals(0, p1.white)
@@ -213,7 +270,7 @@ class BasicTests(TestCase, Helper):
         self.assertEquals(str(p1), f'{p1.name} 0 0')
 
         self.assertEquals(p1.game_wins, 0)
-        r = Result.objects.create(p2=p1, p1=bye, round=self.t1.rounds.all()[0])
+        r = Result.objects.create(p2=p1, p1=bye, round=self.t1.rounds.get(round_no=1))
         self.t1.score_bye(r)
         p1.refresh_from_db()
         self.assertEquals(0, p1.white)
@@ -225,7 +282,7 @@ class BasicTests(TestCase, Helper):
         bye = Participant.objects.create(name="Bye", tournament=self.t3)
         p1, = self.add_players(self.t3, 1)
         self.assertEquals(p1.game_wins, 0)
-        r = Result.objects.create(p1=p1, p2=bye, round=self.t1.rounds.all()[0])
+        r = Result.objects.create(p1=p1, p2=bye, round=self.t1.rounds.get(round_no=1))
         self.t1.score_bye(r)
         p1.refresh_from_db()
         self.assertEquals(0, p1.white)
@@ -238,7 +295,7 @@ class BasicTests(TestCase, Helper):
         p1, = self.add_players(self.t3, 1)
         self.assertEquals(str(p1), f'{p1.name} 0 0')
         self.assertEquals(p1.game_wins, 0)
-        r = Result.objects.create(p2=p1, p1=bye, round=self.t1.rounds.all()[0])
+        r = Result.objects.create(p2=p1, p1=bye, round=self.t1.rounds.get(round_no=1))
         self.t1.score_bye(r)
         p1.refresh_from_db()
         self.assertEquals(0, p1.white)
@@ -271,6 +328,31 @@ class BasicTests(TestCase, Helper):
         self.assertEqual(result.score2, 200)
         self.assertEqual(result.games_won, 0)
 
+    @patch('api.views.broadcast')
+    def test_result_view_locks(self, m):
+        """The result is read under a lock, what it was decides the standings"""
+        add_participants(self.t3, True, 4)
+        rnd = self.t3.rounds.get(round_no=1)
+        self.speed_pair(rnd, add_results=False)
+        self.client.login(username='sri', password='12345')
+        result = rnd.results.all()[0]
+
+        # already scored, the edit has to take that score back out
+        other = Result.objects.get(pk=result.pk)
+        other.score1, other.score2, other.games_won = 300, 200, 1
+        other.save()
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.put(
+                f'/api/tournament/{self.t3.id}/result/',
+                {'result': result.id, 'games_won': 0, 'score1': 100, 'score2': 200},
+                content_type='application/json'
+            )
+        self.assertEqual(resp.status_code, 200, resp.content)
+        self.assertTrue(any('FOR UPDATE' in q['sql'] and 'tournament_result' in q['sql']
+                            for q in ctx.captured_queries))
+        self.assertEqual([], standings_drift(self.t3))
+
 
     def test_post_result_flipped(self):
         self.add_players(self.t2, 2)
@@ -299,6 +381,154 @@ class BasicTests(TestCase, Helper):
         self.assertEquals(b.score1, 100)
         
 
+    @patch('api.views.broadcast')
+    def test_post_boards(self, m):
+        """All the boards of two matches in one request"""
+        self.add_players(self.t2, 4)
+        self.client.login(username='ashok', password='12345')
+        rnd = self.t2.rounds.get(round_no=1)
+        self.client.post(f'/api/tournament/{self.t2.id}/pair/', {'id': rnd.id})
+        first, second = rnd.results.order_by('id')
+        m.reset_mock()
+
+        boards = [{'result': first.id, 'board': i, 'score1': 400, 'score2': 300}
+                  for i in range(1, 6)]
+        # flipped, second.p2 is reported first
+        boards += [{'result': second.id, 'board': i, 'score1': 400, 'score2': 300,
+                    'p1': second.p2_id, 'p2': second.p1_id} for i in range(1, 4)]
+
+        resp = self.client.post(f'/api/tournament/{self.t2.id}/boards/batch/',
+            {'boards': boards}, content_type='application/json')
+        self.assertEqual(200, resp.status_code, resp.content)
+        self.assertEqual(8, resp.data['boards'])
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((2000, 1500, 5), (first.score1, first.score2, first.games_won))
+        self.assertEqual((900, 1200, 0), (second.score1, second.score2, second.games_won))
+
+        p = Participant.objects.get(pk=first.p1_id)
+        self.assertEqual((1, 5, 1, 500), (p.played, p.game_wins, p.round_wins, p.spread))
+        p = Participant.objects.get(pk=second.p2_id)
+        self.assertEqual((1, 5, 1, 300), (p.played, p.game_wins, p.round_wins, p.spread))
+
+        # one broadcast with the whole round
+        self.assertEqual(1, m.call_count)
+        self.assertEqual(2, len(m.call_args[0][0]['results']))
+
+    @patch('api.views.broadcast')
+    def test_post_boards_invalid(self, m):
+        """Nothing is saved unless every board is valid"""
+        self.add_players(self.t2, 2)
+        rnd = self.t2.rounds.get(round_no=1)
+        self.client.login(username='ashok', password='12345')
+        self.client.post(f'/api/tournament/{self.t2.id}/pair/', {'id': rnd.id})
+        result = rnd.results.get()
+
+        for boards in [
+                    [{'result': result.id, 'board': 1, 'score1': 400, 'score2': 300},
+                     {'result': result.id, 'board': 9, 'score1': 400, 'score2': 300}],
+                    [{'result': result.id, 'board': 1, 'score1': 400, 'score2': 300},
+                     {'result': result.id, 'board': 1, 'score1': 400, 'score2': 300}],
+                    [{'result': result.id, 'board': 1, 'score1': 400, 'score2': None}],
+                    [{'result': result.id, 'board': 1, 'score1': 'x', 'score2': 300}],
+                    []]:
+            resp = self.client.post(f'/api/tournament/{self.t2.id}/boards/batch/',
+                {'boards': boards}, content_type='application/json')
+            self.assertEqual(400, resp.status_code, boards)
+
+        self.assertFalse(BoardResult.objects.exclude(score1=None).exists())
+
+        # by team tournaments do not have boards
+        self.client.login(username='sri', password='12345')
+        resp = self.client.post(f'/api/tournament/{self.t1.id}/boards/batch/',
+            {'boards': []}, content_type='application/json')
+        self.assertEqual(400, resp.status_code)
+
+        # and a director of another event cannot enter them
+        resp = self.client.post(f'/api/tournament/{self.t2.id}/boards/batch/',
+            {'boards': [{'result': result.id, 'board': 1, 'score1': 400, 'score2': 300}]},
+            content_type='application/json')
+        self.assertEqual(403, resp.status_code)
+
+    @patch('api.views.broadcast')
+    def test_post_results(self, m):
+        """All the results of a round in one request"""
+        for count in [6, 13]:
+            t = Tournament.objects.create(name=f'Batch {count}', start_date='2023-02-25',
+                                          rated=False, num_rounds=3)
+            Director.objects.create(tournament=t, user=User.objects.get(username='sri'))
+            self.add_players(t, count)
+            rnd = t.rounds.get(round_no=1)
+            self.speed_pair(rnd, add_results=False)
+            self.client.login(username='sri', password='12345')
+            m.reset_mock()
+
+            results = list(rnd.results.exclude(p1__name='Bye').exclude(p2__name='Bye'))
+            entries = [{'result': r.id, 'score1': 400, 'score2': 300 + i, 'games_won': 1}
+                       for i, r in enumerate(results)]
+            # the last one is reported from the other side
+            r = results[-1]
+            entries[-1].update({'p1': r.p2_id, 'p2': r.p1_id})
+
+            with CaptureQueriesContext(connection) as ctx:
+                resp = self.client.post(f'/api/tournament/{t.id}/result/batch/',
+                    {'round': rnd.id, 'results': entries}, content_type='application/json')
+            self.assertEqual(200, resp.status_code, resp.content)
+            if count == 6:
+                queries = len(ctx.captured_queries)
+            else:
+                # does not depend on the number of results
+                self.assertEqual(queries, len(ctx.captured_queries))
+
+            self.assertEqual(rnd.results.count(), len(resp.data['results']))
+            self.assertEqual([], standings_drift(t))
+            r.refresh_from_db()
+            self.assertEqual((300 + len(entries) - 1, 400, 0), (r.score1, r.score2, r.games_won))
+
+            # one broadcast with the whole round
+            self.assertEqual(1, m.call_count)
+
+            # posting the same thing again changes nothing
+            resp = self.client.post(f'/api/tournament/{t.id}/result/batch/',
+                {'round': rnd.id, 'results': entries}, content_type='application/json')
+            self.assertEqual(200, resp.status_code, resp.content)
+            self.assertEqual([], standings_drift(t))
+
+    @patch('api.views.broadcast')
+    def test_post_results_invalid(self, m):
+        """Nothing is saved unless every result is valid"""
+        self.add_players(self.t3, 4)
+        rnd = self.t3.rounds.get(round_no=1)
+        self.speed_pair(rnd, add_results=False)
+        first, second = rnd.results.order_by('id')
+        other = self.t3.rounds.get(round_no=2)
+        self.client.login(username='sri', password='12345')
+
+        valid = {'result': first.id, 'score1': 400, 'score2': 300, 'games_won': 1}
+        for rid, entries in [
+                    (rnd.id, [valid, dict(valid)]),
+                    (rnd.id, [valid, {'result': second.id, 'score1': 1, 'score2': 2, 'games_won': 3}]),
+                    (rnd.id, [valid, {'result': second.id, 'score1': 1, 'score2': 2,
+                                      'games_won': 0, 'p1': first.p1_id, 'p2': second.p2_id}]),
+                    (rnd.id, [valid, {'result': 0, 'score1': 1, 'score2': 2, 'games_won': 0}]),
+                    (other.id, [valid]),
+                    (None, [valid]),
+                    (rnd.id, [])]:
+            resp = self.client.post(f'/api/tournament/{self.t3.id}/result/batch/',
+                {'round': rid, 'results': entries}, content_type='application/json')
+            self.assertEqual(400, resp.status_code, entries)
+
+        self.assertFalse(Result.objects.exclude(score1=None).exists())
+        m.assert_not_called()
+
+        # boards are needed for a tournament by player
+        self.client.login(username='ashok', password='12345')
+        resp = self.client.post(f'/api/tournament/{self.t2.id}/result/batch/',
+            {'round': self.t2.rounds.get(round_no=1).id, 'results': [valid]},
+            content_type='application/json')
+        self.assertEqual(400, resp.status_code)
+
     def test_create_delete_boards(self):
         add_participants(self.t2, True, 2)
         p = self.t2.participants.all()
@@ -312,3 +542,193 @@ class BasicTests(TestCase, Helper):
 
         delete_boards(result)
         self.assertEquals(BoardResult.objects.count(), 0)
+
+    def test_delta_standings(self):
+        """Edits applied as deltas should add up to a full recompute"""
+        for t in [self.t1, self.t3]:
+            self.add_players(t, 7)
+            for i in range(1, 4):
+                self.speed_pair(t.rounds.get(round_no=i))
+
+            r = t.rounds.get(round_no=1).results.exclude(
+                p1__name='Bye').exclude(p2__name='Bye')[0]
+            r.score1 = r.score1 + 10
+            r.games_won = 0 if r.games_won else (t.team_size or 1)
+            r.starting_id = r.p2_id
+            r.save()
+
+            self.assertEqual([], standings_drift(t))
+
+    @override_settings(INCREMENTAL_STANDINGS=False)
+    def test_full_standings(self):
+        self.add_players(self.t3, 5)
+        self.speed_pair(self.t3.rounds.get(round_no=1))
+        self.assertEqual([], standings_drift(self.t3))
+
+        rnd = self.t3.rounds.get(round_no=2)
+        self.speed_pair(rnd, add_results=False)
+        results = list(Result.objects.filter(round=rnd, score1__isnull=True))
+        for r in results:
+            r.score1, r.score2, r.games_won = 400, 300, 1
+        with CaptureQueriesContext(connection) as ctx:
+            update_results(results, self.t3)
+        # no round or tournament is fetched for each result
+        self.assertFalse(any('LIMIT 21' in q['sql'] for q in ctx.captured_queries))
+        self.assertEqual([], standings_drift(self.t3))
+
+    def test_standings_command(self):
+        self.add_players(self.t3, 4)
+        self.speed_pair(self.t3.rounds.get(round_no=1))
+        Participant.objects.filter(pk=self.t3.participants.all()[0].pk).update(spread=1000)
+
+        out = StringIO()
+        call_command('standings', tournament_id=self.t3.id, stdout=out)
+        self.assertIn('1 participants out of sync', out.getvalue())
+        self.assertEqual(1, len(standings_drift(self.t3)))
+
+        call_command('standings', tournament_id=self.t3.id, fix=True, stdout=out)
+        self.assertEqual([], standings_drift(self.t3))
+
+    def test_bulk_rebuild(self):
+        """All the standings are rebuilt with a single statement"""
+        for t in [self.t1, self.t3]:
+            self.add_players(t, 6)
+            for i in range(1, 3):
+                self.speed_pair(t.rounds.get(round_no=i))
+
+            Participant.objects.filter(tournament=t).update(
+                played=0, game_wins=0, round_wins=0, spread=0, white=0)
+            self.assertNotEqual([], standings_drift(t))
+            with self.assertNumQueries(1):
+                t.update_all_standings()
+            self.assertEqual([], standings_drift(t))
+
+            truncate_rounds(t, 1)
+            self.assertEqual([], standings_drift(t))
+            self.assertEqual({1}, set(t.participants.values_list('played', flat=True)))
+
+    @patch('api.views.broadcast')
+    def test_result_delta(self, m):
+        """Only the result that changed should be broadcast"""
+        self.add_players(self.t3, 6)
+        self.speed_pair(self.t3.rounds.get(round_no=1), add_results=False)
+        self.client.login(username='sri', password='12345')
+        result = self.t3.rounds.get(round_no=1).results.all()[0]
+
+        resp = self.client.put(
+            f'/api/tournament/{self.t3.id}/result/',
+            {'result': result.id, 'games_won': 1, 'score1': 400, 'score2': 300},
+            content_type='application/json'
+        )
+        self.assertEquals(resp.status_code, 200, resp.content)
+
+        message = m.call_args[0][0]
+        self.assertNotIn('results', message)
+        self.assertEqual(1, message['round_no'])
+        self.assertEqual(result.id, message['result']['id'])
+        self.assertEqual(400, message['result']['score1'])
+        self.assertEqual(100, message['result']['p1']['spread'])
+        self.assertEqual(-100, message['result']['p2']['spread'])
+
+    def test_sequence(self):
+        """Each broadcast gets the next sequence number"""
+        self.add_players(self.t3, 4)
+        self.speed_pair(self.t3.rounds.get(round_no=1))
+
+        first = {'tournament_id': self.t3.id}
+        second = {'tournament_id': self.t3.id}
+        with self.captureOnCommitCallbacks(execute=True):
+            broadcast(first)
+            broadcast(second)
+            # not until the changes are committed
+            self.assertNotIn('seq', first)
+        self.assertEqual(first['seq'] + 1, second['seq'])
+
+        # saving a stale copy of the tournament should not reset it
+        self.t3.private = False
+        self.t3.save()
+        message = get_resync(self.t3.id)
+        self.assertEqual(second['seq'], message['seq'])
+        self.assertEqual(1, message['round_no'])
+        self.assertEqual(2, len(message['results']))
+        self.assertEqual(4, len(message['participants']))
+
+        self.t3.private = True
+        self.t3.save()
+        self.assertIsNone(get_resync(self.t3.id))
+        self.assertIsNotNone(get_resync(self.t3.id, 1, User.objects.get(username='sri')))
+
+    @patch('api.views.broadcast')
+    def test_coalesced_results(self, m):
+        """Several results entered within a window go out as the whole round"""
+        self.add_players(self.t3, 6)
+        rnd = self.t3.rounds.get(round_no=1)
+        self.speed_pair(rnd)
+        ids = list(rnd.results.values_list('id', flat=True))
+
+        broadcast_results(self.t3, rnd.id, 1, ids[0:1] * 2)
+        self.assertEqual(ids[0], m.call_args[0][0]['result']['id'])
+
+        broadcast_results(self.t3, rnd.id, 1, ids)
+        self.assertEqual(3, len(m.call_args[0][0]['results']))
+
+    def test_standings_version(self):
+        """Standings read before a write commits are never cached as the
+        version that the write makes"""
+        self.add_players(self.t3, 4)
+        rnd = self.t3.rounds.get(round_no=1)
+        self.speed_pair(rnd, add_results=False)
+        version = cache.get_version(self.t3.id)
+        get_standings(self.t3.id)
+
+        result = rnd.results.all()[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            result.score1, result.score2, result.games_won = 400, 300, 1
+            result.save()
+            self.assertEqual(version, cache.get_version(self.t3.id))
+            get_standings(self.t3.id)
+            key = cache.CACHED_KEY.format(tid=self.t3.id, version=version + 1, name='standings')
+            self.assertIsNone(cache.cache.get(key))
+
+        self.assertEqual(version + 1, cache.get_version(self.t3.id))
+        self.assertEqual(100, get_standings(self.t3.id)[result.p1_id]['spread'])
+
+    def test_bulk_delete(self):
+        """Results are deleted in one query, the version is bumped once"""
+        self.add_players(self.t3, 40)
+        rnd = self.t3.rounds.get(round_no=1)
+        self.speed_pair(rnd)
+        version = cache.get_version(self.t3.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(1):
+                self.assertEqual(20, Result.objects.filter(round=rnd).delete()[0])
+        self.assertEqual(version, cache.get_version(self.t3.id))
+
+        self.client.login(username='sri', password='12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(f'/api/tournament/{self.t3.id}/unpair/', {'id': rnd.id})
+        self.assertEqual('ok', resp.json()['status'])
+        self.assertLess(version, cache.get_version(self.t3.id))
+
+    def test_ranking_per_tournament(self):
+        """Positions are counted within each tournament"""
+        for t in [self.t1, self.t3]:
+            self.add_players(t, 5)
+            self.speed_pair(t.rounds.get(round_no=1))
+
+        rnd = self.t3.rounds.get(round_no=1)
+        results = get_results(self.t3, rnd.id)
+        self.assertEqual(3, len(results))
+
+        pos = sorted(r[p]['pos'] for r in results for p in ['p1', 'p2']
+                     if r[p]['name'] != 'Bye')
+        self.assertEqual(1, pos[0])
+        self.assertTrue(all(r['p1']['tournament_id'] == self.t3.id for r in results))
+
+        participants = get_participants(self.t3.id)
+        self.assertEqual(sorted(pos), sorted(p['pos'] for p in participants if p['name'] != 'Bye'))
+
+        # the standings are computed once and reused until something changes
+        with self.assertNumQueries(1):
+            get_results(self.t3, rnd.id)
@@ -3,6 +3,7 @@ import json
 
 from unittest.mock import patch
 from django.urls import reverse
+from django.test import override_settings
 from django.contrib.auth.models import User
 from django.forms.models import model_to_dict
 
@@ -11,7 +12,8 @@ from channels.testing import HttpCommunicator
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from tournament import models
+from tournament import models, cache, checks
+from ratings.models import NationalRating
 from api.tests.helper import Helper
 
 
@@ -89,6 +91,76 @@ class BasicTests(APITestCase):
         self.assertIsNone(resp.data['participants'])
 
 
+    def test_retrieve_etag(self):
+        """Unchanged tournaments should get a 304"""
+        resp = self.client.get(f'/api/tournament/{self.t1.id}/')
+        tag = resp.headers['ETag']
+
+        resp = self.client.get(f'/api/tournament/{self.t1.id}/', HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(resp.status_code, 304)
+
+        # served from the cache without touching the database
+        with self.assertNumQueries(0):
+            resp = self.client.get(f'/api/tournament/{self.t1.id}/')
+            self.assertEqual(resp.status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            models.Participant.objects.create(name="bada", tournament=self.t1)
+            # the version only changes when the new participant is committed
+            self.assertEqual(tag, cache.etag(self.t1.id, cache.get_version(self.t1.id)))
+
+        resp = self.client.get(f'/api/tournament/{self.t1.id}/', HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(tag, resp.headers['ETag'])
+        self.assertEqual('bada', resp.data['participants'][0]['name'])
+
+
+    def test_shared_cache_check(self):
+        """Each process having its own cache is only alright while debugging"""
+        with override_settings(DEBUG=False):
+            self.assertEqual(['tournament.E001'], [e.id for e in checks.check_shared_cache(None)])
+        with override_settings(DEBUG=True):
+            self.assertEqual([], checks.check_shared_cache(None))
+        with override_settings(DEBUG=False, CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                'LOCATION': 'redis://localhost:6379'}}):
+            self.assertEqual([], checks.check_shared_cache(None))
+
+    def test_tournament_context(self):
+        """The tournament and its directors are cached between requests"""
+        self.client.login(username='testuser', password='12345')
+        resp = self.client.post(f'/api/tournament/{self.t1.id}/random_fill/', {'fill': 2})
+        self.assertEqual(403, resp.status_code)
+
+        # only the session and the user are read now, the permission check
+        # and the view share the cached tournament and directors
+        with self.assertNumQueries(2):
+            resp = self.client.post(f'/api/tournament/{self.t1.id}/random_fill/', {'fill': 2})
+        self.assertEqual(403, resp.status_code)
+
+        # editing the tournament drops it from the cache
+        self.t1.private = True
+        self.t1.save()
+        with patch('api.views.broadcast'):
+            resp = self.client.post(f'/api/tournament/{self.t1.id}/random_fill/', {'fill': 2})
+        self.assertEqual(200, resp.status_code, resp.data)
+        self.assertEqual(2, self.t1.participants.count())
+
+        user = User.objects.create(username='other')
+        self.client.force_login(user)
+        resp = self.client.post(f'/api/tournament/{self.t1.id}/random_fill/', {'fill': 2})
+        self.assertEqual(403, resp.status_code)
+
+        # a new director is allowed in straight away
+        models.Director.objects.create(tournament=self.t1, user=user)
+        with patch('api.views.broadcast'):
+            resp = self.client.post(f'/api/tournament/{self.t1.id}/random_fill/', {'fill': 2})
+        self.assertEqual(200, resp.status_code)
+
+        resp = self.client.get('/api/tournament/999999/')
+        self.assertEqual(404, resp.status_code)
+
+
     def test_get_by_name(self):
         """Get by name converts name to slug and queries db"""
         t = models.Tournament.get_by_name('Richmond shoWdOwn U20',start_date='2023-01-01')
@@ -175,6 +247,29 @@ class TestParticipants(APITestCase, Helper):
             self.assertEqual(18, len(resp.data))
 
 
+    @patch('api.views.broadcast')
+    def test_add_rated(self, m):
+        """Players added without a rating get the one from the rating lists"""
+        self.t1.team_size = None
+        self.t1.save()
+        NationalRating.objects.create(name='Ganesh Asirvatham', country='LKA', rating=1800,
+                                      games=100, last='20230701')
+
+        self.client.login(username='sri', password='12345')
+        resp = self.client.post(f'/api/tournament/{self.t1.id}/participant/', 
+                    {"name": "Ganesh Asirvatham"})
+        self.assertEqual(201, resp.status_code)
+        resp = self.client.post(f'/api/tournament/{self.t1.id}/participant/', 
+                    {"name": "Ganesh Asirvathamm", "rating": 1500})
+        self.assertEqual(201, resp.status_code)
+        resp = self.client.post(f'/api/tournament/{self.t1.id}/participant/', 
+                    {"name": "Someone Else"})
+        self.assertEqual(201, resp.status_code)
+
+        ratings = dict(self.t1.participants.values_list('name', 'rating'))
+        self.assertEqual({'Ganesh Asirvatham': 1800, 'Ganesh Asirvathamm': 1500,
+                          'Someone Else': 0}, ratings)
+
     def test_rr_add(self):
         """adding a participant to an already paired RR should fail"""
         self.t1.round_robin = True
@@ -22,4 +22,6 @@ router = routers.SimpleRouter()
 router.register('tournament', views.TournamentViewSet, basename='tournament')
 router.register('tournament/(?P<tid>\d+)/participant', views.ParticipantViewSet, 'participant')
 
-urlpatterns = router.urls
+urlpatterns = router.urls + [
+    path('stats/', views.stats),
+]
@@ -1,24 +1,35 @@
-import time
 import json
 from asgiref.sync import async_to_sync
 
+from django.conf import settings
+from django.http import Http404
 from django.shortcuts import render
 from django.db import connection, transaction
 from django.db.models import Q
 from channels.layers import get_channel_layer
 
 from rest_framework import viewsets, status
-from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied, ValidationError
 
-from tournament import models, tools
+from tournament import cache, models, tools
+from ratings.matching import find_ratings
 from api.serializers import (ParticipantSerializer, TournamentSerializer, 
-        TournamentRoundSerializer, ResultSerializer, BoardResultSerializer)
+        TournamentRoundSerializer, ResultSerializer, BoardResultSerializer,
+        BoardEntrySerializer, ResultEntrySerializer)
 
 from api.swiss import SwissPairing
 from api.rr import RoundRobinPairing
+from api.matching import MatchingPairing
+from api.parallel import ParallelPairing
 from api.permissions import IsAuthenticatedOrReadOnly
+from api.middleware import is_director
+from api.consumers import tournament_group
+from api.coalesce import broadcaster
+from api.instrumentation import InstrumentedMixin, get_stats, instrument, timed
+from api.jobs import pairing_jobs
 
 """
 The author is fully aware of the django ORM and the django DRF
@@ -29,7 +40,7 @@ def index(request):
     return render(request, 'index.html')
 
 
-class TournamentViewSet(viewsets.ModelViewSet):
+class TournamentViewSet(InstrumentedMixin, viewsets.ModelViewSet):
     """CRUD for tournaments"""
     permission_classes = [IsAuthenticatedOrReadOnly]
     serializer_class = TournamentSerializer
@@ -66,30 +77,21 @@ class TournamentViewSet(viewsets.ModelViewSet):
     
     
     def retrieve(self, request, *args, **kwargs):
-        # funnily enough if you use to_jsonb in the outermost query below
-        # psycopg2 gives you a string instead of a dict
-        query = """select to_json(f) from (
-            select tt.*, 	
-                (select jsonb_agg(to_jsonb(parties)) 
-                    FROM (
-                        select rank() over(order by round_wins desc, game_wins desc, spread desc, rating desc, name) as "pos", * 
-                        from tournament_participant parties 
-                            where tournament_id = tt.id and name != 'Bye' and name != 'Absent'
-                    ) parties
-                ) participants,
-                (select jsonb_agg(to_jsonb(r)) FROM (
-                    SELECT * from tournament_tournamentround rounds 
-                        where tournament_id = tt.id order by round_no
-                    ) r
-                ) rounds
-            from tournament_tournament tt where id = %s 	   
-        ) f """
-        
-        with connection.cursor() as cursor:
-            cursor.execute(query, [kwargs['pk']])
-            return Response( cursor.fetchone()[0])
+        """The tournament along with its participants and rounds.
+
+        This is what spectators load so it's cached (see tournament.cache)
+        and served with an ETag. A client that already has the current
+        version gets a 304.
+        """
+        tid = int(kwargs['pk'])
+        version = cache.get_version(tid)
+        tag = cache.etag(tid, version)
+        if tag in request.headers.get('If-None-Match', ''):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': tag})
+
+        snapshot = cache.get_snapshot(tid, version, lambda: get_tournament(tid))
+        return Response(snapshot, headers={'ETag': tag})
 
-   
     @action(detail=True, methods=['post'])
     def truncate(self, request,pk, **kwargs):
         """Deletes the last round of a tournament.
@@ -108,12 +110,11 @@ class TournamentViewSet(viewsets.ModelViewSet):
                     {'status': 'error', 'message': 'next round already paired'}
                 )    
 
-            td = models.Director.objects.filter(
-                Q(tournament_id=request.tournament.id) & Q(user=request.user))
-            if td.exists():
+            if is_director(request):
                 if request.data.get('td') == request.user.username:
                     models.BoardResult.objects.filter(round=rnd).delete()
                     models.Result.objects.filter(round=rnd).delete()
+                    cache.bump_version(rnd.tournament_id)
                     # unpair helper will broadcast
                     self.unpair_helper(rnd)
                     request.tournament.update_all_standings()
@@ -135,8 +136,10 @@ class TournamentViewSet(viewsets.ModelViewSet):
     def pair(self, request, pk):
         """Pairs the given round.
         Possible only if there is at least 2 players in this tournament and
-        has not been paired already."""
-        t1 = time.time()
+        has not been paired already.
+
+        The pairing is made while the request waits, see pair_jobs for
+        doing it in the background."""
         with transaction.atomic():
             if models.Result.objects.filter(round_id=request.data['id']).exists():
                 return Response({'status': 'error', 'message': 'already paired'})
@@ -147,41 +150,72 @@ class TournamentViewSet(viewsets.ModelViewSet):
                     return Response({'status': 'error',
                         'message': 'A tournament needs at least two player'})
                 
-                p = None
-
-                if self.request.tournament.round_robin:
-                    p = RoundRobinPairing(rnd)               
-                else:
-                    p = SwissPairing(rnd)
-
-                p.make_it()
-                results = p.save()
-                res_serializer = ResultSerializer(results, many=True)
-                rnd_serializer = TournamentRoundSerializer(rnd)
-
-                rnd.paired = True
-                rnd.save()
-
-                broadcast({
-                            "round": rnd_serializer.data,
-                            "results": res_serializer.data,
-                            "tournament_id": request.tournament.id
-                        }
-                )
+                p = get_pairing(rnd)
+                with timed('pairing'):
+                    p.make_it()
+                commit_pairing(p, request.tournament.id)
             except ValueError as e:
                 return Response(
                     {'status': 'error', 'message': str(e)},
                     status=status.HTTP_400_BAD_REQUEST)
 
-            
-        #for query in connection.queries:
-        #    print(query)
-        
-        t2 = time.time()
-        #print(t2 - t1, len(list(connection.queries)))
+
+        # see api.instrumentation for the time taken and the queries
         return Response({'status': 'ok'})
-        
 
+    @action(detail=True, methods=['post'], url_path='pair/jobs')
+    def pair_jobs(self, request, pk):
+        """Pairs the given round in the background.
+
+        Returns the job straight away, with a 202. Its progress is sent to
+        everyone watching the tournament and can be seen with pair_job. If
+        the round is already being paired that job is returned instead.
+        A timeout in seconds may be given, up to the PAIRING_TIMEOUT.
+        """
+        if not is_director(request):
+            raise PermissionDenied()
+
+        tournament = request.tournament
+        try:
+            rnd = models.TournamentRound.objects.get(id=request.data.get('id'),
+                                                     tournament_id=tournament.id)
+        except (models.TournamentRound.DoesNotExist, ValueError, TypeError):
+            raise ValidationError({'id': 'No such round'})
+
+        if models.Result.objects.filter(round=rnd).exists():
+            raise ValidationError({'id': 'already paired'})
+        if models.Participant.objects.filter(tournament_id=tournament.id).count() < 2:
+            raise ValidationError({'id': 'A tournament needs at least two player'})
+
+        try:
+            timeout = float(request.data.get('timeout') or settings.PAIRING_TIMEOUT)
+        except (TypeError, ValueError):
+            raise ValidationError({'timeout': 'Should be a number of seconds'})
+        if not timeout > 0:
+            raise ValidationError({'timeout': 'Should be more than 0 seconds'})
+
+        job, created = pairing_jobs.submit(('pair', rnd.id),
+            lambda job: run_pairing(job, rnd.id, tournament.id),
+            timeout=min(timeout, settings.PAIRING_TIMEOUT), notify=notify_job,
+            info={'tournament_id': tournament.id, 'round_id': rnd.id, 'round_no': rnd.round_no})
+
+        return Response(job.as_dict(),
+                        status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get', 'delete'], url_path=r'pair/jobs/(?P<job_id>[0-9a-f]+)')
+    def pair_job(self, request, pk, job_id):
+        """The state of a pairing job, DELETE cancels it. The job may be
+        running in another process, see api.jobs"""
+        if not is_director(request):
+            raise PermissionDenied()
+
+        job = pairing_jobs.status(job_id)
+        if job is None or job.get('tournament_id') != request.tournament.id:
+            raise Http404('No such job')
+
+        if request.method == 'DELETE':
+            job = pairing_jobs.cancel(job_id)
+        return Response(job)
 
     def unpair_helper(self, rnd):
         rnd.paired = False
@@ -201,9 +235,7 @@ class TournamentViewSet(viewsets.ModelViewSet):
         """Fills the tournament with random results.
         """
         if request.tournament.private:
-            td = models.Director.objects.filter(
-                Q(tournament_id=request.tournament.id) & Q(user=request.user))
-            if td.exists():
+            if is_director(request):
                 tools.add_participants(
                     request.tournament, True, 
                     int(request.data.get('fill', 0))
@@ -222,10 +254,7 @@ class TournamentViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def random_results(self, request, **kwargs):
         if request.tournament.private:
-            td = models.Director.objects.filter(
-                Q(tournament_id=request.tournament.id) & Q(user=request.user))
-            
-            if td.exists():
+            if is_director(request):
                 rnd = tools.random_results(request.tournament)
                 broadcast({
                         "tournament_id": request.tournament.id,
@@ -294,6 +323,7 @@ class TournamentViewSet(viewsets.ModelViewSet):
             
             rnd.boardresult_set.all().delete()
             qs.delete()
+            cache.bump_version(rnd.tournament_id)
             self.unpair_helper(rnd)
             return Response({"status": "ok"})
 
@@ -328,49 +358,314 @@ class TournamentViewSet(viewsets.ModelViewSet):
             )
         
         partial = kwargs.pop('partial', False)
-        instance = models.Result.objects.get(pk=request.data.get('result'))
-
-        if (self.request.tournament.entry_mode == models.Tournament.BY_TEAM or 
-                self.request.tournament.entry_mode == models.Tournament.NON_TEAM):
-            serializer = ResultSerializer(instance, data=request.data, partial=partial)
-            serializer.is_valid(raise_exception=True)
-
-            instance.score1 = serializer.validated_data['score1']
-            instance.score2 = serializer.validated_data['score2']
-            if serializer.validated_data.get('p1'):
-                instance.p1 = serializer.validated_data['p1']
-                instance.p2 = serializer.validated_data['p2']
-
-            instance.games_won = serializer.validated_data['games_won']
-            instance.save()
-
-        else :
-            board = models.BoardResult.objects.get(
-                Q(team1=instance.p1) & Q(team2=instance.p2) & 
-                Q(board=request.data['board'])
-            )
-            serializer = BoardResultSerializer(instance, data=request.data, partial=partial)
-            serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            # locked, so that the standings are adjusted from what the result
+            # really was and not from what a concurrent edit overwrote
+            instance = models.Result.objects.select_for_update().get(pk=request.data.get('result'))
+
+            if (self.request.tournament.entry_mode == models.Tournament.BY_TEAM or 
+                    self.request.tournament.entry_mode == models.Tournament.NON_TEAM):
+                serializer = ResultSerializer(instance, data=request.data, partial=partial)
+                serializer.is_valid(raise_exception=True)
+
+                instance.score1 = serializer.validated_data['score1']
+                instance.score2 = serializer.validated_data['score2']
+                if serializer.validated_data.get('p1'):
+                    instance.p1 = serializer.validated_data['p1']
+                    instance.p2 = serializer.validated_data['p2']
+
+                instance.games_won = serializer.validated_data['games_won']
+                instance.save()
+
+            else :
+                board = models.BoardResult.objects.get(
+                    Q(team1=instance.p1_id) & Q(team2=instance.p2_id) & 
+                    Q(round=instance.round_id) & Q(board=request.data['board'])
+                )
+                serializer = BoardResultSerializer(instance, data=request.data, partial=partial)
+                serializer.is_valid(raise_exception=True)
 
-            board.score1 = serializer.validated_data['score1']
-            board.score2 = serializer.validated_data['score2']
-            
-            if serializer.validated_data.get('p1'):
-                if serializer.validated_data['p1'] > serializer.validated_data['p2']:
-                    board.score2 = serializer.validated_data['score1']
-                    board.score1 = serializer.validated_data['score2']
+                board.score1 = serializer.validated_data['score1']
+                board.score2 = serializer.validated_data['score2']
 
-            board.save()
-            
+                if serializer.validated_data.get('p1'):
+                    if serializer.validated_data['p1'] > serializer.validated_data['p2']:
+                        board.score2 = serializer.validated_data['score1']
+                        board.score1 = serializer.validated_data['score2']
+
+                board.save()
+
+        # sent off the request path, once for all the results of this round
+        # that are entered within the BROADCAST_WINDOW
+        tournament = request.tournament
+        round_id, round_no = instance.round_id, instance.round.round_no
+        broadcaster.add((tournament.id, round_id), instance.id,
+            lambda ids: broadcast_results(tournament, round_id, round_no, ids))
+
+        return Response({'status': 'ok'})
+
+    @action(detail=True, methods=['post'], url_path='boards/batch')
+    def batch_boards(self, request, pk, *args, **kwargs):
+        """Enter many board results at once.
+
+        For tournaments where the results are entered by player. The boards
+        of a match, or of several matches, are posted together to boards/batch/
+        as {"boards": [{"result": id, "board": n, "score1": x, "score2": y}]}
+        (p1 and p2 may be given as in result). They are validated together,
+        saved in one go and the team results recomputed from them with a
+        single statement. One broadcast is sent for each round.
+        """
+        tournament = request.tournament
+        if tournament.entry_mode != models.Tournament.BY_PLAYER:
+            raise ValidationError({'boards': 'Results are not entered by player'})
+
+        serializer = BoardEntrySerializer(data=request.data.get('boards'), many=True)
+        serializer.is_valid(raise_exception=True)
+        entries = serializer.validated_data
+        if not entries:
+            raise ValidationError({'boards': 'Nothing to enter'})
+
+        results = {r.id: r for r in models.Result.objects.filter(
+            pk__in={e['result'] for e in entries}, round__tournament_id=tournament.id
+        ).select_related('round')}
+
+        boards = {}
+        for b in models.BoardResult.objects.filter(
+                round_id__in={r.round_id for r in results.values()},
+                team1_id__in={r.p1_id for r in results.values()}):
+            boards[(b.round_id, b.team1_id, b.team2_id, b.board)] = b
+
+        changed = {}
+        errors = []
+        for entry in entries:
+            r = results.get(entry['result'])
+            b = r and boards.get((r.round_id, r.p1_id, r.p2_id, entry['board']))
+            if b is None:
+                errors.append(f"No board {entry['board']} for result {entry['result']}")
+                continue
+            if b.id in changed:
+                errors.append(f"Board {entry['board']} of result {entry['result']} is repeated")
+                continue
+
+            b.score1, b.score2 = entry['score1'], entry['score2']
+            if entry.get('p1') and entry.get('p2') and entry['p1'] > entry['p2']:
+                b.score1, b.score2 = entry['score2'], entry['score1']
+            changed[b.id] = b
+
+        if errors:
+            raise ValidationError({'boards': errors})
+
+        matches = list({(b.round_id, b.team1_id, b.team2_id) for b in changed.values()})
+        with transaction.atomic():
+            models.BoardResult.objects.bulk_update(changed.values(), ['score1', 'score2'])
+            models.update_board_totals(matches)
+            cache.bump_version(tournament.id)
+
+        rounds = {}
+        for r in results.values():
+            rounds.setdefault((r.round_id, r.round.round_no), []).append(r.id)
+        for (round_id, round_no), ids in rounds.items():
+            broadcast_results(tournament, round_id, round_no, ids)
+
+        return Response({'status': 'ok', 'boards': len(changed)})
+
+    @action(detail=True, methods=['post'], url_path='result/batch')
+    def batch_results(self, request, pk, *args, **kwargs):
+        """Enter the results of a round at once.
+
+        Posted as {"round": id, "results": [{"result": id, "score1": x,
+        "score2": y, "games_won": n}]}, p1 and p2 may be given as in result
+        when the scores are reported from the point of view of p2. The
+        results are validated together, saved with one bulk_update and only
+        the standings of the participants involved are updated. The round
+        is broadcast once and returned.
+        """
+        tournament = request.tournament
+        if tournament.entry_mode == models.Tournament.BY_PLAYER:
+            raise ValidationError({'results': 'Results are entered by player, use boards/batch'})
+
+        try:
+            rnd = models.TournamentRound.objects.get(pk=request.data.get('round'),
+                                                     tournament_id=tournament.id)
+        except (models.TournamentRound.DoesNotExist, ValueError, TypeError):
+            raise ValidationError({'round': 'No such round'})
+
+        serializer = ResultEntrySerializer(data=request.data.get('results'), many=True)
+        serializer.is_valid(raise_exception=True)
+        entries = serializer.validated_data
+        if not entries:
+            raise ValidationError({'results': 'Nothing to enter'})
+
+        with transaction.atomic():
+            # locked, the standings are adjusted from the scores read here
+            results = {r.id: r for r in models.Result.objects.select_for_update().filter(
+                pk__in={e['result'] for e in entries}, round=rnd)}
+            changed = self.validate_results(rnd, results, entries)
+            models.update_results(list(changed.values()), tournament)
+            cache.bump_version(tournament.id)
+
+        broadcast_results(tournament, rnd.id, rnd.round_no, list(changed))
+
+        return Response({'status': 'ok', 'results': get_results(tournament, rnd.id)})
+
+    def validate_results(self, rnd, results, entries):
+        """Applies the entries posted to batch_results to the results.
+        Returns: the changed results by id
+        Raises: ValidationError listing every entry that's not valid
+        """
+        most = self.request.tournament.team_size or 1
+
+        errors = []
+        changed = {}
+        for entry in entries:
+            r = results.get(entry['result'])
+            if r is None:
+                errors.append(f"Result {entry['result']} is not in round {rnd.round_no}")
+                continue
+            if r.id in changed:
+                errors.append(f"Result {r.id} is repeated")
+                continue
+            if entry['games_won'] is not None and entry['games_won'] > most:
+                errors.append(f"Result {r.id} has more than {most} games won")
+                continue
+
+            score1, score2, won = entry['score1'], entry['score2'], entry['games_won']
+            if entry.get('p1') or entry.get('p2'):
+                if {entry.get('p1'), entry.get('p2')} != {r.p1_id, r.p2_id}:
+                    errors.append(f"Result {r.id} is not between {entry.get('p1')} and {entry.get('p2')}")
+                    continue
+                if entry['p1'] == r.p2_id:
+                    score1, score2 = score2, score1
+                    won = most - won if won is not None else None
+
+            r.score1, r.score2, r.games_won = score1, score2, won
+            changed[r.id] = r
+
+        if errors:
+            raise ValidationError({'results': errors})
+        return changed
+
+
+def commit_pairing(p, tournament_id):
+    """Saves a pairing that has been made and tells the spectators.
+
+    The round is locked while the pairs are saved so that two pairings of
+    the same round cannot both be saved.
+    Args: p: a Pairing on which make_it has been called
+          tournament_id: the tournament of the round
+    Returns: the results that were created
+    Raises: ValueError if the round has been paired already
+    """
+    rnd = p.rnd
+    with transaction.atomic():
+        models.TournamentRound.objects.select_for_update().get(pk=rnd.pk)
+        if models.Result.objects.filter(round_id=rnd.id).exists():
+            raise ValueError('already paired')
+
+        with timed('save'):
+            results = p.save()
+        with timed('serialization'):
+            res_data = ResultSerializer(results, many=True).data
+
+        rnd.paired = True
+        rnd.save()
+        rnd_data = TournamentRoundSerializer(rnd).data
 
+    broadcast({
+                "round": rnd_data,
+                "results": res_data,
+                "tournament_id": tournament_id
+            }
+    )
+    return results
+
+
+def run_pairing(job, round_id, tournament_id):
+    """The work of a pairing job, see TournamentViewSet.pair_jobs.
+
+    The pairing is made without holding any locks, the job can be cancelled
+    or time out while that happens (see api.jobs). Only the save happens in
+    a transaction.
+    """
+    job.report(stage='loading')
+    rnd = models.TournamentRound.objects.select_related('tournament').get(pk=round_id)
+    p = get_pairing(rnd)
+    p.progress = job.report
+
+    job.report(stage='pairing')
+    with instrument('PairingJob'):
+        with timed('pairing'):
+            p.make_it()
+        job.report(stage='saving')
+        results = commit_pairing(p, tournament_id)
+
+    return {'results': len(results)}
+
+
+def notify_job(job):
+    """Tell the people watching the tournament how a job is doing"""
+    broadcast({'tournament_id': job.info['tournament_id'], 'job': job.as_dict()},
+              sequenced=False)
+
+
+def broadcast_results(tournament, round_id, round_no, result_ids):
+    """Broadcast the results that have changed in a round.
+
+    A single result goes out on its own, its p1 and p2 carry the new
+    standings of the two participants and spectators patch it into what
+    they have. If several changed the whole round is sent instead.
+    """
+    if len(set(result_ids)) == 1:
+        broadcast({
+                    "tournament_id": tournament.id,
+                    "result": get_results(tournament, round_id, result_ids[0])[0],
+                    "round_no": round_no
+                }
+        )
+    else:
         broadcast({
-                    "tournament_id": request.tournament.id,
-                    "results": get_results(request.tournament, instance.round_id),
-                    "round_no": instance.round.round_no
+                    "tournament_id": tournament.id,
+                    "results": get_results(tournament, round_id),
+                    "round_no": round_no
                 }
         )
 
-        return Response({'status': 'ok'})
+
+def get_pairing(rnd):
+    """Returns the pairing for the round, based on its pairing system"""
+    if rnd.tournament.round_robin:
+        return RoundRobinPairing(rnd)
+    if rnd.pairing_system == models.TournamentRound.MATCHING:
+        return MatchingPairing(rnd)
+    if rnd.pairing_system == models.TournamentRound.PARALLEL:
+        return ParallelPairing(rnd)
+    return SwissPairing(rnd)
+
+
+def get_tournament(pk):
+    """Fetch a tournament with its participants ranked and its rounds"""
+    # funnily enough if you use to_jsonb in the outermost query below
+    # psycopg2 gives you a string instead of a dict
+    query = """select to_json(f) from (
+        select tt.*, 	
+            (select jsonb_agg(to_jsonb(r)) FROM (
+                SELECT * from tournament_tournamentround rounds 
+                    where tournament_id = tt.id order by round_no
+                ) r
+            ) rounds
+        from tournament_tournament tt where id = %s 	   
+    ) f """
+    
+    with connection.cursor() as cursor:
+        cursor.execute(query, [pk])
+        row = cursor.fetchone()
+        if row is None:
+            raise Http404('Tournament not found')
+        tournament = row[0]
+
+    participants = [p for p in get_standings(pk).values() if p['pos'] is not None]
+    tournament['participants'] = sorted(participants, key=lambda p: p['pos']) or None
+    return tournament
 
 
 def get_participant(pk):
@@ -408,7 +703,7 @@ def get_participant(pk):
 def get_participants(tid):
     '''Fetch list of participants.
     includes the results of each round for those participants and also the
-    team member details.
+    team member details. The position of each one comes from get_standings.
     '''
     query = """select json_agg(f) from (
                     select tp.*, 
@@ -422,11 +717,14 @@ def get_participants(tid):
     with connection.cursor() as cursor:
         cursor.execute(query, [tid])
         resp = cursor.fetchone()[0]
-        #print(json.dumps(resp))
-        return resp
+
+    standings = get_standings(tid)
+    for p in resp or []:
+        p['pos'] = standings.get(p['id'], {}).get('pos')
+    return resp
 
 
-class ParticipantViewSet(viewsets.ModelViewSet):
+class ParticipantViewSet(InstrumentedMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
     serializer_class = ParticipantSerializer
 
@@ -440,10 +738,20 @@ class ParticipantViewSet(viewsets.ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         self.check_rr_pairing()
         return super().destroy(request, *args, **kwargs)
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        cache.bump_version(instance.tournament_id)
     
     def perform_create(self, serializer):
         self.check_rr_pairing()
-        instance = serializer.save(tournament_id=self.request.tournament.id)
+        extra = {}
+        if not serializer.validated_data.get('rating') and not self.request.tournament.team_size:
+            # not given, look it up in the rating lists
+            name = serializer.validated_data.get('name')
+            extra['rating'] = find_ratings([name]).get(name, 0)
+
+        instance = serializer.save(tournament_id=self.request.tournament.id, **extra)
         p = serializer.data
         p['id'] = instance.pk
         p['seed'] = instance.seed
@@ -478,58 +786,160 @@ class ParticipantViewSet(viewsets.ModelViewSet):
         return models.Participant.objects.filter(
             tournament_id = self.kwargs['tid']).order_by('-round_wins','-game_wins','-spread')
 
-def get_results(tournament, round_id):
+def get_results(tournament, round_id, result_id=None):
+    """The results of a round along with the standing of each participant.
+    Args: tournament: the tournament
+          round_id: id of the round
+          result_id: if given only that one result is returned
+    Returns: a list of results, p1 and p2 are participant objects from
+        get_standings.
+    """
+    only = "and tr.id = %s" if result_id else ""
     with connection.cursor() as cursor:
         if tournament.entry_mode == 'T':
-            query = """
-                with parti as (
-                    select rank() over(
-                        order by round_wins desc, game_wins desc, spread desc, rating desc
-                    ) as "pos", * 
-                    from tournament_participant
-                )
+            query = f"""
                 select json_agg(r) from (
-                    select *, 
-                        (select to_jsonb(parti) from parti where id = tr.p1_id) p1,
-                        (select to_jsonb(parti) from parti where id = tr.p2_id) p2
-                    from tournament_result tr where round_id = %s
+                    select * from tournament_result tr where round_id = %s {only}
                 ) r
             """
-            cursor.execute(query, [round_id])
-            resp = cursor.fetchone()[0]
-            return resp or []    
+            cursor.execute(query, [round_id, result_id] if result_id else [round_id])
         else:
-            query = """
-                with parti as (
-                    select rank() over(
-                        order by round_wins desc, game_wins desc, spread desc, rating desc
-                    ) as "pos", * 
-                    from tournament_participant
-                )
+            query = f"""
                 select json_agg(r) from (     
                     select *, 
                         (select json_agg(tb) 
                             from tournament_boardresult tb 
                             where tb.round_id = %s and score1 is not null
-                                and team1_id = tr.p1_id and team2_id = tr.p2_id) boards,
-                        (select to_jsonb(parti) from parti where id = tr.p1_id) p1,
-                        (select to_jsonb(parti) from parti where id = tr.p2_id) p2
-                    from tournament_result tr where round_id = %s
+                                and team1_id = tr.p1_id and team2_id = tr.p2_id) boards
+                    from tournament_result tr where round_id = %s {only}
                     order by CASE WHEN "table" = 0 THEN 1000 ELSE "table" END
                 ) r
             """
 
-            cursor.execute(query, [round_id, round_id])
-            resp = cursor.fetchone()[0]
-            return resp or []
+            params = [round_id, round_id, result_id] if result_id else [round_id, round_id]
+            cursor.execute(query, params)
+        resp = cursor.fetchone()[0] or []
 
-def broadcast(message):
-    
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        "chat",
-        {
-            "type": "chat.message",
-            "message": message
-        },
-    )
+    standings = get_standings(tournament.id)
+    for r in resp:
+        r['p1'] = standings.get(r['p1_id'])
+        r['p2'] = standings.get(r['p2_id'])
+    return resp
+
+
+def get_standings(tid):
+    """The ranked participants of a tournament.
+
+    Computed once per version of the tournament (see tournament.cache) and
+    shared by get_results, get_participants and the tournament snapshot.
+    The version only changes once a write has been committed, so what is
+    read here is never older than the version it's cached under.
+    The Bye and Absent are included but don't get a position.
+    Args: tid: tournament id
+    Returns: a dictionary of participant id to participant, each one has a
+        pos for its position in the tournament.
+    """
+    def build():
+        query = """select json_agg(p) from (
+            select CASE WHEN name in ('Bye', 'Absent') THEN NULL ELSE rank() over(
+                    partition by name in ('Bye', 'Absent')
+                    order by round_wins desc, game_wins desc, spread desc, rating desc, name
+                ) END as "pos", *
+            from tournament_participant where tournament_id = %s
+        ) p"""
+
+        with connection.cursor() as cursor:
+            cursor.execute(query, [tid])
+            return {p['id']: p for p in cursor.fetchone()[0] or []}
+
+    return cache.get_cached(tid, cache.get_version(tid), 'standings', build)
+
+def get_resync(tournament_id, round_no=None, user=None):
+    """Everything a spectator needs to catch up after missing a broadcast.
+    Args: tournament_id: the tournament
+          round_no: the round to send the results for, defaults to the last
+              round that has been paired
+          user: the spectator, only directors can resync private tournaments
+    Returns: a message like the ones sent by broadcast or None
+    """
+    tournament = models.Tournament.objects.filter(pk=tournament_id).first()
+    if tournament is None:
+        return None
+    if tournament.private and not (user and user.is_authenticated and
+            models.Director.objects.filter(tournament=tournament, user=user).exists()):
+        return None
+
+    rounds = tournament.rounds.filter(paired=True).order_by('-round_no')
+    rnd = rounds.filter(round_no=round_no).first() if round_no else rounds.first()
+
+    # read the version first, anything that happens while we are building
+    # the message will be broadcast with a higher sequence number
+    message = {
+        "tournament_id": tournament.id,
+        "seq": models.TournamentSequence.objects.filter(pk=tournament.id).values_list(
+            'seq', flat=True).first() or 0,
+        "resync": True,
+        "participants": get_participants(tournament.id),
+    }
+    if rnd:
+        message["results"] = get_results(tournament, rnd.id)
+        message["round_no"] = rnd.round_no
+    return message
+
+
+def broadcast(message, sequenced=True):
+    """Send a message to the spectators of the tournament it belongs to.
+
+    Nothing is sent until the transaction that made the change has been
+    committed, see send_message.
+    Args: message: a dictionary that must contain tournament_id
+          sequenced: False for messages that do not change the tournament,
+              like progress reports, they don't get a seq
+    """
+    transaction.on_commit(lambda: send_message(message, sequenced))
+
+
+def send_message(message, sequenced=True):
+    """Does the work of broadcast.
+
+    Everyone subscribed to the tournament gets the message and, when it is
+    about a particular round, so do the people watching only that round.
+
+    Each message is stamped with the next version of the tournament as its
+    sequence number (seq). A spectator who sees a gap in the sequence has
+    missed something and should ask for a resync (see consumers.Watcher).
+    The people watching a round get every seq as well: messages about the
+    tournament as a whole in full and those about other rounds as just
+    the tournament_id and the seq.
+    """
+    tid = message['tournament_id']
+    round_no = message.get('round_no')
+    if not round_no and isinstance(message.get('round'), dict):
+        round_no = message['round'].get('round_no')
+
+    messages = {tournament_group(tid): message}
+    if sequenced:
+        message['seq'], num_rounds = models.next_version(tid)
+        other = {'tournament_id': tid, 'seq': message['seq']}
+        for n in range(1, (num_rounds or 0) + 1):
+            messages[tournament_group(tid, n)] = message if not round_no or n == round_no else other
+    elif round_no:
+        messages[tournament_group(tid, round_no)] = message
+
+    with timed('broadcast'):
+        channel_layer = get_channel_layer()
+        for group, text in messages.items():
+            async_to_sync(channel_layer.group_send)(
+                group,
+                {
+                    "type": "chat.message",
+                    "message": text
+                },
+            )
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def stats(request):
+    """Query counts and timings for each endpoint, see api.instrumentation"""
+    return Response(get_stats())
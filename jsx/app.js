@@ -1,5 +1,5 @@
 //npx babel --watch jsx --out-dir tournament/static/js/ --presets react-app/dev 
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 
 import {
     Route, Routes,
@@ -41,6 +41,8 @@ export default function App() {
     const navigate = useNavigate()
 
     const [ws, setWs] = useState()
+    // the sequence number of the last broadcast seen for each tournament
+    const seq = useRef({})
 
     useEffect(() => {
         /**
@@ -55,7 +57,25 @@ export default function App() {
         ws.onmessage = function (e) {
             const obj = JSON.parse(e.data)
             console.log(obj)
-            
+
+            if (obj.seq && obj.tournament_id) {
+                const last = seq.current[obj.tournament_id]
+                seq.current[obj.tournament_id] = obj.seq
+                if (!obj.resync && last && obj.seq > last + 1) {
+                    // missed something, ask for everything again.
+                    ws.send(JSON.stringify({ resync: obj.tournament_id, round_no: obj.round_no }))
+                }
+            }
+
+            if (obj.result && obj.round_no) {
+                // just the one result changed
+                tournamentDispatch(
+                    {
+                        type: 'editResult', result: obj.result,
+                        round: obj.round_no - 1, tid: obj.tournament_id
+                    }
+                )
+            }
             if (obj.participant) {
                 // add a new participant to the event
                 tournamentDispatch(
@@ -90,6 +110,26 @@ export default function App() {
         setWs(ws)
     }, [])
 
+    /**
+     * Updates are only sent to the spectators of a tournament so subscribe
+     * to the one that's being viewed.
+     */
+    useEffect(() => {
+        if (ws && tournament?.id) {
+            const subscribe = () => ws.send(JSON.stringify({ subscribe: tournament.id }))
+            if (ws.readyState === WebSocket.OPEN) {
+                subscribe()
+            } else {
+                ws.addEventListener('open', subscribe, { once: true })
+            }
+            return () => {
+                if (ws.readyState === WebSocket.OPEN) {
+                    ws.send(JSON.stringify({ unsubscribe: tournament.id }))
+                }
+            }
+        }
+    }, [ws, tournament?.id])
+
     /**
      * Initial list of tournaments fetched as http
      */
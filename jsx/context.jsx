@@ -157,6 +157,27 @@ export function tournamentReducer(state, action) {
             return state
         }
 
+        case 'editResult': {
+            // a single result has changed, replace it and the two
+            // participants whose standings moved with it.
+            if(state?.id == action.tid && state.results) {
+                const round = action.round
+                const res = [...state.results]
+                res[round] = (res[round] || []).map(r => 
+                    r.id == action.result.id ? action.result : r
+                )
+                const changed = {}
+                changed[action.result.p1.id] = action.result.p1
+                changed[action.result.p2.id] = action.result.p2
+
+                const p = (state.participants || []).map(p => changed[p.id] || p)
+                return { ...state, results: res,
+                    participants: sortTournament(state, p)
+                }
+            }
+            return state
+        }
+
         case 'updateRounds': {
             // is this used?
             if(state?.id == action.tid) {
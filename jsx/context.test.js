@@ -213,4 +213,33 @@ describe('Tournament Reducer', () => {
         // then
         expect(result.participants).toEqual(action.value.participants);
     });
-});
\ No newline at end of file
+
+    it('should patch a single result', () => {
+        // given
+        const state = {
+            participants: [
+                {id: 1, name: 'John Doe', pos: 1},
+                {id: 2, name: 'Jane Doe', pos: 2},
+                {id: 3, name: 'Bob Smith', pos: 3}
+            ],
+            results: [[
+                {id: 7, p1: {id: 1, pos: 1}, p2: {id: 2, pos: 2}, score1: null},
+                {id: 8, p1: {id: 3, pos: 3}, p2: {id: 4, pos: 4}, score1: null}
+            ]]
+        };
+
+        const action = {
+            type: 'editResult', round: 0,
+            result: {id: 7, score1: 300, score2: 400,
+                p1: {id: 1, name: 'John Doe', pos: 2}, p2: {id: 2, name: 'Jane Doe', pos: 1}}
+        };
+
+        // when
+        const result = tournamentReducer(state, action);
+
+        // then
+        expect(result.results[0][0]).toEqual(action.result);
+        expect(result.results[0][1]).toEqual(state.results[0][1]);
+        expect(result.participants.map(p => p.id)).toEqual([2, 1, 3]);
+    });
+});
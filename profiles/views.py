@@ -3,12 +3,11 @@ Views for creating, editing and viewing user profiles.
 """
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from django.contrib.postgres.search import TrigramSimilarity
 from django.db.models import Case, When, Value, BooleanField, Q
 from django.utils import timezone
 
 from profiles.forms import UserProfileForm
-from ratings.models import Unrated, WespaRating, NationalRating
+from ratings import matching
 from tournament.models import Tournament, Participant
 
 @login_required
@@ -59,19 +58,6 @@ def index(request):
         return render(request, 'profiles/index.html', {'tournaments': tournaments})
 
 
-def search_names(rtype, name):
-    if rtype == "wespa":
-        qs = WespaRating.objects
-    elif rtype == "national":
-        qs = NationalRating.objects
-    else:
-        qs = Unrated.objects
-
-    return qs.annotate(
-            similarity=TrigramSimilarity('name', name)
-    ).filter(similarity__gt=0.75).order_by('-similarity')
-
-
 @login_required
 def connect(request):
     profile = request.user.profile
@@ -80,12 +66,8 @@ def connect(request):
         if not profile.full_name:
             redirect('/profile/')
 
-        wespa = search_names("wespa", profile.preferred_name)
-        national = search_names("national", profile.preferred_name)
-        unrated = search_names("unrated", profile.preferred_name)
-        
         return render(request, 'profiles/connect.html', 
-                { "wespa": wespa, "national": national, "unrated": unrated }
+                matching.search_names(profile.preferred_name)
         )
     
     else:
@@ -1,5 +1,5 @@
 from django.core.management.base import BaseCommand, CommandError
-from ratings.management.importer import import_ratings
+from ratings.management.importer import import_ratings, describe
 
 class Command(BaseCommand):
 
@@ -11,6 +11,7 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         with open(options['file']) as fp:
-            import_ratings(fp, wespa=False)
+            counts = import_ratings(fp, wespa=False)
+        self.stdout.write(describe(counts))
 
             
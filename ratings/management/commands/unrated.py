@@ -1,5 +1,5 @@
 from django.core.management.base import BaseCommand, CommandError
-from ratings.management.importer import import_ratings, import_unrated
+from ratings.management.importer import import_unrated, describe
 
 class Command(BaseCommand):
     """Import list of unrated players from a csv file"""
@@ -11,6 +11,7 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         with open(options['file']) as fp:
-            import_unrated(fp)
+            counts = import_unrated(fp)
+        self.stdout.write(describe(counts))
 
             
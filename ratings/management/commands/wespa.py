@@ -1,6 +1,6 @@
 import http.client
 from django.core.management.base import BaseCommand, CommandError
-from ratings.management.importer import import_ratings
+from ratings.management.importer import import_ratings, describe
 
 class Command(BaseCommand):
 
@@ -12,7 +12,7 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         if options['file']:
             with open(options['file']) as fp:
-                import_ratings(fp, wespa=True)
+                self.stdout.write(describe(import_ratings(fp, wespa=True)))
 
         else:
             # connect to https://wespa.org/latest.txt using python http client
@@ -22,7 +22,7 @@ class Command(BaseCommand):
             res = conn.getresponse()
             if res.status == 200:
                 content = res.read().decode("utf-8").splitlines()
-                import_ratings(content, wespa=True)
+                self.stdout.write(describe(import_ratings(content, wespa=True)))
             else:
                 self.stdout.write(self.style.ERROR('Error connecting to wespa.org\n'))
 
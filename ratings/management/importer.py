@@ -1,49 +1,99 @@
 from django.db import transaction
 from ratings.models import WespaRating, NationalRating, Unrated
+from ratings import matching
+
+# number of rows sent to the database in one statement
+CHUNK_SIZE = 2000
+
+RATING_FIELDS = ['country', 'games', 'rating', 'last']
+
+
+def skip_header(fp):
+    """The first line of the file is a header"""
+    if type(fp) == list:
+        return fp[1:]
+    next(fp)
+    return fp
+
+
+def chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i: i + size]
+
 
 def import_unrated(fp):
-    """Process the unrated file and add the unrated players to the database"""
+    """Process the unrated file and add the unrated players to the database
+    Returns: dict with the number of new and unchanged names
+    """
+    names = list(dict.fromkeys(line.strip() for line in skip_header(fp) if line.strip()))
+    counts = {'new': 0, 'unchanged': 0}
 
     with transaction.atomic():
-        if type(fp) == list:
-            fp = fp[1:]
-        else:
-            next(fp) # skip header
-        for line in fp:
-            line = line.strip()
-            if line:
-                Unrated.objects.update_or_create(
-                    name=line.strip()
-                )
+        for chunk in chunks(names, CHUNK_SIZE):
+            existing = set(Unrated.objects.filter(name__in=chunk).values_list('name', flat=True))
+            Unrated.objects.bulk_create(Unrated(name=name) for name in chunk if name not in existing)
+            counts['new'] += len(chunk) - len(existing)
+            counts['unchanged'] += len(existing)
+
+    matching.invalidate()
+    return counts
+
+
+def parse_ratings(fp):
+    """Reads the fixed width ratings file.
+    Returns: a dictionary of the values for each name, when a name is
+        repeated the last line wins.
+    """
+    rows = {}
+    for line in skip_header(fp):
+        line = line.strip()
+        if line:
+            rows[line[9:30].strip()] = {
+                'country': line[5:9].strip(),
+                'games': int(line[30:35]),
+                'rating': int(line[35:40]),
+                'last': line[40:].strip(),
+            }
+    return rows
+
 
 def import_ratings(fp, wespa=False):
-    """Process the ratings file and add the ratings to the database"""
+    """Process the ratings file and add the ratings to the database
+
+    The ratings are compared with the ones already in the database a chunk
+    at a time and only the new and the changed rows are written, with a
+    single INSERT ... ON CONFLICT (name) DO UPDATE for each chunk.
+    Returns: dict with the number of new, changed and unchanged ratings
+    """
+    model = WespaRating if wespa else NationalRating
+    rows = parse_ratings(fp)
+    counts = {'new': 0, 'changed': 0, 'unchanged': 0}
 
     with transaction.atomic():
-        if type(fp) == list:
-            fp = fp[1:]
-        else:
-            next(fp) # skip header
-        for line in fp:
-            line = line.strip()
-            if line:
-                
-                values = {
-                        'country': line[5:9].strip(),
-                        'games': line[30:35].strip(),
-                        'rating': line[35:40].strip(),
-                        'last': line[40:].strip(),
-                    }
-                
-                if wespa:
-                    WespaRating.objects.update_or_create(
-                        name=line[9:30].strip(),
-                        defaults=values
-                    )
+        for chunk in chunks(list(rows), CHUNK_SIZE):
+            existing = {
+                r[0]: dict(zip(RATING_FIELDS, r[1:])) for r in
+                model.objects.filter(name__in=chunk).values_list('name', *RATING_FIELDS)
+            }
+            changes = []
+            for name in chunk:
+                old = existing.get(name)
+                if old is None:
+                    counts['new'] += 1
+                elif old != rows[name]:
+                    counts['changed'] += 1
                 else:
-                    print(line[9:30])
-                    NationalRating.objects.update_or_create(
-                        name=line[9:30].strip(),
-                        defaults=values
-                    )
-            
\ No newline at end of file
+                    counts['unchanged'] += 1
+                    continue
+                changes.append(model(name=name, **rows[name]))
+
+            model.objects.bulk_create(changes, update_conflicts=True,
+                unique_fields=['name'], update_fields=RATING_FIELDS)
+
+    matching.invalidate()
+    return counts
+
+
+def describe(counts):
+    """The counts returned by the importers as text"""
+    return ", ".join(f"{v} {k}" for k, v in counts.items())
@@ -0,0 +1,108 @@
+"""Finding a player's name in the rating lists.
+
+The wespa, national and unrated lists are searched together with the pg_trgm
+% operator, which can use the trigram indexes on the name columns, and the
+matches are then narrowed down by their similarity.
+
+The lists only change when they are imported, so the matches for a name are
+cached until the next import (see invalidate).
+
+find_ratings looks up the ratings of many players at once, for example when
+participants are added to a tournament.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db import connection
+
+# how similar a name has to be to be a match
+THRESHOLD = 0.75
+
+VERSION_KEY = 'rating_names_version'
+CACHED_KEY = 'rating_names_{version}_{digest}'
+TIMEOUT = 3600
+
+LISTS = ['wespa', 'national', 'unrated']
+
+MATCH_QUERY = """
+    select * from (
+        select 'wespa' kind, id, name, similarity(name, %(name)s) similarity
+            from ratings_wesparating where name %% %(name)s
+        union all
+        select 'national', id, name, similarity(name, %(name)s)
+            from ratings_nationalrating where name %% %(name)s
+        union all
+        select 'unrated', id, name, similarity(name, %(name)s)
+            from ratings_unrated where name %% %(name)s
+    ) m where similarity > %(threshold)s
+    order by similarity desc, name
+"""
+
+# For each name the exact match if there is one otherwise the most similar
+# name. The national list is preferred to the wespa list.
+RATING_QUERY = """
+    select n.name, r.rating from unnest(%(names)s::text[]) n(name)
+    cross join lateral (
+        select rating from (
+            select name, rating, 0 list from ratings_nationalrating where name %% n.name
+            union all
+            select name, rating, 1 from ratings_wesparating where name %% n.name
+        ) c where c.name = n.name or similarity(c.name, n.name) > %(threshold)s
+        order by c.name = n.name desc, similarity(c.name, n.name) desc, list
+        limit 1
+    ) r
+"""
+
+
+def find_ratings(names):
+    """Finds the ratings of a list of players in a single query.
+    Args: names: the names of the players
+    Returns: a dictionary of ratings by name, names that do not appear in
+        the rating lists are left out.
+    """
+    names = list({name for name in names if name})
+    if not names:
+        return {}
+
+    with connection.cursor() as cursor:
+        cursor.execute(RATING_QUERY, {'names': names, 'threshold': THRESHOLD})
+        return dict(cursor.fetchall())
+
+
+def find_names(name):
+    """Searches all the rating lists for a name.
+    Args: name: the name to look for
+    Returns: a dictionary with a list of matches for each of wespa, national
+        and unrated. A match is a dict with the id, name and similarity
+    """
+    matches = {kind: [] for kind in LISTS}
+    if not name:
+        return matches
+
+    with connection.cursor() as cursor:
+        cursor.execute(MATCH_QUERY, {'name': name, 'threshold': THRESHOLD})
+        for kind, pk, match, similarity in cursor.fetchall():
+            matches[kind].append({'id': pk, 'name': match, 'similarity': similarity})
+
+    return matches
+
+
+def search_names(name):
+    """find_names with the result cached till the next import"""
+    version = cache.get_or_set(VERSION_KEY, 1, None)
+    digest = hashlib.sha1((name or '').strip().lower().encode()).hexdigest()
+    key = CACHED_KEY.format(version=version, digest=digest)
+
+    matches = cache.get(key)
+    if matches is None:
+        matches = find_names(name)
+        cache.set(key, matches, TIMEOUT)
+    return matches
+
+
+def invalidate():
+    """Forget the cached matches, the lists have changed"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        pass
@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """The rating lists are only written by the importers while they are
+    searched every time someone connects their profile, GIN indexes are
+    slower to build but faster to search than the GiST ones."""
+
+    dependencies = [
+        ('ratings', '0006_remove_unrated_country_remove_unrated_last'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            f"DROP INDEX IF EXISTS idx_{name}_name_trgm; "
+            f"CREATE INDEX idx_{name}_name_trgm ON ratings_{table} USING gin (name gin_trgm_ops);",
+            f"DROP INDEX IF EXISTS idx_{name}_name_trgm; "
+            f"CREATE INDEX idx_{name}_name_trgm ON ratings_{table} USING gist (name gist_trgm_ops);")
+        for name, table in [('wespa', 'wesparating'), ('national', 'nationalrating'), ('unrated', 'unrated')]
+    ]
@@ -1,7 +1,7 @@
 from django.test import TestCase
 from django.db import transaction
-from ratings.management.importer import import_ratings
-from ratings.models import WespaRating, NationalRating
+from ratings.management.importer import import_ratings, import_unrated
+from ratings.models import WespaRating, NationalRating, Unrated
 
 class ImportRatingsTest(TestCase):
 
@@ -41,6 +41,40 @@ class ImportRatingsTest(TestCase):
         self.assertEqual(0, wespa_ratings.count())
         self.eval_content(national_ratings)
 
+    def test_import_counts(self):
+        content = [
+            "NICKstateNAME                   punejul.tou 20230707",
+            "GASI MYS Ganesh Asirvatham     636 2290 20181209",
+            "QPRO USA Quackle Program        21 2153 20110925"
+        ]
+        # the existing rows are read and the new ones written in one go
+        with self.assertNumQueries(4):
+            counts = import_ratings(content, wespa=True)
+        self.assertEqual({'new': 2, 'changed': 0, 'unchanged': 0}, counts)
+
+        content[2] = "QPRO USA Quackle Program        25 2160 20230701"
+        content.append("SRIR LKA Sri Lankan Player       5 1500 20230701")
+        counts = import_ratings(content, wespa=True)
+        self.assertEqual({'new': 1, 'changed': 1, 'unchanged': 1}, counts)
+
+        self.assertEqual(3, WespaRating.objects.count())
+        quackle = WespaRating.objects.get(name='Quackle Program')
+        self.assertEqual(2160, quackle.rating)
+        self.assertEqual(25, quackle.games)
+
+        # nothing to write
+        with self.assertNumQueries(3):
+            counts = import_ratings(content, wespa=True)
+        self.assertEqual({'new': 0, 'changed': 0, 'unchanged': 3}, counts)
+
+    def test_import_unrated(self):
+        counts = import_unrated(['name', 'Alice', 'Bob', '', 'Alice'])
+        self.assertEqual({'new': 2, 'unchanged': 0}, counts)
+
+        counts = import_unrated(['name', 'Alice', 'Carol'])
+        self.assertEqual({'new': 1, 'unchanged': 1}, counts)
+        self.assertEqual(3, Unrated.objects.count())
+
     def eval_content(self, rat):
         self.assertEqual(rat[0].name, "Ganesh Asirvatham")
         self.assertEqual(rat[0].country, "MYS")
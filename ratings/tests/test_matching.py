@@ -0,0 +1,60 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from ratings import matching
+from ratings.management.importer import import_unrated
+from ratings.models import WespaRating, NationalRating, Unrated
+
+
+class MatchingTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        WespaRating.objects.create(name='Ganesh Asirvatham', country='MYS', rating=2290,
+                                   games=636, last='20181209')
+        WespaRating.objects.create(name='Quackle Program', country='USA', rating=2153,
+                                   games=21, last='20110925')
+        NationalRating.objects.create(name='Ganesh Asirvathamm', country='LKA', rating=1800,
+                                      games=100, last='20230701')
+        Unrated.objects.create(name='Someone Else')
+
+    def test_find_names(self):
+        with self.assertNumQueries(1):
+            matches = matching.find_names('Ganesh Asirvatham')
+
+        self.assertEqual(['Ganesh Asirvatham'], [m['name'] for m in matches['wespa']])
+        self.assertEqual(['Ganesh Asirvathamm'], [m['name'] for m in matches['national']])
+        self.assertEqual([], matches['unrated'])
+        self.assertGreater(matches['wespa'][0]['similarity'], matches['national'][0]['similarity'])
+
+        self.assertEqual({'wespa': [], 'national': [], 'unrated': []}, matching.find_names(''))
+
+    def test_search_names(self):
+        matches = matching.search_names('Someone Else')
+        self.assertEqual(['Someone Else'], [m['name'] for m in matches['unrated']])
+
+        # cached
+        with self.assertNumQueries(0):
+            self.assertEqual(matches, matching.search_names('someone else'))
+
+        # until the list is imported again
+        import_unrated(['name', 'Someone Elses'])
+        matches = matching.search_names('Someone Else')
+        self.assertEqual({'Someone Else', 'Someone Elses'}, {m['name'] for m in matches['unrated']})
+
+    def test_find_ratings(self):
+        WespaRating.objects.create(name='Someone Elses', country='LKA', rating=1200,
+                                   games=10, last='20230701')
+        with self.assertNumQueries(1):
+            ratings = matching.find_ratings(['Ganesh Asirvatham', 'Quackle Program',
+                                             'Someone Else', 'Nobody At All', ''])
+
+        # an exact match beats a similar name on the national list
+        self.assertEqual({'Ganesh Asirvatham': 2290, 'Quackle Program': 2153,
+                          'Someone Else': 1200}, ratings)
+
+        NationalRating.objects.create(name='Quackle Program', country='LKA', rating=1000,
+                                      games=10, last='20230701')
+        self.assertEqual({'Quackle Program': 1000}, matching.find_ratings(['Quackle Program']))
+
+        self.assertEqual({}, matching.find_ratings([]))
@@ -27,6 +27,9 @@ application = ProtocolTypeRouter({
         AuthMiddlewareStack(
             URLRouter([
                 re_path(r"^ws/$", consumers.Watcher.as_asgi()),
+                re_path(r"^ws/tournament/(?P<tournament_id>\d+)/$", consumers.Watcher.as_asgi()),
+                re_path(r"^ws/tournament/(?P<tournament_id>\d+)/round/(?P<round_no>\d+)/$",
+                        consumers.Watcher.as_asgi()),
             ])
         )
 })
\ No newline at end of file
@@ -138,6 +138,40 @@ SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
 SITE_ID = 1
 
+# Tournament snapshots are cached, see tournament/cache.py. Unless DEBUG is
+# on a shared backend such as redis has to be configured in settings_local.py
+# so that every process sees the same versions (see tournament/checks.py)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Seconds for which each process keeps a tournament and its directors,
+# see api/middleware.py
+TOURNAMENT_CONTEXT_TTL = 5
+
+# Apply result edits to the standings as deltas instead of recomputing the
+# standings of both participants from all their results.
+# python manage.py standings --tournament_id <id> checks for drift.
+INCREMENTAL_STANDINGS = True
+
+# Seconds to wait for more results of the same round before broadcasting
+# them together, see api/coalesce.py
+BROADCAST_WINDOW = 0.15
+
+# Worker threads for pairings submitted as jobs and the seconds after which
+# such a pairing is given up, see api/jobs.py
+PAIRING_WORKERS = 2
+PAIRING_TIMEOUT = 60
+
+# The parallel swiss search makes this many candidate pairings in this many
+# processes and keeps the best one finished within the time (seconds), see
+# api/parallel.py
+PAIRING_CANDIDATES = 8
+PAIRING_PROCESSES = 4
+PAIRING_SEARCH_TIME = 10
+
 
 from .settings_local import *
 
@@ -148,6 +182,10 @@ LOGGING_CONFIG = None
 LOGLEVEL = os.getenv('DJANGO_LOGLEVEL', 'info').upper()
 if 'test' in sys.argv:
     LOGLEVEL = 'ERROR'  # Set log level to 'ERROR' to disable all logging output during tests
+    BROADCAST_WINDOW = 0  # broadcast in the request thread, it shares the test transaction
+    PAIRING_WORKERS = 0  # same for pairing jobs
+    PAIRING_PROCESSES = 0
+    SILENCED_SYSTEM_CHECKS = ['tournament.E001']  # the tests run in one process
 
 logging.config.dictConfig({
     'version': 1,
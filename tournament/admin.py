@@ -4,15 +4,30 @@ from django.contrib.auth.models import User
 from django.http.request import HttpRequest
 from tournament.models import Tournament, TournamentRound, Participant, \
         Director, TeamMember, BoardResult, Result
+from tournament import cache
+from tournament.models import tournament_of
 from api.pairing import create_boards, delete_boards
 
+
+class BulkDeleteAdmin(admin.ModelAdmin):
+    """For the models that have no post_delete receiver, see invalidate_snapshot"""
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        cache.bump_version(tournament_of(obj))
+
+    def delete_queryset(self, request, queryset):
+        tids = {tournament_of(obj) for obj in queryset}
+        super().delete_queryset(request, queryset)
+        for tid in tids:
+            cache.bump_version(tid)
+
 # Register your models here.
 
-class BoardResultAdmin(admin.ModelAdmin):
+class BoardResultAdmin(BulkDeleteAdmin):
     list_display = ['id', 'round','team1','team2','board','score1','score2']
     raw_id_fields = ['round', 'team1', 'team2']
 
-class ResultAdmin(admin.ModelAdmin):
+class ResultAdmin(BulkDeleteAdmin):
     list_display = ['id', 'round','p1','p2','games_won','score1','score2']
     raw_id_fields = ['round', 'p1', 'p2','starting']
     search_fields = ['p1__name', 'p2__name']
@@ -38,11 +53,11 @@ class RoundAdmin(admin.ModelAdmin):
 class TDAdmin(admin.ModelAdmin):
     list_display = ['tournament', 'user']
 
-class ParticipantAdmin(admin.ModelAdmin):
+class ParticipantAdmin(BulkDeleteAdmin):
     list_display = ['pk', 'tournament','name','seed','round_wins','game_wins']
     search_fields = ['tournament__name', 'name']
 
-class TeamMemberAdmin(admin.ModelAdmin):
+class TeamMemberAdmin(BulkDeleteAdmin):
     list_display = ['team','board','name','wins','spread']
 
 
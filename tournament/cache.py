@@ -0,0 +1,108 @@
+"""Cached tournament snapshots.
+
+Spectators reload the tournament page a lot and building it needs a ranking
+of all the participants and an aggregation of all the rounds. The JSON is
+cached against a version number that is bumped by every write to the
+tournament, its rounds, participants and results (see the signals in
+tournament.models). The version lives in the cache itself so an unchanged
+tournament can be recognized without going to the database.
+
+That only works if every process sees the same versions, so the cache has
+to be shared between them (see tournament.checks).
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'tournament_version_{0}'
+CACHED_KEY = 'tournament_{name}_{tid}_{version}'
+
+# the cached entries will expire after this many seconds even if
+# the tournament has not changed.
+TIMEOUT = 3600
+
+
+def get_version(tid):
+    """The current version of the cached data for a tournament.
+    Args: tid: the tournament id
+    """
+    key = VERSION_KEY.format(tid)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so that a version is never reused after the
+        # cache has been cleared or the process restarted.
+        cache.add(key, time.time_ns() // 1000, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(tid):
+    """Invalidates everything cached for the tournament.
+
+    Happens when the current transaction commits. Until then other requests
+    still read the old rows and if the version had already changed they
+    would cache those under the new version.
+    """
+    transaction.on_commit(lambda: increment_version(tid))
+
+
+def increment_version(tid):
+    key = VERSION_KEY.format(tid)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # not in the cache
+        return get_version(tid)
+
+
+def etag(tid, version):
+    return f'"{tid}-{version}"'
+
+
+def get_cached(tid, version, name, build):
+    """Returns something cached for a version of a tournament, building it
+    if needed.
+    Args: tid: the tournament id
+          version: the version from get_version
+          name: what is being cached, for example 'snapshot'
+          build: callable that returns the value to be cached
+    """
+    key = CACHED_KEY.format(tid=tid, version=version, name=name)
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, TIMEOUT)
+    return value
+
+
+def get_snapshot(tid, version, build):
+    """The cached JSON for the tournament, see get_cached"""
+    return get_cached(tid, version, 'snapshot', build)
+
+
+# A small process local cache of tournaments and their directors for the
+# middleware and the permission checks. Entries live for a few seconds
+# (TOURNAMENT_CONTEXT_TTL) so that other processes pick up edits quickly,
+# this process drops them as soon as the tournament or a director changes.
+_contexts = {}
+
+
+def get_context(tid, load):
+    """Returns (tournament, set of director user ids).
+    Args: tid: the tournament id
+          load: callable that reads them from the database
+    """
+    now = time.monotonic()
+    entry = _contexts.get(tid)
+    if entry is None or entry[0] < now:
+        ttl = getattr(settings, 'TOURNAMENT_CONTEXT_TTL', 5)
+        entry = (now + ttl, ) + tuple(load())
+        if ttl:
+            _contexts[tid] = entry
+    return entry[1], entry[2]
+
+
+def invalidate_context(tid):
+    _contexts.pop(tid, None)
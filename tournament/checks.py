@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# these keep their entries in the memory of each process
+LOCAL_CACHES = ['django.core.cache.backends.locmem.LocMemCache']
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """The tournament versions (see tournament.cache) have to be the same in
+    every process or a write in one process will not invalidate what the
+    others have cached"""
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend in LOCAL_CACHES and not settings.DEBUG:
+        return [Error(
+            f'{backend} is local to each process, the cached tournaments '
+            'would not be invalidated by writes in the other processes.',
+            hint='Use a shared cache such as django.core.cache.backends.redis.RedisCache',
+            id='tournament.E001',
+        )]
+    return []
@@ -0,0 +1,170 @@
+import json
+import math
+import time
+import tracemalloc
+import statistics
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from api.koth import Koth
+from api.views import get_pairing
+from tournament.models import Tournament, TournamentRound
+from tournament.tools import add_participants, random_results
+
+SYSTEMS = {
+    'swiss': TournamentRound.SWISS,
+    'rr': TournamentRound.ROUND_ROBIN,
+    'koth': TournamentRound.KOTH,
+    'matching': TournamentRound.MATCHING,
+    'parallel': TournamentRound.PARALLEL,
+    'parallel-serial': TournamentRound.PARALLEL,
+}
+
+# systems that are benchmarked with different settings
+SETTINGS = {
+    # the same candidates made one after the other, to compare with the pool
+    'parallel-serial': {'PAIRING_PROCESSES': 0},
+}
+
+
+def make_pairing(rnd):
+    """get_pairing, except that KOTH rounds are paired with Koth"""
+    if rnd.pairing_system == TournamentRound.KOTH:
+        return Koth(rnd)
+    return get_pairing(rnd)
+
+
+def percentile(values, p):
+    """Nearest rank percentile of a list of numbers"""
+    values = sorted(values)
+    index = max(0, min(len(values) - 1, math.ceil(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+class Command(BaseCommand):
+    """Measure how long it takes to pair synthetic tournaments.
+
+    A tournament is generated for each pairing system with
+    tools.add_participants, every round is paired and then filled with
+    tools.random_results. The time taken, the number of queries and the peak
+    memory for each round (make_it and save together) are reported as JSON.
+
+    All three come from the same run with tracemalloc on, which makes the
+    pairing noticeably slower than it is in production. Use --no-memory for
+    the latencies on their own.
+
+    parallel-serial makes the same candidates as parallel one after the other
+    in this process, to see what the pool gains. The memory used by the
+    workers of the pool is not traced.
+
+    Everything happens in a transaction that is rolled back at the end
+    unless --keep is given.
+    """
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--players', type=int, default=100,
+                help='Number of players (or teams) in each tournament')
+        parser.add_argument('--rounds', type=int, default=5,
+                help='Number of rounds to pair, round robins stop at players - 1')
+        parser.add_argument('--team-size', type=int, default=0,
+                help='Team size, 0 for an individual tournament')
+        parser.add_argument('--entry-mode', default=Tournament.BY_TEAM,
+                choices=[Tournament.BY_TEAM, Tournament.BY_PLAYER],
+                help='How results are entered in a team tournament')
+        parser.add_argument('--repeats', type=int, default=0,
+                help='How many times two players may meet again')
+        parser.add_argument('--systems', default='swiss,rr,koth',
+                help=f'Comma separated list of pairing systems from {", ".join(SYSTEMS)}')
+        parser.add_argument('--seed', type=int, default=1,
+                help='Seed for the random names and ratings')
+        parser.add_argument('--output', help='Write the JSON to this file instead of stdout')
+        parser.add_argument('--keep', action='store_true', default=False,
+                help='Keep the generated tournaments')
+        parser.add_argument('--no-memory', action='store_false', dest='memory', default=True,
+                help="Don't trace memory allocations, they slow the pairing down")
+
+    def handle(self, *args, **options):
+        report = {
+            'config': {k: options[k] for k in ['players', 'rounds', 'team_size',
+                'entry_mode', 'repeats', 'systems', 'seed', 'memory']},
+            'systems': {}
+        }
+
+        with transaction.atomic():
+            for name in options['systems'].split(','):
+                name = name.strip()
+                with override_settings(**SETTINGS.get(name, {})):
+                    report['systems'][name] = self.benchmark(SYSTEMS[name], options)
+
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+        text = json.dumps(report, indent=2)
+        if options.get('output'):
+            with open(options['output'], 'w') as fp:
+                fp.write(text)
+        else:
+            self.stdout.write(text)
+
+    def benchmark(self, system, options):
+        """Generates a tournament and pairs all its rounds with the system"""
+        players = options['players']
+        rounds = options['rounds']
+        if system == TournamentRound.ROUND_ROBIN:
+            rounds = min(rounds, players - 1 if players % 2 == 0 else players)
+
+        t = Tournament.objects.create(
+            name=f'Benchmark {system} {time.time_ns()}', start_date='2023-01-01',
+            rated=False, num_rounds=rounds, private=True,
+            team_size=options['team_size'] or None, entry_mode=options['entry_mode'],
+            round_robin=system == TournamentRound.ROUND_ROBIN)
+        add_participants(t, use_faker=True, count=players, seed=options['seed'])
+        t.rounds.update(pairing_system=TournamentRound.AUTO if system ==
+            TournamentRound.ROUND_ROBIN else system, repeats=options['repeats'])
+
+        measurements = []
+        for rnd in t.rounds.order_by('round_no'):
+            if options['memory']:
+                tracemalloc.start()
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                p = make_pairing(rnd)
+                p.make_it()
+                p.save()
+                elapsed = time.perf_counter() - start
+
+            measurement = {
+                'round_no': rnd.round_no,
+                'seconds': elapsed,
+                'queries': len(ctx.captured_queries),
+            }
+            if hasattr(p, 'score'):
+                # how good the pairing is and how many of the candidates
+                # were made in the time allowed, see api.parallel
+                measurement['score'] = p.score
+                measurement['candidates'] = p.finished
+            if options['memory']:
+                measurement['peak_memory'] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            measurements.append(measurement)
+            random_results(t)
+
+        seconds = [m['seconds'] for m in measurements]
+        queries = [m['queries'] for m in measurements]
+        summary = {
+            'rounds': measurements,
+            'latency': {
+                'mean': statistics.mean(seconds),
+                'p50': percentile(seconds, 50),
+                'p90': percentile(seconds, 90),
+                'p95': percentile(seconds, 95),
+                'p99': percentile(seconds, 99),
+                'max': max(seconds),
+            },
+            'queries': {'total': sum(queries), 'max': max(queries)},
+        }
+        if options['memory']:
+            summary['peak_memory'] = max(m['peak_memory'] for m in measurements)
+        return summary
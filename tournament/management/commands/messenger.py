@@ -2,6 +2,8 @@ from django.core.management.base import BaseCommand
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
+from api.consumers import tournament_group
+
 channel_layer = get_channel_layer()
 
 class Command(BaseCommand): 
@@ -16,12 +18,18 @@ class Command(BaseCommand):
                             help='The group to send the message to')
         parser.add_argument('--name', nargs='?', const=True,
                             help='The name of a single channel to send the message to')
+        parser.add_argument('--tournament_id',
+                            help='Send the message to the spectators of this tournament')
 
 
     def handle(self, *args, **kwargs):
         channel_layer = get_channel_layer()
         
-        async_to_sync(channel_layer.group_send)("chat", {
+        group = kwargs.get('group')
+        if kwargs.get('tournament_id'):
+            group = tournament_group(kwargs['tournament_id'])
+
+        async_to_sync(channel_layer.group_send)(group, {
             "type": "chat.message",
-            "text": "Hello there!",
+            "message": "Hello there!",
         })
\ No newline at end of file
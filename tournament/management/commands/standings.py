@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from tournament.models import Tournament, standings_drift
+
+class Command(BaseCommand):
+    """Verify the standings of a tournament against a full recompute.
+
+    Standings are normally maintained incrementally as results are saved
+    (see INCREMENTAL_STANDINGS), this reports any participant whose stored
+    standings differ from what the results add up to and with --fix
+    rebuilds them."""
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--tournament', help="The name of the tournament")
+        parser.add_argument('--tournament_id', help="The id of the tournament")
+        parser.add_argument('--fix', help="Rebuild the standings if they are out of sync",
+                            required=False, action='store_true', default=False)
+
+    def handle(self, *args, **options):
+        if options.get('tournament'):
+            self.t = Tournament.get_by_name(options.get('tournament'),'')
+        else:
+            self.t = Tournament.objects.get(pk=options.get('tournament_id'))
+
+        drift = standings_drift(self.t)
+        for pid, name, stored, expected in drift:
+            self.stdout.write(f'{pid} {name} stored {stored} expected {expected}')
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Standings are in sync'))
+        elif options.get('fix'):
+            self.t.update_all_standings()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt standings for {self.t}'))
+        else:
+            self.stdout.write(self.style.ERROR(f'{len(drift)} participants out of sync'))
@@ -22,4 +22,5 @@ class Command(BaseCommand):
         print("Are you sure?")
         r = input().strip().lower()
         if r == "y" or r == "yes":
-            truncate_rounds(self.t, options.get('round'))
\ No newline at end of file
+            elapsed = truncate_rounds(self.t, options.get('round'))
+            print(f"Standings rebuilt in {elapsed * 1000:.1f} ms")
\ No newline at end of file
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournament', '0032_tournamentround_matching'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tournament',
+            name='version',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournament', '0033_tournament_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tournamentround',
+            name='pairing_system',
+            field=models.CharField(choices=[['ROUND_ROBIN', 'Round Robin'], ['SWISS', 'Swiss'], ['KOTH', 'KOTH'], ['RANDOM', 'Random'], ['MANUAL', 'Manual'], ['AUTO', 'Auto'], ['MATCHING', 'Swiss (weighted matching)'], ['PARALLEL', 'Swiss (parallel search)']], max_length=16),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournament', '0034_tournamentround_parallel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TournamentSequence',
+            fields=[
+                ('tournament', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sequence', serialize=False, to='tournament.tournament')),
+                ('seq', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunSQL(
+            """insert into tournament_tournamentsequence (tournament_id, seq)
+               select id, version from tournament_tournament where version > 0""",
+            """update tournament_tournament t set version = s.seq
+               from tournament_tournamentsequence s where s.tournament_id = t.id""",
+        ),
+        migrations.RemoveField(
+            model_name='tournament',
+            name='version',
+        ),
+    ]
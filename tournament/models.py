@@ -1,13 +1,21 @@
 import re
+import time
 import decimal
+import logging
+import functools
 
+from django.conf import settings
 from django.db import models, connection
 from django.db.models import Q, Max
 from django.contrib.auth.models import User
 from django.utils.text import slugify
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
 
+from tournament import cache
+
+logger = logging.getLogger(__name__)
+
 # Create your models here.
 
 
@@ -71,60 +79,51 @@ class Tournament(models.Model):
         return "/tournament/{0}/".format(self.slug)
     
     
-    def score_bye(self, result):
-        """The bye result should be entered automatically"""
-        
+    def bye_scores(self, bye_first):
+        """The scores that a bye gets, without saving anything.
+        Args: bye_first: True if the Bye is p1 of the result
+        Returns: (score1, score2, games_won, boards) where boards is a list of
+            (score1, score2) for each board when results are entered by
+            player and empty otherwise. games_won is None if it's to be left
+            as it is.
+        """
         if not self.team_size:
             # this is for an individual tournament
-            if result.p1.name == 'Bye':
-                result.score1 = 0
-                result.score2 = 100
-            else:
-                result.games_won = 1
-                result.score1 = 100
-                result.score2 = 0
-            result.save()
-            return
-        
-        elif self.entry_mode == Tournament.BY_PLAYER:
+            if bye_first:
+                return 0, 100, None, []
+            return 100, 0, 1, []
+
+        boards = []
+        if self.entry_mode == Tournament.BY_PLAYER:
             # team tournament where results for each individual player is tracked
-            rnd = result.round
             mid = self.team_size // 2
-            if result.p2.name == 'Bye':
-                # team1 1 got a bye
-                for i in range(self.team_size):
-                    b = BoardResult.objects.get(
-                        Q(round=rnd) & Q(team1=result.p1) & Q(team2=result.p2) & Q(board=i+1)
-                    )
-                    if i <= mid:
-                        b.score1, b.score2 = 100, 0
-                    else:
-                        b.score1, b.score2 = 0, 100
-                    b.save()
-
-            elif result.p1.name == 'Bye':
-                # player 2 got a bye
-                for i in range(self.team_size):
-                    b = BoardResult.objects.get(
-                        Q(round=rnd) & Q(team1=result.p1) & Q(team2=result.p2) & Q(board=i+1)
-                    )
-                    if i <= mid:
-                        b.score1, b.score2 = 0, 100
-                    else:
-                        b.score1, b.score2 = 0, 0
-                    b.save()
-                
-        
-        if result.p2.name == 'Bye':
+            for i in range(self.team_size):
+                if not bye_first:
+                    # team1 1 got a bye
+                    boards.append((100, 0) if i <= mid else (0, 100))
+                else:
+                    # player 2 got a bye
+                    boards.append((0, 100) if i <= mid else (0, 0))
+
+        if not bye_first:
             # team 1 got the bye
-            result.score1 = 300
-            result.score2 = 0
-            result.games_won = 3
-        else:
-            result.score2 = 300
-            result.score1 = 0
-            result.games_won = 2
+            return 300, 0, 3, boards
+        return 0, 300, 2, boards
+
+    def score_bye(self, result):
+        """The bye result should be entered automatically"""
+        score1, score2, games_won, boards = self.bye_scores(result.p1.name == 'Bye')
+        for i, (b1, b2) in enumerate(boards):
+            b = BoardResult.objects.get(
+                Q(round=result.round) & Q(team1=result.p1) & Q(team2=result.p2) & Q(board=i+1)
+            )
+            b.score1, b.score2 = b1, b2
+            b.save()
 
+        result.score1 = score1
+        result.score2 = score2
+        if games_won is not None:
+            result.games_won = games_won
         result.save()
 
     
@@ -145,7 +144,6 @@ class Tournament(models.Model):
 
         if not self.team_size:
             self.entry_mode = Tournament.NON_TEAM
-            
         super().save(*args, **kwargs)
 
 
@@ -177,19 +175,30 @@ class Tournament(models.Model):
         
     def update_all_standings(self):
         """Updates all the standings for the current tournament.
-        Args: tournament: A tournament object
         This is specially usefull when a round is truncated.
+
+        Every participant is refreshed by a single set based UPDATE (see
+        standings_query) rather than one update_standing call per player.
+        Returns: the time taken in seconds
         see also: update_standings
         """
+        start = time.perf_counter()
+        q = f"""
+            update tournament_participant tp set played = s.played,
+                game_wins = s.game_wins, round_wins = s.round_wins,
+                spread = s.spread, white = s.white
+            from ({standings_query(self.team_size)}) s
+            where tp.id = s.id"""
 
-        for p in self.participants.all():
-            # this absolutely is not the right way but this is not a function
-            # that will be used all that much and even with 200 players this
-            # is still only going to take a second or two.
-            if self.team_size:
-                update_team_standing(p.id)
-            else:
-                update_standing(p.id)
+        with connection.cursor() as cursor:
+            cursor.execute(q, {'tid': self.id})
+            count = cursor.rowcount
+
+        cache.bump_version(self.id)
+        elapsed = time.perf_counter() - start
+        logger.info('Rebuilt standings of %d participants in %s in %.1f ms',
+                    count, self, elapsed * 1000)
+        return elapsed
 
 
 class TournamentRound(models.Model):
@@ -200,10 +209,13 @@ class TournamentRound(models.Model):
     RANDOM = "RANDOM"
     MANUAL = "MANUAL"
     AUTO = "AUTO" # Try round robin first and then swiss.
+    MATCHING = "MATCHING" # Swiss using a maximum weight matching
+    PARALLEL = "PARALLEL" # Swiss keeping the best of several candidates
     
     PAIRING_CHOICES = ([ROUND_ROBIN, 'Round Robin'], [SWISS, 'Swiss'],
                        [KOTH, 'KOTH'], [RANDOM, 'Random'], [MANUAL,"Manual"],
-                       [AUTO, 'Auto'])
+                       [AUTO, 'Auto'], [MATCHING, 'Swiss (weighted matching)'],
+                       [PARALLEL, 'Swiss (parallel search)'])
     
     tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='rounds')
     round_no = models.IntegerField()
@@ -231,6 +243,18 @@ class TournamentRound(models.Model):
             )
         ]
 
+class TournamentSequence(models.Model):
+    ''' The sequence number of the last change broadcast for a tournament.
+
+    Spectators use it to find out if they missed an update. It's kept out of
+    Tournament so that saving a stale copy of the tournament can't set it
+    back, the only thing that writes it is next_version.
+    '''
+    tournament = models.OneToOneField(Tournament, on_delete=models.CASCADE,
+                                      primary_key=True, related_name='sequence')
+    seq = models.IntegerField(default=0)
+
+
 class Director(models.Model):
     tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.PROTECT)
@@ -317,11 +341,28 @@ class Result(models.Model):
     score2 = models.IntegerField(blank=True, null=True)
     table = models.IntegerField(default=0)
 
+    # the fields that decide how a result counts towards the standings
+    STANDING_FIELDS = ['p1_id', 'p2_id', 'starting_id', 'games_won', 'score1', 'score2']
+
     def __str__(self):
         if self.score1:
             return f"{self.p1.name} {self.score1} vs {self.p2.name} {self.score2}"
         return f"{self.p1.name} vs {self.p2.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember what the result looked like when it was loaded.
+        That's what update_result compares against when the result is saved
+        again, see standing_delta"""
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        if all(f in loaded for f in Result.STANDING_FIELDS):
+            instance._standing_values = {f: loaded[f] for f in Result.STANDING_FIELDS}
+        return instance
+
+    def standing_values(self):
+        return {f: getattr(self, f) for f in Result.STANDING_FIELDS}
+
     class Meta:
         unique_together = ['round','p1','p2']
         constraints = [
@@ -393,7 +434,7 @@ def board_result_presave(sender, instance, **kwargs):
 
     Please see result_presave
     """
-    if instance.team1 and instance.team1.id > instance.team2.id:
+    if instance.team1_id and instance.team1_id > instance.team2_id:
         instance.team1, instance.team2 = instance.team2, instance.team1
         if instance.score1:
             instance.score1, instance.score2 = instance.score2, instance.score1
@@ -409,49 +450,122 @@ def update_board_result(sender, instance, created, **kwargs):
     This signal ensures that the total result for both the team and the 
     player will be updated accordingly.
     """
-    if instance.score1 or instance.score2:
-        try:
-            player1 = TeamMember.objects.get(
-                Q(team=instance.team1) & Q(board=instance.board)
-            )
-            player2 = TeamMember.objects.get(
-                Q(team=instance.team2) & Q(board=instance.board)
-            )
-        except TeamMember.DoesNotExist:
-            player1 = None
-            player2 = None
+    if created and instance.score1 is None and instance.score2 is None:
+        # a new empty board, nothing to add up yet
+        return
+    update_board_totals([(instance.round_id, instance.team1_id, instance.team2_id)], instance.board)
+
+
+def update_board_totals(matches, board=None):
+    """Recompute team results from their board results.
+
+    The results of the matches and the spreads of the team members are
+    updated by a single statement straight from the board results, then the
+    standings of the teams are adjusted by the change in their results (see
+    standing_delta) with one more.
+    Args: matches: list of (round_id, team1_id, team2_id) as in the
+              BoardResult (team1 < team2)
+          board: only this board's team members need their spreads updated,
+              None for all of them.
+    Raises: IndexError if two teams did not play each other in the round
+    """
+    if not matches:
+        return
+
+    rows = ", ".join(["(%s, %s, %s)"] * len(matches))
+    teams = list({t for _, t1, t2 in matches for t in (t1, t2)})
+    q = f"""
+        with matches(round_id, team1_id, team2_id) as (values {rows}),
+        totals as (
+            select m.round_id, m.team1_id, m.team2_id,
+                sum(case when b.score1 > b.score2 then 1.0
+                         when b.score1 = b.score2 then 0.5
+                         when b.score1 < b.score2 then 0 end) games_won,
+                sum(b.score1) score1, sum(b.score2) score2
+            from matches m left join tournament_boardresult b
+                on b.round_id = m.round_id and b.team1_id = m.team1_id
+                and b.team2_id = m.team2_id and b.score1 is not null and b.score2 is not null
+            group by m.round_id, m.team1_id, m.team2_id
+        ), previous as (
+            select r.id, r.round_id, r.p1_id, r.p2_id, r.starting_id, r.score1, r.score2, r.games_won
+            from tournament_result r join matches m
+                on r.round_id = m.round_id and r.p1_id = m.team1_id and r.p2_id = m.team2_id
+            for update of r
+        ), result as (
+            update tournament_result r set games_won = t.games_won,
+                score1 = t.score1, score2 = t.score2
+            from totals t, previous p where r.id = p.id and t.round_id = p.round_id
+                and t.team1_id = p.p1_id and t.team2_id = p.p2_id
+        ), members as (
+            update tournament_teammember tm set spread = coalesce((
+                select sum(case when b.team1_id = tm.team_id then b.score1 - b.score2
+                                else b.score2 - b.score1 end)
+                from tournament_boardresult b
+                where b.board = tm.board and b.score1 is not null and b.score2 is not null
+                    and (b.team1_id = tm.team_id or b.team2_id = tm.team_id)), 0)
+            where tm.team_id = any(%s) and (%s::int is null or tm.board = %s)
+        )
+        select p.p1_id, p.p2_id, p.starting_id, p.games_won, p.score1, p.score2,
+            t.games_won, t.score1, t.score2
+        from previous p join totals t on t.round_id = p.round_id
+            and t.team1_id = p.p1_id and t.team2_id = p.p2_id"""
+
+    params = [v for match in matches for v in match] + [teams, board, board]
+    with connection.cursor() as cursor:
+        cursor.execute(q, params)
+        found = cursor.fetchall()
+
+    if len(found) < len(set(matches)):
+        raise IndexError(f'not all of {matches} were paired')
+
+    delta = {}
+    for row in found:
+        before = dict(zip(Result.STANDING_FIELDS, row[:6]))
+        after = dict(before, games_won=float(row[6]) if row[6] is not None else None,
+                     score1=row[7], score2=row[8])
+        add_standing_delta(delta, standing_delta(before, after, True))
+    apply_standing_delta(delta)
+
+
+@receiver(pre_save, sender=Result)
+def result_previous(sender, instance, **kwargs):
+    """Before saving a result find out what it used to be.
+
+    Usually that's already known (see Result.from_db) but results that were
+    created with bulk_create or loaded with deferred fields have to be read
+    back from the database.
+
+    What was loaded is only what the result still is if nobody else saved
+    it in between, load it with select_for_update in the transaction that
+    saves it (as the result view does) or the standings will drift.
+    """
+    if instance._state.adding:
+        instance._standing_before = None
+    elif hasattr(instance, '_standing_values'):
+        instance._standing_before = instance._standing_values
+    else:
+        instance._standing_before = Result.objects.filter(pk=instance.pk
+            ).values(*Result.STANDING_FIELDS).first()
 
-        r = Result.objects.filter(
-            (Q(p1=instance.team1) & Q(p2=instance.team2)) 
-        ).order_by('-round__round_no')[0]
-        
-        r.games_won = 0
-        r.score1 = 0
-        r.score2 = 0
-        boards = BoardResult.objects.filter(
-            Q(round=instance.round) & Q(team1=r.p1) & Q(team2=r.p2)
-        ).exclude(Q(score1=None) | Q(score2=None))
-
-        for b in boards:
-            if b.score1 > b.score2:
-                r.games_won += 1
-            elif b.score1 == b.score2:
-                r.games_won += 0.5
-            r.score1 += b.score1
-            r.score2 += b.score2
-
-        r.save()
-        
-        if player1 and player2:
-            player1.spread += (instance.score1 - instance.score2)
-            player2.spread -= (instance.score1 - instance.score2)
-            player1.save()
-            player2.save()
-        
 
 @receiver(post_save, sender=Result)
 def update_result(sender, instance, created, **kwargs):
     """When a result instance is saved the standings need to update"""
+    if getattr(settings, 'INCREMENTAL_STANDINGS', True):
+        before = getattr(instance, '_standing_before', None)
+        after = instance.standing_values()
+        instance._standing_values = after
+
+        unscored = lambda v: v is None or (
+            v['score1'] is None and v['score2'] is None and v['games_won'] is None)
+        if unscored(before) and unscored(after):
+            # newly paired, nothing to add to the standings yet.
+            return
+
+        team = bool(instance.round.tournament.team_size)
+        apply_standing_delta(standing_delta(before, after, team))
+        return
+
     if (not created or instance.p1.name in ['Absent','Bye'] or instance.p2.name in ['Absent','Bye']):
         if instance.score1 or instance.score2:
             if instance.round.tournament.team_size:
@@ -462,6 +576,113 @@ def update_result(sender, instance, created, **kwargs):
                 update_standing(instance.p2_id)
 
 
+def standing_contributions(values, team):
+    """What a single result adds to the standings of its two participants.
+
+    This is the same arithmetic as update_standing and update_team_standing
+    but for just the one result.
+    Args: values: a dictionary of Result.STANDING_FIELDS or None
+          team: True for a team tournament
+    Returns: dictionary of participant id to a list of
+        [played, game_wins, round_wins, spread, white]
+    """
+    contributions = {}
+    if values is None:
+        return contributions
+
+    p1, p2, starting = values['p1_id'], values['p2_id'], values['starting_id']
+    score1, score2, won = values['score1'], values['score2'], values['games_won']
+
+    if team:
+        if won is None:
+            return contributions
+        margin = score1 - score2 if score1 is not None and score2 is not None else 0
+        contributions[p1] = [1, won, 1 if won > 2.5 else .5 if won == 2.5 else 0,
+                             margin, int(starting == p1)]
+        contributions[p2] = [1, 5 - won, 1 if won < 2.5 else .5 if won == 2.5 else 0,
+                             -margin, int(starting == p2)]
+    else:
+        if score1 is None or score2 is None:
+            return contributions
+        contributions[p1] = [1, won or 0, 0, score1 - score2, int(starting == p1)]
+        contributions[p2] = [1, 0 if score2 == 0 or won is None else 1 - won, 0,
+                             score2 - score1, int(starting == p2)]
+    return contributions
+
+
+def standing_delta(before, after, team):
+    """The change in standings when a result goes from before to after.
+    Args: before, after: see standing_contributions
+    Returns: dictionary of participant id to the change in
+        [played, game_wins, round_wins, spread, white], unchanged participants
+        are left out
+    """
+    old = standing_contributions(before, team)
+    new = standing_contributions(after, team)
+    delta = {}
+    for pid in set(old) | set(new):
+        change = [n - o for n, o in zip(new.get(pid, [0] * 5), old.get(pid, [0] * 5))]
+        if any(change):
+            delta[pid] = change
+    return delta
+
+
+def add_standing_delta(total, delta):
+    """Adds a delta from standing_delta into a running total (in place)"""
+    for pid, change in delta.items():
+        total[pid] = [a + b for a, b in zip(total.get(pid, [0] * 5), change)]
+
+
+def apply_standing_delta(delta):
+    """Adds the changes produced by standing_delta with a single update"""
+    if not delta:
+        return
+
+    rows = []
+    params = []
+    for pid, change in delta.items():
+        rows.append("(%s, %s, %s::float, %s::float, %s, %s)")
+        params.append(pid)
+        params.extend(change)
+
+    q = f"""
+        update tournament_participant tp set played = coalesce(tp.played, 0) + d.played,
+            game_wins = coalesce(tp.game_wins, 0) + d.game_wins,
+            round_wins = coalesce(tp.round_wins, 0) + d.round_wins,
+            spread = coalesce(tp.spread, 0) + d.spread, white = tp.white + d.white
+        from (values {", ".join(rows)}) as d(id, played, game_wins, round_wins, spread, white)
+        where tp.id = d.id"""
+
+    with connection.cursor() as cursor:
+        cursor.execute(q, params)
+
+
+def update_results(results, tournament):
+    """Save the scores of many results at once.
+
+    The results are written with a single bulk_update, which does not fire
+    the signals, so the standings of the participants are adjusted here by
+    the combined change of all of them.
+    Args: results: Result instances loaded from the database, with
+              select_for_update in the current transaction, with their
+              new scores and games_won, all from the one tournament
+          tournament: the tournament that they belong to
+    """
+    Result.objects.bulk_update(results, ['score1', 'score2', 'games_won'])
+
+    if not getattr(settings, 'INCREMENTAL_STANDINGS', True):
+        tournament.update_all_standings()
+        return
+
+    team = bool(tournament.team_size)
+    delta = {}
+    for r in results:
+        after = r.standing_values()
+        add_standing_delta(delta, standing_delta(getattr(r, '_standing_values', None), after, team))
+        r._standing_values = after
+    apply_standing_delta(delta)
+
+
 def update_standing(pid):
     """Update standings for an individual tournament
     Args: pid: participant id
@@ -515,6 +736,104 @@ def update_team_standing(pid):
     with connection.cursor() as cursor:
         cursor.execute(q.format(pid))
 
+def next_version(tid):
+    """Atomically increments the broadcast sequence number of a tournament.
+
+    The TournamentSequence row stays locked till the end of the transaction,
+    call this when there is no long transaction open (see api.views.broadcast).
+    Args: tid: the tournament id
+    Returns: the new version and the number of rounds in the tournament
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""with s as (
+                insert into tournament_tournamentsequence (tournament_id, seq) values (%s, 1)
+                on conflict (tournament_id)
+                do update set seq = tournament_tournamentsequence.seq + 1
+                returning seq)
+            select s.seq, t.num_rounds from s, tournament_tournament t where t.id = %s""",
+            [tid, tid])
+        return cursor.fetchone()
+
+
+def standings_query(team):
+    """SQL that computes the standings of all the participants of a tournament
+    from scratch. Takes the tournament id as the named parameter tid and returns
+    id, played, game_wins, round_wins, spread, white for each participant.
+
+    The arithmetic is the same as in update_standing and update_team_standing
+    except that it's done for everyone at once.
+    """
+    if team:
+        return """
+            select tp.id, count(g.pid) played, coalesce(sum(g.game_wins), 0) game_wins,
+                coalesce(sum(g.rounds_won), 0) round_wins,
+                coalesce(sum(g.margin), 0) spread, coalesce(sum(g.white), 0) white
+            from tournament_participant tp left join (
+                select p1_id pid, games_won game_wins,
+                    CASE WHEN games_won > 2.5 THEN 1 WHEN games_won = 2.5 THEN .5 ELSE 0 END rounds_won,
+                    score1 - score2 margin,
+                    CASE WHEN starting_id = p1_id THEN 1 ELSE 0 END white
+                from tournament_result tr inner join tournament_tournamentround rnd
+                    on rnd.id = tr.round_id
+                where rnd.tournament_id = %(tid)s and games_won is not null
+                union all
+                select p2_id, 5 - games_won,
+                    CASE WHEN games_won < 2.5 THEN 1 WHEN games_won = 2.5 THEN .5 ELSE 0 END,
+                    score2 - score1,
+                    CASE WHEN starting_id = p2_id THEN 1 ELSE 0 END
+                from tournament_result tr inner join tournament_tournamentround rnd
+                    on rnd.id = tr.round_id
+                where rnd.tournament_id = %(tid)s and games_won is not null
+            ) g on g.pid = tp.id
+            where tp.tournament_id = %(tid)s
+            group by tp.id"""
+
+    return """
+        select tp.id, count(g.pid) played, coalesce(sum(g.game_wins), 0) game_wins,
+            tp.round_wins, coalesce(sum(g.margin), 0) spread, coalesce(sum(g.white), 0) white
+        from tournament_participant tp left join (
+            select p1_id pid, games_won game_wins, score1 - score2 margin,
+                CASE WHEN starting_id = p1_id THEN 1 ELSE 0 END white
+            from tournament_result tr inner join tournament_tournamentround rnd
+                on rnd.id = tr.round_id
+            where rnd.tournament_id = %(tid)s and score1 is not null and score2 is not null
+            union all
+            select p2_id, CASE WHEN score2 = 0 THEN 0 ELSE 1 - games_won END,
+                score2 - score1, CASE WHEN starting_id = p2_id THEN 1 ELSE 0 END
+            from tournament_result tr inner join tournament_tournamentround rnd
+                on rnd.id = tr.round_id
+            where rnd.tournament_id = %(tid)s and score1 is not null and score2 is not null
+        ) g on g.pid = tp.id
+        where tp.tournament_id = %(tid)s
+        group by tp.id"""
+
+
+def standings_drift(tournament):
+    """Compares the stored standings against a full recompute.
+    Args: tournament: the tournament to check
+    Returns: a list of (participant id, name, stored, expected) for each
+        participant whose standings are out of sync, stored and expected
+        are tuples of (played, game_wins, round_wins, spread, white)
+    """
+    q = f"""
+        select tp.id, tp.name,
+            tp.played, tp.game_wins, tp.round_wins, tp.spread, tp.white,
+            s.played, s.game_wins, s.round_wins, s.spread, s.white
+        from tournament_participant tp inner join ({standings_query(tournament.team_size)}) s
+            on s.id = tp.id
+        order by tp.id"""
+
+    drift = []
+    with connection.cursor() as cursor:
+        cursor.execute(q, {'tid': tournament.id})
+        for row in cursor.fetchall():
+            stored = tuple(v or 0 for v in row[2:7])
+            expected = tuple(v or 0 for v in row[7:12])
+            if stored != expected:
+                drift.append((row[0], row[1], stored, expected))
+    return drift
+
+
 @receiver(post_save, sender=Tournament)
 def setup_tournament(sender, instance, created, **kwargs):
     if created and instance.num_rounds > 0:
@@ -548,4 +867,51 @@ def participant_absent(sender, instance, created, **kwargs):
     if last:
         for rnd in instance.tournament.rounds.filter(round_no__lte=last.round_no):
             instance.mark_absent(rnd)
-    
\ No newline at end of file
+    
+
+
+def tournament_of(instance):
+    """The id of the tournament that a model instance belongs to"""
+    if isinstance(instance, Tournament):
+        return instance.id
+    if isinstance(instance, TeamMember):
+        return instance.team.tournament_id
+    if isinstance(instance, (Result, BoardResult)):
+        if type(instance).round.is_cached(instance):
+            return instance.round.tournament_id
+        return round_tournament(instance.round_id)
+    return instance.tournament_id
+
+
+@functools.lru_cache(maxsize=1024)
+def round_tournament(round_id):
+    """The tournament id of a round, a round never changes tournaments"""
+    return TournamentRound.objects.values_list('tournament_id', flat=True).get(pk=round_id)
+
+
+@receiver(post_save, sender=Tournament)
+@receiver(post_save, sender=TournamentRound)
+@receiver(post_save, sender=Participant)
+@receiver(post_save, sender=Result)
+@receiver(post_save, sender=BoardResult)
+@receiver(post_save, sender=TeamMember)
+@receiver(post_delete, sender=Tournament)
+@receiver(post_delete, sender=TournamentRound)
+def invalidate_snapshot(sender, instance, **kwargs):
+    """Any change to a tournament makes the cached snapshot stale.
+
+    Participants, results and team members are deleted in bulk, a
+    post_delete receiver on them would make django fetch and delete
+    the rows one at a time. Whatever deletes them calls
+    cache.bump_version instead.
+    """
+    cache.bump_version(tournament_of(instance))
+
+
+@receiver(post_save, sender=Tournament)
+@receiver(post_save, sender=Director)
+@receiver(post_delete, sender=Tournament)
+@receiver(post_delete, sender=Director)
+def invalidate_context(sender, instance, **kwargs):
+    """The tournament or its directors changed, see cache.get_context"""
+    cache.invalidate_context(instance.id if sender == Tournament else instance.tournament_id)
@@ -3,8 +3,9 @@ from faker import Faker
 
 from django.db.models import Q
 
+from tournament import cache
 from tournament.models import Participant, TeamMember, Tournament, BoardResult
-from tournament.models import update_standing, update_team_standing
+from ratings.matching import find_ratings
 
 def add_participants(tournament, use_faker=False, count=0, filename="", seed=None):
     """Adds a list of participants (teams) to a tournament
@@ -23,24 +24,46 @@ def add_participants(tournament, use_faker=False, count=0, filename="", seed=Non
         fake = Faker()
         if seed:
             Faker.seed(seed)
+        # faker runs out of unique names long before a big event runs out of
+        # players, so number the duplicates.
+        names = set(tournament.participants.values_list('name', flat=True))
         for i in range(count):
+            if tournament.team_size:
+                name = fake.city() + " Scrabble Club"
+            else:
+                name = fake.name()
+            unique = name
+            n = 1
+            while unique in names:
+                n += 1
+                unique = f'{name} {n}'
+            names.add(unique)
+
             if tournament.team_size:
                 p = Participant.objects.create(tournament=tournament, 
-                    name = fake.city() + " Scrabble Club",
+                    name = unique,
                     rating = i * 10 + 1)
             else:
                 p = Participant.objects.create(tournament=tournament, 
-                    name = fake.name(),
+                    name = unique,
                     rating = fake.random_int(500, 1400))
                 
             participants.append(p)
     else:
         with open(filename) as fp:
-            reader = csv.reader(fp)
-            for line in reader:
-                p = Participant.objects.create(tournament=tournament, name=line[0],
-                    rating=line[1])
-                participants.append(p)
+            lines = list(csv.reader(fp))
+
+        # players without a rating in the file get the one from the rating
+        # lists, all of them looked up together.
+        ratings = find_ratings([line[0] for line in lines if len(line) < 2 or not line[1].strip()])
+        for line in lines:
+            if len(line) > 1 and line[1].strip():
+                rating = line[1]
+            else:
+                rating = ratings.get(line[0], 0)
+            p = Participant.objects.create(tournament=tournament, name=line[0],
+                rating=rating)
+            participants.append(p)
     return participants
 
 
@@ -106,16 +129,14 @@ def random_results(tournament):
 def truncate_rounds(tournament, number):
     """Truncate the tournament
     Args: number : the last round to remain standing
-        send 0 here to truncate all the results and pairings"""
+        send 0 here to truncate all the results and pairings
+    Returns: the time taken to rebuild the standings in seconds"""
 
     for round in tournament.rounds.filter(round_no__gt=number):
         round.results.all().delete()
         round.boardresult_set.all().delete()
+        cache.bump_version(tournament.id)
         round.paired = 0;
         round.save()
 
-    for p in tournament.participants.all():
-        if tournament.team_size:
-            update_team_standing(p.id)
-        else:
-            update_standing(p.id)
+    return tournament.update_all_standings()
@@ -0,0 +1,120 @@
+import json
+import time
+import random
+import statistics
+
+from django.core.management.base import BaseCommand
+
+from tsh import parser
+
+
+def generate(players, rounds, rng):
+    """Lines of a synthetic a.t file with a complete set of results.
+    Args: players: number of players in the division
+          rounds: number of rounds played
+          rng: a random.Random
+    """
+    opponents = {seed: [] for seed in range(1, players + 1)}
+    scores = {seed: [] for seed in range(1, players + 1)}
+    p12 = {seed: [] for seed in range(1, players + 1)}
+
+    for _ in range(rounds):
+        seeds = list(opponents)
+        rng.shuffle(seeds)
+        if len(seeds) % 2:
+            bye = seeds.pop()
+            opponents[bye].append(0)
+            scores[bye].append(50)
+            p12[bye].append(0)
+        for a, b in zip(seeds[::2], seeds[1::2]):
+            opponents[a].append(b)
+            opponents[b].append(a)
+            scores[a].append(rng.randint(250, 550))
+            scores[b].append(rng.randint(250, 550))
+            p12[a].append(1)
+            p12[b].append(2)
+
+    for seed in opponents:
+        rtime = " ".join(str(1579408481 + r * 3600) for r in range(rounds))
+        newr = " ".join(str(rng.randint(500, 2000)) for r in range(rounds))
+        yield (f"{'Player ' + str(seed):25s}{rng.randint(0, 2000):4d} "
+               f"{' '.join(map(str, opponents[seed]))}; "
+               f"{' '.join(map(str, scores[seed]))}; "
+               f"newr {newr}; p12 {' '.join(map(str, p12[seed]))}; rtime {rtime}"
+               f"{'; off 50' if seed % 97 == 0 else ''}\n")
+
+
+class Command(BaseCommand):
+    """Measure how long it takes to parse a.t files.
+
+    Either the given files are parsed or a multi division event is generated
+    in memory. Each division is parsed --repeats times and the time taken
+    and the throughput (lines per second) are reported as JSON. Nothing is
+    written to the database.
+    """
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('files', nargs='*', help="a.t files to parse instead of generated ones")
+        parser.add_argument('--divisions', type=int, default=4,
+                help='Number of generated divisions')
+        parser.add_argument('--players', type=int, default=500,
+                help='Number of players in each generated division')
+        parser.add_argument('--rounds', type=int, default=30,
+                help='Number of rounds in each generated division')
+        parser.add_argument('--repeats', type=int, default=3,
+                help='How many times each division is parsed')
+        parser.add_argument('--seed', type=int, default=1,
+                help='Seed for the random results')
+        parser.add_argument('--output', help='Write the JSON to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        if options['files']:
+            divisions = {}
+            for name in options['files']:
+                with open(name) as fp:
+                    divisions[name] = fp.readlines()
+        else:
+            rng = random.Random(options['seed'])
+            divisions = {
+                f'division {d + 1}': list(generate(options['players'], options['rounds'], rng))
+                for d in range(options['divisions'])
+            }
+
+        report = {
+            'config': {k: options[k] for k in ['divisions', 'players', 'rounds', 'repeats', 'seed']},
+            'divisions': {}
+        }
+        for name, lines in divisions.items():
+            report['divisions'][name] = self.benchmark(lines, options['repeats'])
+
+        lines = sum(d['lines'] for d in report['divisions'].values())
+        seconds = sum(d['mean'] for d in report['divisions'].values())
+        report['total'] = {'lines': lines, 'seconds': seconds,
+                           'lines_per_second': lines / seconds if seconds else None}
+
+        text = json.dumps(report, indent=2)
+        if options.get('output'):
+            with open(options['output'], 'w') as fp:
+                fp.write(text)
+        else:
+            self.stdout.write(text)
+
+    def benchmark(self, lines, repeats):
+        """Parses a division repeatedly"""
+        seconds = []
+        for _ in range(max(repeats, 1)):
+            errors = []
+            start = time.perf_counter()
+            players = parser.parse(lines, errors)
+            seconds.append(time.perf_counter() - start)
+
+        mean = statistics.mean(seconds)
+        return {
+            'lines': len(lines),
+            'players': len(players) - 1,
+            'errors': len(errors),
+            'mean': mean,
+            'min': min(seconds),
+            'max': max(seconds),
+            'lines_per_second': len(lines) / mean if mean else None,
+        }
@@ -17,5 +17,8 @@ class Command(BaseCommand):
             self.t = Tournament.objects.get(pk=options.get('tournament_id'))
 
         with open(options['tsh_file']) as fp:
-            results = tsh.tsh_import(fp)
+            errors = []
+            results = tsh.tsh_import(fp, errors)
+            for error in errors:
+                self.stderr.write(str(error))
             tsh.save_to_db(self.t, results)
\ No newline at end of file
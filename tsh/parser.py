@@ -0,0 +1,169 @@
+"""Parser for the a.t files of TSH.
+
+Each line of an a.t file is a player. The player is numbered by the position
+of the line (blank lines and comments do not count) and that number is what
+the other players refer to in their list of opponents. A line looks like
+
+    Rodriguez, Alejandra   1500 18 20 0; 431 443 401; p12 2 1 0; off 0
+
+that is, the name, the rating and the opponents followed by the scores and
+then any number of `;` separated fields each made of a keyword and values.
+
+Nothing here touches the database, see tsh.save_to_db for that.
+"""
+import re
+
+# the whole line split into the name, rating and opponents part, the scores
+# and the fields that follow
+LINE = re.compile(r'^(?P<head>[^;]*);(?P<scores>[^;]*)(?:;(?P<fields>.*))?$')
+NUMBER = re.compile(r'-?\d+')
+SKIP = re.compile(r'^\s*(?:#.*)?$')
+
+# fields with a value for each round
+INT_LISTS = ('newr', 'rtime', 'board', 'rcrank', 'rrank')
+
+
+class ParseError(ValueError):
+    """A line of an a.t file that could not be understood"""
+    def __init__(self, lineno, message, line=''):
+        self.lineno = lineno
+        self.message = message
+        self.line = line
+        super().__init__(f'line {lineno}: {message}')
+
+
+def numbers(values, lineno, what):
+    """Converts a list of strings into integers"""
+    try:
+        return [int(v) for v in values]
+    except ValueError:
+        raise ParseError(lineno, f'{what} should be numbers: {" ".join(values)}')
+
+
+def split_head(tokens, played, players=None):
+    """Separates the name, rating and opponents.
+
+    Everything at the end of the head that is a number is either the rating,
+    an opponent or part of the name (a name like 'Player 2'). The first of
+    those numbers is the rating, unless that leaves fewer opponents than
+    scores or an opponent who is not in the file, then the name must end
+    with a number and the next one is tried. There may be more opponents
+    than scores, those are rounds that have been paired but not yet played.
+    When nothing fits the split that leaves as many opponents as scores is
+    used, parse_line will complain about it.
+
+    Args: tokens: the part of the line before the first ; split on spaces
+          played: the number of scores on the line
+          players: the number of players in the file, if known
+    Returns: name, rating, opponents as strings
+    """
+    n = 0
+    while n < len(tokens) and NUMBER.fullmatch(tokens[-1 - n]):
+        n += 1
+
+    def possible(k):
+        opponents = tokens[len(tokens) - n + k + 1:]
+        return len(opponents) >= played and (players is None or
+            all(0 <= int(o) <= players for o in opponents))
+
+    # the name has to have at least one word
+    first = 1 if n == len(tokens) else 0
+    k = next((k for k in range(first, n) if possible(k)), None)
+    if k is None:
+        k = next((k for k in range(first, n) if n - 1 - k == played), first)
+
+    rating = len(tokens) - n + k
+    return " ".join(tokens[:rating]), tokens[rating], tokens[rating + 1:]
+
+
+def parse_line(line, lineno, seed, players=None):
+    """Parses a single player.
+    Args: line: the text of the line
+          lineno: the line number used in error messages
+          seed: the player number
+          players: the number of players in the file, see split_head
+    Returns: a dictionary in the format of tsh.tsh_import
+    Raises: ParseError
+    """
+    match = LINE.match(line.strip())
+    if not match:
+        raise ParseError(lineno, 'expected the opponents and the scores separated by ;', line)
+
+    scores = numbers(match.group('scores').split(), lineno, 'scores')
+    tokens = match.group('head').split()
+    if len(tokens) < 2:
+        raise ParseError(lineno, 'expected a name and a rating', line)
+
+    name, rating, opponents = split_head(tokens, len(scores), players)
+    if not NUMBER.fullmatch(rating):
+        raise ParseError(lineno, f'{name} does not have a rating', line)
+
+    opponents = numbers(opponents, lineno, 'opponents')
+    if len(scores) > len(opponents):
+        raise ParseError(lineno, f'{name} has more scores than opponents', line)
+
+    player = {'name': name, 'opponents': opponents, 'scores': scores,
+        'p12': None, 'rank': None, 'newr': None, 'rtime': None, 'off': False,
+        'seed': seed, 'old_rating': int(rating), 'fields': {}, 'lineno': lineno}
+
+    for field in (match.group('fields') or '').split(';'):
+        items = field.split()
+        if not items:
+            continue
+        key, values = items[0], items[1:]
+        if key == 'p12':
+            # A value of 1,2 means the obvious, 0 means the play had a bye
+            # when it's three they tossed for it
+            player['p12'] = values
+        elif key == 'off':
+            player['off'] = True
+        elif key in INT_LISTS:
+            values = numbers(values, lineno, key)
+            if key in player:
+                player[key] = values
+        player['fields'][key] = values
+
+    return player
+
+
+def parse(fp, errors=None):
+    """Parses an a.t file.
+
+    A line that cannot be parsed does not stop the parser, the player still
+    takes up a number so that the opponents of everyone else are correct.
+    Args: fp: a file like object or any iterable of lines
+          errors: if given a list to which the ParseErrors are added, if not
+              the first error is raised.
+    Returns: the players, starting with the Bye at seed 0
+    """
+    lines = list(fp)
+    total = sum(1 for line in lines if not SKIP.match(line))
+
+    players = [{'name': 'Bye', 'seed': 0}]
+    failed = []
+
+    for lineno, line in enumerate(lines, 1):
+        if SKIP.match(line):
+            continue
+
+        seed = len(players) + len(failed)
+        try:
+            players.append(parse_line(line, lineno, seed, total))
+        except ParseError as e:
+            if errors is None:
+                raise
+            e.line = line
+            errors.append(e)
+            failed.append(seed)
+
+    count = len(players) + len(failed)
+    for player in players[1:]:
+        for opponent in player['opponents']:
+            if opponent >= count:
+                e = ParseError(player['lineno'],
+                               f"{player['name']} has an opponent {opponent} who does not exist")
+                if errors is None:
+                    raise e
+                errors.append(e)
+
+    return players
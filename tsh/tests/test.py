@@ -1,10 +1,12 @@
+import json
 from io import StringIO
-from django.test import TransactionTestCase, TestCase
+from django.test import TransactionTestCase, TestCase, SimpleTestCase
 from django.core.management import call_command, CommandError
+from django.db.models import F
 from tournament.models import Tournament, Participant, Result
 
 
-from tsh import tsh
+from tsh import tsh, parser
 
 class TransTests(TransactionTestCase):
 
@@ -49,6 +51,50 @@ class TransTests(TransactionTestCase):
         self.assertEqual(len(results), 39) # theres a blank line at the end not sure why!
 
 
+    def test_save_queries(self):
+        """The number of queries does not depend on the number of players"""
+        with open('tsh/data/tournament1/a.t') as fp:
+            participants = tsh.tsh_import(fp)
+
+        # two deletes, the rounds, marking them paired, the participants,
+        # the results and the standings. Plus the savepoint
+        with self.assertNumQueries(9):
+            tsh.save_to_db(self.t1, participants)
+
+        self.assertEqual(Participant.objects.count(), 39)
+        games = sum(len(p['opponents']) for p in participants[1:])
+        byes = sum(o == '0' or o == 0 for p in participants[1:] for o in p['opponents'])
+        self.assertEqual(Result.objects.count(), (games + byes) // 2)
+
+        # importing again replaces the data
+        tsh.save_to_db(self.t1, participants)
+        self.assertEqual(Participant.objects.count(), 39)
+
+
+    def test_export_queries(self):
+        """Exports in two queries without touching the seeds"""
+        with open('tsh/data/tournament1/a.t') as fp:
+            participants = tsh.tsh_import(fp)
+        tsh.save_to_db(self.t1, participants)
+
+        # leave a gap in the seeds that the export has to close
+        Participant.objects.filter(seed__gte=30).update(seed=F('seed') + 10)
+        seeds = list(Participant.objects.order_by('seed').values_list('seed', flat=True))
+
+        out = StringIO()
+        with self.assertNumQueries(2):
+            tsh.tsh_export(self.t1, out)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 38)
+        self.assertEqual(seeds, list(Participant.objects.order_by('seed').values_list('seed', flat=True)))
+
+        # the round trip gives back the same results for the top seed
+        players = tsh.tsh_import(StringIO(out.getvalue()))
+        self.assertEqual(players[1]['scores'], participants[1]['scores'])
+        self.assertEqual(players[1]['p12'], participants[1]['p12'])
+
+
 class CommandTestCase(TestCase):
     def setUp(self):
         # Create test data for Tournament and Participants
@@ -124,4 +170,90 @@ class CommandTestCase(TestCase):
             # For example:
             self.assertNotIn('Test Tournament', file_contents)
             self.assertNotIn('Player 1', file_contents)
-            self.assertNotIn('Player 2', file_contents)
\ No newline at end of file
+            self.assertNotIn('Player 2', file_contents)
+
+class ParserTests(SimpleTestCase):
+
+    def test_fields(self):
+        players = parser.parse([
+            "Rodriguez, Alejandra   1500 2 0; 431 50; p12 1 0; newr 1510 1520; rtime 10 20; off 50\n",
+            "\n",
+            "# a comment\n",
+            "Player 2               1200 1 3; 390 410; p12 2 1; newr 1190 1200\n",
+            "Smith, John            900 0 2; 50 380; p12 0 2\n",
+        ])
+        self.assertEqual(4, len(players))
+
+        first = players[1]
+        self.assertEqual('Rodriguez, Alejandra', first['name'])
+        self.assertEqual(1500, first['old_rating'])
+        self.assertEqual([2, 0], first['opponents'])
+        self.assertEqual([431, 50], first['scores'])
+        self.assertEqual(['1', '0'], first['p12'])
+        self.assertEqual([1510, 1520], first['newr'])
+        self.assertEqual([10, 20], first['rtime'])
+        self.assertTrue(first['off'])
+
+        # a name with a number in it
+        self.assertEqual('Player 2', players[2]['name'])
+        self.assertEqual(2, players[2]['seed'])
+        self.assertEqual(1200, players[2]['old_rating'])
+        self.assertEqual([1, 3], players[2]['opponents'])
+        self.assertFalse(players[2]['off'])
+
+    def test_unscored(self):
+        """A round that has been paired but not yet played"""
+        players = parser.parse([
+            "John Smith             1500 3 4 5; 400 300\n",
+            "Player 2               1200 4 3; 390\n",
+            "Jane Doe               1400 1 5; 350\n",
+            "Joe Bloggs             1300 2 1 1; 380 410\n",
+            "Ann Other              1100 3 1; 360\n",
+        ])
+        self.assertEqual('John Smith', players[1]['name'])
+        self.assertEqual(1500, players[1]['old_rating'])
+        self.assertEqual([3, 4, 5], players[1]['opponents'])
+        self.assertEqual([400, 300], players[1]['scores'])
+
+        # 1200 can't be an opponent, so the 2 is part of the name
+        self.assertEqual('Player 2', players[2]['name'])
+        self.assertEqual(1200, players[2]['old_rating'])
+        self.assertEqual([4, 3], players[2]['opponents'])
+
+        self.assertEqual([1, 5], players[3]['opponents'])
+        self.assertEqual([350], players[3]['scores'])
+
+    def test_errors(self):
+        lines = [
+            "Rodriguez, Alejandra   1500 3 0; 431 50\n",
+            "this line is broken\n",
+            "Smith, John            900 1 9; 380 x\n",
+            "Doe, Jane              800 1 2; 380 400\n",
+        ]
+        with self.assertRaises(parser.ParseError) as ctx:
+            parser.parse(lines)
+        self.assertEqual(2, ctx.exception.lineno)
+
+        errors = []
+        players = parser.parse(lines, errors)
+        self.assertEqual([2, 3], [e.lineno for e in errors])
+
+        # the broken lines keep their numbers
+        self.assertEqual(['Bye', 'Rodriguez, Alejandra', 'Doe, Jane'], [p['name'] for p in players])
+        self.assertEqual(4, players[2]['seed'])
+
+        errors = []
+        parser.parse(["Doe, Jane              800 7; 380\n"], errors)
+        self.assertEqual(1, len(errors))
+        self.assertIn('does not exist', str(errors[0]))
+
+    def test_benchmark(self):
+        out = StringIO()
+        call_command('benchmark_import', '--divisions', 2, '--players', 21,
+                     '--rounds', 5, '--repeats', 1, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(2, len(report['divisions']))
+        for division in report['divisions'].values():
+            self.assertEqual(21, division['players'])
+            self.assertEqual(0, division['errors'])
+        self.assertEqual(42, report['total']['lines'])